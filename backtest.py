@@ -0,0 +1,231 @@
+"""
+Backtest กฎให้คะแนน rule_based_v2 ย้อนหลังด้วยราคารายวัน
+
+คำนวณ indicator ของทุกหุ้นทุกวันบนเมทริกซ์เดียว (indicator_engine) แล้วให้คะแนนทุกวันพร้อมกัน
+ด้วย batch_scoring → จับคู่กับผลตอบแทนจริง N แท่งถัดไป แล้วสรุป hit rate ตามคำแนะนำ
+
+ข้อมูลย้อนหลังไม่มี fundamental / analyst / news sentiment
+คะแนนจึงมาจาก Technical + Risk ของราคาเท่านั้น: ค่าเริ่มต้นให้น้ำหนัก Technical 100% (น้ำหนักแบบ ETF)
+--category-weights ใช้น้ำหนักตาม category แบบ production ซึ่งส่วนที่ไม่มีข้อมูลได้ 0
+→ คะแนนไม่เกิน ~35 และแทบทุกสัญญาณเป็น Sell / Strong Sell
+
+    python backtest.py                              # ใช้ราคาใน bar store (.cache/bars)
+    python backtest.py --download --years 5 AAPL MSFT NVDA
+    python backtest.py --workers 4 --json backtest.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bar_store import BAR_CACHE_DIR, load_bars, split_bulk_history
+from indicator_engine import align_closes, compute_indicator_bars
+from batch_scoring import overall_scores, risk_scores, adjust_scores_by_risk, recommendation_labels
+
+
+BACKTEST_HORIZON_BARS = int(os.getenv("BACKTEST_HORIZON_BARS", "21"))  # ~30 วันปฏิทิน
+BACKTEST_WARMUP_BARS = int(os.getenv("BACKTEST_WARMUP_BARS", "200"))   # ให้ EMA 200 มีค่าก่อนเริ่มนับ
+HOLD_BAND_PCT = float(os.getenv("HOLD_BAND_PCT", "5"))                # Hold ถูกถ้าราคาไม่เกิน ±5%
+DOWNLOAD_CHUNK = 100
+
+BUCKETS = ["Strong Buy", "Buy", "Hold", "Sell", "Strong Sell"]
+
+# indicator ที่ใช้ให้คะแนน (ชื่อเดียวกับ tech_data ใน process_symbol)
+SCORE_INPUTS = ["price", "rsi", "macd", "macd_signal", "ema_20", "ema_50", "ema_200", "bb_upper", "bb_lower"]
+
+
+# ============================================
+# ข้อมูลราคา
+# ============================================
+def load_universe(symbols=None, years=2, download=False):
+    """ราคาย้อนหลังของหลายหุ้น → {symbol: DataFrame}"""
+    if download:
+        import yfinance as yf
+        frames = {}
+        for start in range(0, len(symbols), DOWNLOAD_CHUNK):
+            chunk = symbols[start:start + DOWNLOAD_CHUNK]
+            df = yf.download(chunk, period=f"{years}y", group_by="ticker",
+                             auto_adjust=True, threads=True, progress=False)
+            frames.update(split_bulk_history(df, chunk))
+        return frames
+    
+    if not symbols:
+        symbols = sorted(name[:-len(".parquet")] for name in os.listdir(BAR_CACHE_DIR) if name.endswith(".parquet"))
+    
+    frames = {}
+    for symbol in symbols:
+        bars = load_bars(symbol)
+        if bars is not None:
+            frames[symbol] = bars[bars.index >= bars.index[-1] - pd.DateOffset(years=years)]
+    return frames
+
+
+def load_categories(path):
+    """category ของแต่ละหุ้นจาก CSV (symbol,category) เช่น export ของ stock_master"""
+    if not path:
+        return {}
+    df = pd.read_csv(path)
+    return dict(zip(df["symbol"], df["category"]))
+
+
+# ============================================
+# Backtest
+# ============================================
+def _upside_pct(price, ema_200, ema_50):
+    """calculate_upside_pct() ทั้งชุด: ใช้ EMA 200 ก่อน ถ้าไม่มีใช้ EMA 50"""
+    with np.errstate(invalid="ignore"):
+        target = np.where(ema_200 > 0, ema_200, np.where(ema_50 > 0, ema_50, np.nan))
+        return np.round((target - price) / price * 100, 2)
+
+
+def backtest_closes(closes, categories, horizon=BACKTEST_HORIZON_BARS, warmup=BACKTEST_WARMUP_BARS):
+    """
+    ให้คะแนนทุกหุ้นทุกแท่ง แล้วจับคู่กับผลตอบแทน horizon แท่งถัดไป
+    
+    closes: symbols × dates (NaN = ไม่มีข้อมูล), categories: category ของแต่ละแถว
+    Returns: (recommendation ของแต่ละสัญญาณ, forward return %)
+    """
+    if horizon < 1:
+        raise ValueError(f"horizon must be at least 1 bar, got {horizon}")
+    
+    values, _ = compute_indicator_bars(closes)
+    price = values["price"]
+    
+    forward = np.full(price.shape, np.nan)
+    forward[:-horizon] = (price[horizon:] / price[:-horizon] - 1) * 100
+    
+    bar = np.arange(price.shape[0])[:, None]
+    usable = (bar >= warmup) & ~np.isnan(forward)
+    
+    frame = pd.DataFrame({name: values[name][usable] for name in SCORE_INPUTS})
+    frame["upside_pct"] = _upside_pct(frame["price"].values, frame["ema_200"].values, frame["ema_50"].values)
+    frame["category"] = np.asarray(categories, dtype=object)[np.nonzero(usable)[1]]
+    
+    risk = risk_scores(frame)
+    overall = adjust_scores_by_risk(overall_scores(frame), risk)
+    return recommendation_labels(overall, risk), forward[usable]
+
+
+def summarize(labels, forward, hold_band=HOLD_BAND_PCT):
+    """hit rate + ผลตอบแทนเฉลี่ยตามคำแนะนำ"""
+    rows = []
+    for bucket in BUCKETS:
+        returns = forward[labels == bucket]
+        if bucket in ("Strong Buy", "Buy"):
+            hits = returns > 0
+        elif bucket == "Hold":
+            hits = np.abs(returns) <= hold_band
+        else:
+            hits = returns < 0
+        
+        count = len(returns)
+        rows.append({
+            "recommendation": bucket,
+            "signals": count,
+            "hit_rate_pct": round(float(hits.mean()) * 100, 1) if count else None,
+            "avg_return_pct": round(float(returns.mean()), 2) if count else None,
+            "median_return_pct": round(float(np.median(returns)), 2) if count else None,
+        })
+    return rows
+
+
+def run_backtest(frames, categories=None, horizon=BACKTEST_HORIZON_BARS, warmup=BACKTEST_WARMUP_BARS,
+                 workers=1, technical_only=True):
+    """
+    Backtest ทุกหุ้นใน frames
+    
+    workers > 1 → แบ่งหุ้นเป็น shard แล้วคำนวณใน process pool (ส่งเป็น NumPy array ไม่ใช่ DataFrame)
+    technical_only → ให้น้ำหนัก Technical 100% (น้ำหนักแบบ ETF) แทนน้ำหนักตาม category
+    (False = น้ำหนักตาม category ซึ่งจะกดคะแนนไว้ไม่เกิน ~35 เพราะย้อนหลังไม่มีข้อมูล fundamental / sentiment)
+    """
+    symbols, _, closes = align_closes(frames)
+    categories = categories or {}
+    symbol_categories = np.array([
+        'ETF' if technical_only else categories.get(symbol, 'Core') for symbol in symbols
+    ], dtype=object)
+    
+    if workers <= 1 or len(symbols) < 2 * workers:
+        labels, forward = backtest_closes(closes, symbol_categories, horizon, warmup)
+    else:
+        shards = np.array_split(np.arange(len(symbols)), workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                backtest_closes,
+                [closes[rows] for rows in shards],
+                [symbol_categories[rows] for rows in shards],
+                [horizon] * len(shards),
+                [warmup] * len(shards),
+            ))
+        labels = np.concatenate([labels for labels, _ in results])
+        forward = np.concatenate([forward for _, forward in results])
+    
+    return summarize(labels, forward)
+
+
+def print_report(rows, symbols, horizon, elapsed):
+    print(f"\n{'='*60}")
+    print(f"📈 Backtest: {symbols} symbols | horizon {horizon} bars | {elapsed:.1f}s")
+    print(f"{'='*60}")
+    print(f"   {'Recommendation':<14} {'Signals':>9} {'Hit %':>7} {'Avg %':>8} {'Median %':>9}")
+    for row in rows:
+        if not row["signals"]:
+            print(f"   {row['recommendation']:<14} {0:>9}")
+            continue
+        print(f"   {row['recommendation']:<14} {row['signals']:>9} {row['hit_rate_pct']:>7.1f} "
+              f"{row['avg_return_pct']:>8.2f} {row['median_return_pct']:>9.2f}")
+    print(f"{'='*60}\n")
+
+
+def positive_int(value):
+    """type ของ argparse: จำนวนเต็มตั้งแต่ 1 (horizon 0 ทำให้ forward[:-0] เป็น slice ว่าง)"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer, got {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest rule_based_v2 over historical daily bars")
+    parser.add_argument("symbols", nargs="*", help="หุ้นที่ต้องการ (ไม่ระบุ = ทุกหุ้นใน bar store)")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--download", action="store_true", help="ดึงราคาจาก yfinance แทน bar store")
+    parser.add_argument("--categories", metavar="CSV", help="ไฟล์ symbol,category (ใช้กับ --category-weights)")
+    parser.add_argument("--horizon", type=positive_int, default=BACKTEST_HORIZON_BARS, help="จำนวนแท่งของ forward return")
+    parser.add_argument("--warmup", type=int, default=BACKTEST_WARMUP_BARS)
+    parser.add_argument("--workers", type=positive_int, default=1, help="จำนวน process (แบ่งหุ้นเป็น shard)")
+    parser.add_argument("--category-weights", action="store_true",
+                        help="ใช้น้ำหนักตาม category แบบ production (ไม่มี fundamental / sentiment → คะแนนต่ำเกือบทั้งหมด)")
+    parser.add_argument("--json", metavar="FILE", help="บันทึกผลเป็น JSON")
+    args = parser.parse_args(argv)
+    
+    if args.download and not args.symbols:
+        parser.error("--download needs a list of symbols")
+    
+    frames = load_universe(args.symbols, args.years, args.download)
+    if not frames:
+        print("📭 No price history found")
+        return 1
+    
+    start = time.perf_counter()
+    rows = run_backtest(frames, load_categories(args.categories), args.horizon, args.warmup,
+                        args.workers, technical_only=not args.category_weights)
+    elapsed = time.perf_counter() - start
+    
+    print_report(rows, len(frames), args.horizon, elapsed)
+    
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"symbols": len(frames), "horizon_bars": args.horizon, "buckets": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
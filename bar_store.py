@@ -0,0 +1,147 @@
+"""
+เก็บราคาย้อนหลัง (OHLCV รายวัน) ไว้ในเครื่อง แยกไฟล์ Parquet ต่อหุ้น
+
+แต่ละรอบจะดึงเฉพาะแท่งตั้งแต่วันล่าสุดที่มีอยู่แล้วมาต่อท้าย
+และถ้า yfinance ล่มก็ยังใช้ข้อมูลเดิมในเครื่องคำนวณต่อได้
+
+ราคาจาก yfinance (auto_adjust=True) ถูก adjust ย้อนหลังทุกครั้งที่มี split / ปันผล
+จึงดึงซ้อนกับ cache 1 แท่งที่ปิดแล้ว (overlap_start) ถ้าราคาปิดของแท่งนั้นไม่ตรงกัน (is_readjusted)
+ผู้เรียกต้องทิ้ง cache แล้วดึงใหม่ทั้ง period
+"""
+import os
+import logging
+import re
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+BAR_CACHE_DIR = os.getenv("BAR_CACHE_DIR", ".cache/bars")
+HISTORY_YEARS = 2  # เก็บย้อนหลังเท่ากับ period="2y" ที่ใช้ดึงจาก yfinance
+BAR_ADJUST_TOLERANCE = float(os.getenv("BAR_ADJUST_TOLERANCE", "0.0005"))  # ราคาปิดต่างกันเกินสัดส่วนนี้ = ถูก adjust ใหม่
+
+
+def _bar_path(symbol):
+    # สัญลักษณ์อย่าง BRK.B หรือ ^GSPC ต้องแปลงให้เป็นชื่อไฟล์ที่ปลอดภัย
+    safe_name = re.sub(r'[^A-Za-z0-9_-]', '_', symbol)
+    return os.path.join(BAR_CACHE_DIR, f"{safe_name}.parquet")
+
+
+def load_bars(symbol):
+    """อ่านราคาย้อนหลังจาก cache (ไม่มีหรืออ่านไม่ได้ → None)"""
+    path = _bar_path(symbol)
+    if not os.path.exists(path):
+        return None
+    
+    try:
+        df = pd.read_parquet(path)
+        return df if not df.empty else None
+    except Exception as e:
+        logger.warning("⚠️ Corrupted bar cache for %s, ignoring: %s", symbol, e)
+        return None
+
+
+def _naive_dates(df):
+    """
+    index เป็นวันที่แบบไม่มี timezone เสมอ
+    (yf.download คืนวันที่ไม่มี tz แต่ Ticker.history คืนเวลา New York → concat / เปรียบเทียบกันไม่ได้)
+    """
+    if df is None or df.empty or getattr(df.index, "tz", None) is None:
+        return df
+    df = df.copy()
+    df.index = df.index.tz_localize(None)
+    return df
+
+
+def save_bars(symbol, df):
+    """บันทึกราคาย้อนหลังลง cache (เขียนไฟล์ชั่วคราวก่อนแล้วค่อยแทนที่)"""
+    if df is None or df.empty:
+        return
+    df = _naive_dates(df)
+    
+    os.makedirs(BAR_CACHE_DIR, exist_ok=True)
+    path = _bar_path(symbol)
+    tmp_path = f"{path}.tmp"
+    
+    try:
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning("⚠️ Cannot write bar cache for %s: %s", symbol, e)
+
+
+def overlap_start(df):
+    """
+    วันที่เริ่มดึงแท่งใหม่: แท่งก่อนแท่งล่าสุดใน cache
+    (แท่งล่าสุดอาจเป็นแท่งระหว่างวันที่ราคายังเปลี่ยน ใช้ตรวจการ adjust ไม่ได้)
+    """
+    if df is None or df.empty:
+        return None
+    dates = df.index.sort_values()
+    return dates[-2] if len(dates) >= 2 else dates[-1]
+
+
+def is_readjusted(cached, new_bars, tolerance=BAR_ADJUST_TOLERANCE):
+    """แท่งที่ปิดแล้วซึ่งอยู่ทั้งใน cache และข้อมูลใหม่ มีราคาปิดไม่ตรงกัน → ราคาย้อนหลังถูก adjust ใหม่ (split / ปันผล)"""
+    cached = _naive_dates(cached)
+    new_bars = _naive_dates(new_bars)
+    if cached is None or cached.empty or new_bars is None or new_bars.empty:
+        return False
+    
+    closed = cached.index[cached.index < cached.index.max()]
+    common = closed.intersection(new_bars.index)
+    if common.empty:
+        return False
+    
+    old_close = cached.loc[common, 'Close'].astype(float)
+    new_close = new_bars.loc[common, 'Close'].astype(float)
+    return bool(((old_close - new_close).abs() > tolerance * new_close.abs()).any())
+
+
+def merge_bars(cached, new_bars):
+    """
+    ต่อแท่งใหม่เข้ากับ cache
+    
+    แท่งวันเดียวกันใช้ค่าจากข้อมูลใหม่ (แท่งล่าสุดระหว่างวันยังเปลี่ยนได้)
+    แล้วตัดให้เหลือย้อนหลัง HISTORY_YEARS ปี
+    """
+    cached = _naive_dates(cached)
+    new_bars = _naive_dates(new_bars)
+    if cached is None or cached.empty:
+        merged = new_bars
+    elif new_bars is None or new_bars.empty:
+        merged = cached
+    else:
+        merged = pd.concat([cached, new_bars[cached.columns.intersection(new_bars.columns)]])
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+    
+    if merged is None or merged.empty:
+        return merged
+    
+    cutoff = merged.index.max() - pd.DateOffset(years=HISTORY_YEARS)
+    return merged[merged.index > cutoff]
+
+
+def split_bulk_history(df, symbols):
+    """แยกผลลัพธ์ของ yf.download (หลาย ticker) ออกเป็น DataFrame ต่อหุ้น"""
+    frames = {}
+    
+    if df is None or df.empty:
+        return frames
+    
+    if not isinstance(df.columns, pd.MultiIndex):
+        # บางเวอร์ชันของ yfinance คืนคอลัมน์ชั้นเดียวเมื่อมีแค่ 1 ticker
+        if len(symbols) == 1:
+            frames[symbols[0]] = df.dropna(subset=['Close'])
+        return frames
+    
+    available = set(df.columns.get_level_values(0))
+    for symbol in symbols:
+        if symbol not in available:
+            continue
+        symbol_df = df[symbol].dropna(subset=['Close'])
+        if not symbol_df.empty:
+            frames[symbol] = symbol_df
+    
+    return frames
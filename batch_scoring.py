@@ -0,0 +1,302 @@
+"""
+คำนวณคะแนน + คำแนะนำของหุ้นทั้งชุดในครั้งเดียว (vectorized)
+
+ให้ผลตรงกับ calculate_overall_score_with_risk() + generate_recommendation_advanced()
+ใน stock_collector.py ทีละตัว แต่รับข้อมูลทุกหุ้นเป็น DataFrame (1 แถว = 1 หุ้น)
+ใช้ re-score ทั้ง universe ใหม่ (เช่นหลังปรับน้ำหนัก) ได้ในไม่กี่มิลลิวินาที
+
+ตรวจว่าตรงกับฟังก์ชันเดิม:  python -m pytest tests/test_batch_scoring.py
+"""
+import numpy as np
+import pandas as pd
+
+
+# คอลัมน์ที่ใช้ (ไม่มี = ถือว่าเป็น None)
+SCORING_COLUMNS = [
+    "price", "rsi", "macd", "macd_signal", "ema_20", "ema_50", "ema_200",
+    "bb_upper", "bb_lower", "upside_pct", "analyst_buy_pct",
+    "pe_ratio", "peg_ratio", "eps_growth_pct", "market_cap", "news_sentiment",
+]
+
+# น้ำหนัก (technical, fundamental, sentiment) เหมือน get_scoring_weights()
+ETF_WEIGHTS = (1.0, 0.0, 0.0)
+MARKET_CAP_WEIGHTS = [
+    # (market_cap มากกว่า, น้ำหนัก)
+    (200_000_000_000, (0.25, 0.40, 0.35)),
+    (10_000_000_000, (0.35, 0.35, 0.30)),
+    (None, (0.50, 0.30, 0.20)),
+]
+CATEGORY_WEIGHTS = {
+    'Growth': (0.30, 0.30, 0.40),
+    'Value': (0.20, 0.60, 0.20),
+    'Dividend': (0.25, 0.50, 0.25),
+    'Momentum': (0.60, 0.20, 0.20),
+    'Core': (0.35, 0.35, 0.30),
+}
+DEFAULT_WEIGHTS = (0.35, 0.35, 0.30)
+
+
+def _column(frame, name):
+    if name not in frame:
+        return np.full(len(frame), np.nan)
+    return pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=float)
+
+
+def _present(values):
+    """เหมือน `if value:` ของ scalar (None/NaN/0 = ไม่มีค่า)"""
+    return ~np.isnan(values) & (values != 0)
+
+
+def _tiers(values, tiers):
+    """tiers = [(mask, คะแนน), ...] เลือกอันแรกที่ตรง (เหมือน if/elif)"""
+    return np.select([mask for mask, _ in tiers], [points for _, points in tiers], 0)
+
+
+def _categories(frame):
+    if "category" not in frame:
+        return np.full(len(frame), "Core", dtype=object)
+    return frame["category"].to_numpy(dtype=object)
+
+
+def technical_scores(frame):
+    """calculate_technical_score() ทั้งชุด (0-40)"""
+    with np.errstate(invalid="ignore"):
+        rsi = _column(frame, "rsi")
+        has = _present(rsi)
+        score = _tiers(rsi, [
+            (has & (rsi >= 30) & (rsi <= 70), 10),
+            (has & (((rsi >= 20) & (rsi < 30)) | ((rsi > 70) & (rsi <= 80))), 5),
+        ])
+        
+        macd, signal = _column(frame, "macd"), _column(frame, "macd_signal")
+        has = _present(macd) & _present(signal)
+        score += _tiers(macd, [
+            (has & (macd > signal), 10),
+            (has & (macd > signal * 0.9), 5),
+        ])
+        
+        price, ema_20, ema_50 = _column(frame, "price"), _column(frame, "ema_20"), _column(frame, "ema_50")
+        has = _present(price) & _present(ema_20) & _present(ema_50)
+        score += _tiers(price, [
+            (has & (price > ema_20) & (ema_20 > ema_50), 10),
+            (has & (price > ema_20), 5),
+        ])
+        
+        upside = _column(frame, "upside_pct")
+        has = _present(upside)
+        score += _tiers(upside, [
+            (has & (upside > 20), 10),
+            (has & (upside > 10), 7),
+            (has & (upside > 5), 4),
+        ])
+    return score
+
+
+def fundamental_scores(frame):
+    """calculate_fundamental_score() ทั้งชุด (0-30)"""
+    with np.errstate(invalid="ignore"):
+        pe = _column(frame, "pe_ratio")
+        has = _present(pe)
+        score = _tiers(pe, [
+            (has & (pe >= 10) & (pe <= 25), 10),
+            (has & (((pe >= 5) & (pe < 10)) | ((pe > 25) & (pe <= 35))), 5),
+        ])
+        
+        peg = _column(frame, "peg_ratio")
+        has = _present(peg)
+        score += _tiers(peg, [
+            (has & (peg < 1), 10),
+            (has & (peg >= 1) & (peg <= 1.5), 7),
+            (has & (peg > 1.5) & (peg <= 2), 4),
+        ])
+        
+        eps = _column(frame, "eps_growth_pct")
+        has = _present(eps)
+        score += _tiers(eps, [
+            (has & (eps > 20), 10),
+            (has & (eps > 10), 7),
+            (has & (eps > 5), 4),
+        ])
+    return score
+
+
+def sentiment_scores(frame):
+    """calculate_sentiment_score() ทั้งชุด (0-30)"""
+    with np.errstate(invalid="ignore"):
+        news = _column(frame, "news_sentiment")
+        has = _present(news)
+        score = _tiers(news, [
+            (has & (news > 0.5), 15),
+            (has & (news > 0.2), 10),
+            (has & (news >= -0.2), 5),
+        ])
+        
+        analyst = _column(frame, "analyst_buy_pct")
+        has = _present(analyst)
+        score += _tiers(analyst, [
+            (has & (analyst >= 70), 15),
+            (has & (analyst >= 50), 10),
+            (has & (analyst >= 30), 5),
+        ])
+    return score
+
+
+def risk_scores(frame):
+    """calculate_risk_score() ทั้งชุด (0-100)"""
+    with np.errstate(invalid="ignore"):
+        rsi = _column(frame, "rsi")
+        has = _present(rsi)
+        risk = _tiers(rsi, [
+            (has & ((rsi > 80) | (rsi < 20)), 30),
+            (has & ((rsi > 70) | (rsi < 30)), 15),
+        ])
+        
+        price, upper, lower = _column(frame, "price"), _column(frame, "bb_upper"), _column(frame, "bb_lower")
+        has = _present(price) & _present(upper) & _present(lower)
+        risk += _tiers(price, [
+            (has & (price > upper), 20),
+            (has & (price < lower), 15),
+        ])
+        
+        market_cap = _column(frame, "market_cap")
+        has = _present(market_cap)
+        risk += _tiers(market_cap, [
+            (has & (market_cap < 1_000_000_000), 25),
+            (has & (market_cap < 10_000_000_000), 10),
+        ])
+        
+        pe, peg = _column(frame, "pe_ratio"), _column(frame, "peg_ratio")
+        risk += np.where(_present(pe) & (pe > 50), 20, 0)
+        risk += np.where(_present(peg) & (peg > 2), 15, 0)
+    return np.minimum(100, risk)
+
+
+def scoring_weights(frame):
+    """get_scoring_weights() ทั้งชุด → array (N, 3)"""
+    categories = _categories(frame)
+    market_cap = _column(frame, "market_cap")
+    
+    weights = np.array([CATEGORY_WEIGHTS.get(c, DEFAULT_WEIGHTS) if isinstance(c, str) else DEFAULT_WEIGHTS
+                        for c in categories], dtype=float).reshape(len(frame), 3)
+    
+    has_cap = _present(market_cap)
+    with np.errstate(invalid="ignore"):
+        assigned = np.zeros(len(frame), dtype=bool)
+        for threshold, tier in MARKET_CAP_WEIGHTS:
+            mask = has_cap & ~assigned
+            if threshold is not None:
+                mask &= market_cap > threshold
+            weights[mask] = tier
+            assigned |= mask
+    
+    weights[categories == 'ETF'] = ETF_WEIGHTS
+    return weights
+
+
+def adjust_scores_by_risk(scores, risk):
+    """adjust_score_by_risk() ทั้งชุด"""
+    scores = np.asarray(scores)
+    return np.select(
+        [risk >= 70, risk >= 50, risk >= 30],
+        [np.trunc(scores * 0.7), np.trunc(scores * 0.85), np.trunc(scores * 0.95)],
+        scores,
+    ).astype(int)
+
+
+def overall_scores(frame):
+    """calculate_overall_score() (แบบ Dynamic Weighting) ทั้งชุด"""
+    weights = scoring_weights(frame)
+    final = (
+        (technical_scores(frame) / 40) * 100 * weights[:, 0] +
+        (fundamental_scores(frame) / 30) * 100 * weights[:, 1] +
+        (sentiment_scores(frame) / 30) * 100 * weights[:, 2]
+    )
+    return np.clip(np.round(final), 0, 100).astype(int)
+
+
+def _recommendation_branches(scores, risk):
+    """เงื่อนไขแต่ละกิ่ง (ตามลำดับ if/elif) ของ generate_recommendation_advanced()"""
+    strong_buy = (scores >= 75) & (risk < 50)
+    good = ~strong_buy & (scores >= 60)
+    return [strong_buy, good & (risk >= 60), good, scores >= 45, scores >= 30]
+
+
+def recommendation_labels(scores, risk):
+    """เฉพาะ recommendation (Strong Buy ... Strong Sell) ทั้งชุด"""
+    return np.select(
+        _recommendation_branches(np.asarray(scores), np.asarray(risk)),
+        ["Strong Buy", "Hold", "Buy", "Hold", "Sell"],
+        "Strong Sell",
+    ).astype(object)
+
+
+def recommendations(scores, risk, frame):
+    """generate_recommendation_advanced() ทั้งชุด → DataFrame"""
+    scores = np.asarray(scores)
+    risk = np.asarray(risk)
+    categories = _categories(frame)
+    
+    confidence = np.select([risk < 20, risk < 50], ["High", "Medium"], "Low").astype(object)
+    recommendation = recommendation_labels(scores, risk)
+    
+    lower_confidence = pd.Series(confidence).str.lower()
+    reason = np.select(
+        _recommendation_branches(scores, risk),
+        [
+            ("Excellent signals with " + lower_confidence + " risk").to_numpy(),
+            ("Good score but high risk (" + pd.Series(risk).astype(str) + "/100)").to_numpy(),
+            ("Positive momentum with " + lower_confidence + " risk").to_numpy(),
+            "Wait for clearer signals",
+            "Weak performance, consider reducing position",
+        ],
+        "Poor metrics across the board",
+    ).astype(object)
+    
+    # Price Target: ปรับ upside ตามความเสี่ยง (round() ของ Python ทีละตัวเพื่อให้ตรงกับ scalar)
+    price, upside = _column(frame, "price"), _column(frame, "upside_pct")
+    with np.errstate(invalid="ignore"):
+        has_target = _present(upside) & (upside > 0)
+    adjusted = upside * (1 - risk / 200)
+    raw_target = price * (1 + adjusted / 100)
+    price_target = np.full(len(frame), None, dtype=object)
+    for i in np.flatnonzero(has_target & ~np.isnan(raw_target)):
+        price_target[i] = round(float(raw_target[i]), 2)
+    
+    time_horizon = np.select(
+        [np.isin(categories, ['Growth', 'Momentum']), np.isin(categories, ['Value', 'Dividend'])],
+        ["3-6 months", "6-12 months"],
+        "6 months",
+    ).astype(object)
+    
+    risk_level = np.select([risk >= 60, risk >= 30], ["High", "Medium"], "Low").astype(object)
+    
+    return pd.DataFrame({
+        "recommendation": recommendation,
+        "reason": reason,
+        "confidence": confidence,
+        "price_target": price_target,
+        "time_horizon": time_horizon,
+        "risk_level": risk_level,
+    }, index=frame.index)
+
+
+def score_universe(frame):
+    """
+    คะแนน + คำแนะนำของทุกหุ้น (เหมือน STEP 5 ของ process_symbol)
+    
+    frame: DataFrame / record array ที่มีคอลัมน์ตาม SCORING_COLUMNS (+ category)
+    Returns: DataFrame เดิม + base_score, risk_score, overall_score, recommendation,
+             reason, confidence, price_target, time_horizon, risk_level
+    """
+    if not isinstance(frame, pd.DataFrame):
+        frame = pd.DataFrame(frame)
+    
+    base = overall_scores(frame)
+    risk = risk_scores(frame)
+    overall = adjust_scores_by_risk(base, risk)
+    
+    result = frame.copy()
+    result["base_score"] = base
+    result["risk_score"] = risk
+    result["overall_score"] = overall
+    return result.join(recommendations(overall, risk, frame))
@@ -0,0 +1,191 @@
+"""
+Benchmark main() แบบไม่ต้องต่อเน็ต (ใช้ข้อมูลที่บันทึกไว้ใน provider_replay + Supabase ในหน่วยความจำ)
+
+วัดเวลาทั้งรอบ + เวลาแต่ละ stage (run_metrics) ที่ 10 / 100 / 1000 หุ้นจำลอง
+แต่ละขนาดรันใน process ใหม่ที่มี cache ว่าง: รอบแรก = cold (ยังไม่มี cache), รอบถัดไป = warm (เหมือนรอบระหว่างวัน)
+
+    python benchmark.py --record AAPL MSFT NVDA JPM XOM   # บันทึก fixture (ต้องต่อเน็ต, ครั้งเดียว)
+    python benchmark.py                                    # 10 / 100 / 1000 หุ้น
+    python benchmark.py --sizes 100 --latency-ms 50 --profile
+    python benchmark.py --json bench.json                  # เก็บผลไว้เทียบกับรอบก่อน
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+from provider_replay import BENCH_FIXTURES_DIR
+
+
+BENCH_SIZES = [10, 100, 1000]
+BENCH_RUNS = 2          # cold + warm
+PROFILE_TOP = 25
+
+# ค่าที่ต้องมีตอน import stock_collector (ไม่ได้ต่อ Supabase จริง)
+_DUMMY_ENV = {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.replay",
+}
+
+
+def _child(args):
+    """รัน main() ของหุ้นจำลอง args.child ตัว แล้วเขียนผลเป็น JSON (ทำงานใน subprocess)"""
+    from log_config import setup_logging
+    setup_logging()
+    
+    import stock_collector
+    import rate_limiter
+    from provider_replay import install_replay
+    from run_metrics import metrics
+    
+    fixtures, db = install_replay(stock_collector, args.child, args.fixtures, args.latency_ms / 1000)
+    if not args.rate_limits:
+        for provider in rate_limiter.rate_limiters:
+            rate_limiter.rate_limiters[provider] = rate_limiter.TokenBucket(0)
+    
+    runs = []
+    for run in range(args.runs):
+        profiler = None
+        if args.profile and run == 0:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        
+        calls_before = dict(fixtures.calls)
+        db_calls_before = db.calls
+        start = time.perf_counter()
+        asyncio.run(stock_collector.main())
+        elapsed = time.perf_counter() - start
+        
+        if profiler:
+            import io
+            import pstats
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            profile_text = out.getvalue()
+        else:
+            profile_text = None
+        
+        runs.append({
+            "run": "cold" if run == 0 else "warm",
+            "wall_seconds": round(elapsed, 3),
+            "symbols_per_second": round(args.child / elapsed, 2),
+            "supabase_calls": db.calls - db_calls_before,
+            "provider_calls": {name: count - calls_before.get(name, 0) for name, count in fixtures.calls.items()},
+            "predictions": len(db.tables.get("ai_predictions", [])),
+            "stages": metrics.report()["stages"],
+            "profile": profile_text,
+        })
+    
+    with open(args.child_output, "w") as f:
+        json.dump({"symbols": args.child, "runs": runs}, f)
+
+
+def run_size(size, args):
+    """รัน benchmark ขนาด size ใน process ใหม่ (module state และ cache ไม่ปนกับขนาดอื่น)"""
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        env = dict(os.environ)
+        for key in ("RUN_ID", "GITHUB_RUN_ID"):   # ทุกรอบเป็นรอบใหม่ (ไม่ resume จาก run journal)
+            env.pop(key, None)
+        for key, value in _DUMMY_ENV.items():
+            env.setdefault(key, value)
+        env.update({
+            "BAR_CACHE_DIR": os.path.join(workdir, "bars"),
+            "INDICATOR_STATE_DIR": os.path.join(workdir, "indicators"),
+            "SEEN_NEWS_PATH": os.path.join(workdir, "seen_news.bin"),
+            "TTL_CACHE_PATH": os.path.join(workdir, "fundamentals.json"),
+            "TRANSLATION_CACHE_PATH": os.path.join(workdir, "translations.sqlite"),
+            "RUN_REPORT_PATH": os.path.join(workdir, "run_report.json"),
+            "RUN_JOURNAL_PATH": os.path.join(workdir, "run_journal.jsonl"),
+        })
+        output = os.path.join(workdir, "result.json")
+        
+        command = [
+            sys.executable, os.path.abspath(__file__),
+            "--child", str(size), "--child-output", output,
+            "--fixtures", os.path.abspath(args.fixtures),
+            "--runs", str(args.runs), "--latency-ms", str(args.latency_ms),
+        ]
+        if args.rate_limits:
+            command.append("--rate-limits")
+        if args.profile:
+            command.append("--profile")
+        
+        stdout = None if args.verbose else subprocess.DEVNULL
+        subprocess.run(command, env=env, stdout=stdout, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        
+        with open(output) as f:
+            return json.load(f)
+
+
+def print_report(results):
+    print(f"\n{'='*72}")
+    print("🏁 Collector benchmark (replayed providers, in-memory Supabase)")
+    print(f"{'='*72}")
+    print(f"   {'Symbols':>8} {'Run':<5} {'Wall s':>9} {'Sym/s':>8} {'DB calls':>9}  Top stages (total s)")
+    for result in results:
+        for run in result["runs"]:
+            top = sorted(
+                ((name, stats["total_seconds"]) for name, stats in run["stages"].items() if name != "symbol"),
+                key=lambda item: item[1], reverse=True
+            )[:3]
+            top_str = ", ".join(f"{name} {seconds:.2f}" for name, seconds in top)
+            print(f"   {result['symbols']:>8} {run['run']:<5} {run['wall_seconds']:>9.2f} "
+                  f"{run['symbols_per_second']:>8.1f} {run['supabase_calls']:>9}  {top_str}")
+    print(f"{'='*72}\n")
+    
+    for result in results:
+        for run in result["runs"]:
+            if run.get("profile"):
+                print(f"📋 Profile ({result['symbols']} symbols, {run['run']} run)")
+                print(run["profile"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of stock_collector.main()")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCH_SIZES, help="จำนวนหุ้นจำลองของแต่ละรอบ")
+    parser.add_argument("--runs", type=int, default=BENCH_RUNS, help="จำนวนรอบต่อขนาด (รอบแรก cold ที่เหลือ warm)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="หน่วงทุก request ของ provider จำลอง")
+    parser.add_argument("--rate-limits", action="store_true", help="ใช้ rate limit จริงของแต่ละ provider")
+    parser.add_argument("--fixtures", default=BENCH_FIXTURES_DIR, help="โฟลเดอร์ fixture")
+    parser.add_argument("--record", nargs="+", metavar="SYMBOL", help="บันทึก fixture จาก provider จริงแล้วจบ")
+    parser.add_argument("--profile", action="store_true", help="cProfile รอบ cold ของแต่ละขนาด")
+    parser.add_argument("--json", metavar="FILE", help="บันทึกผลเป็น JSON")
+    parser.add_argument("--verbose", action="store_true", help="แสดง output ของ main()")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.child:
+        _child(args)
+        return 0
+    
+    if args.record:
+        from provider_replay import record_fixtures
+        recorded = record_fixtures(args.record, args.fixtures, finnhub_key=os.getenv("FINNHUB_KEY"))
+        print(f"📼 Recorded {len(recorded)}/{len(args.record)} symbols into {args.fixtures}")
+        return 0 if recorded else 1
+    
+    if not os.path.exists(os.path.join(args.fixtures, "manifest.json")):
+        print(f"ℹ️ No fixtures in {args.fixtures}, using synthetic prices and news")
+    
+    results = []
+    for size in args.sizes:
+        print(f"⏱️ Running {size} symbols...")
+        results.append(run_size(size, args))
+    
+    print_report(results)
+    
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+คำนวณ indicator ของหลายหุ้นใน process pool (ใช้ทุก core ของเครื่อง)
+
+main() แบ่งหุ้นเป็นชุดละ CPU_CHUNK_SIZE ตัว แล้วส่งไปคำนวณในแต่ละ process
+ข้อมูลที่ส่งเป็น NumPy array (วันที่ datetime64 + ราคาปิด) ไม่ใช่ DataFrame ทั้งก้อน
+หุ้นแต่ละตัวอยู่ใน chunk เดียว จึงอัพเดต indicator state ของตัวเองได้โดยไม่ชนกัน
+
+ใช้ start method แบบ spawn เพราะตอนนั้นใน process หลักมี thread ของ asyncio.to_thread ทำงานอยู่แล้ว
+(fork ขณะมี thread อาจค้างที่ lock ที่ thread อื่นถืออยู่)
+
+worker แบบ spawn จะ import __main__ ของ process หลักใหม่ (ปกติคือ stock_collector.py → สร้าง Supabase client
+และต้องมี SUPABASE_URL / SUPABASE_KEY ในทุก worker) ระหว่างสร้าง worker จึงให้ __main__ เป็นโมดูลนี้แทน
+(import แค่ numpy / pandas / indicator_engine / indicator_state)
+"""
+import os
+import sys
+import asyncio
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from indicator_engine import align_closes, latest_indicators
+from indicator_state import update_indicators
+
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "0"))  # 0 = คำนวณใน process หลักเหมือนเดิม
+CPU_CHUNK_SIZE = int(os.getenv("CPU_CHUNK_SIZE", "32"))  # จำนวนหุ้นต่อ 1 งานที่ส่งเข้า pool
+
+
+def pack_history(df):
+    """DataFrame ราคา → (วันที่ datetime64[ns] แบบ UTC, timezone, ราคาปิด) สำหรับส่งข้าม process"""
+    index = df.index
+    tz = str(index.tz) if index.tz is not None else None
+    if tz:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return index.values.astype("datetime64[ns]"), tz, df['Close'].to_numpy(dtype=float)
+
+
+def unpack_history(dates, tz, closes):
+    index = pd.DatetimeIndex(dates)
+    if tz:
+        index = index.tz_localize("UTC").tz_convert(tz)
+    return pd.DataFrame({'Close': closes}, index=index)
+
+
+def _incremental_chunk(items):
+    """update_indicators() ของหุ้นทั้ง chunk (ทำงานใน worker process)"""
+    results = {}
+    for symbol, dates, tz, closes in items:
+        try:
+            results[symbol] = update_indicators(symbol, unpack_history(dates, tz, closes))
+        except Exception:
+            results[symbol] = None  # ให้ process หลักคำนวณเองตามปกติ
+    return results
+
+
+def _vectorized_chunk(symbols, closes):
+    """latest_indicators() ของเมทริกซ์ย่อย (ทำงานใน worker process)"""
+    return dict(zip(symbols, latest_indicators(closes)))
+
+
+@contextmanager
+def _spawn_as_worker_main():
+    """ให้ worker ที่ spawn ระหว่างนี้ import โมดูลนี้เป็น __main__ แทน script ของ process หลัก"""
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = sys.modules[__name__]
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+async def compute_indicators_parallel(histories, engine="incremental", workers=None, chunk_size=None):
+    """
+    คำนวณ indicator ล่าสุดของทุกหุ้นใน histories ด้วย process pool
+    
+    engine: "incremental" (state ต่อหุ้น) หรือ "vectorized" (เมทริกซ์ของทั้ง chunk)
+    Returns: {symbol: dict} เหมือน compute_universe_indicators() (หุ้นที่คำนวณไม่ได้จะไม่มีใน dict)
+    """
+    workers = workers or CPU_WORKERS
+    chunk_size = chunk_size or CPU_CHUNK_SIZE
+    frames = {symbol: df for symbol, df in histories.items() if df is not None and not df.empty}
+    if not frames or workers <= 0:
+        return {}
+    
+    loop = asyncio.get_running_loop()
+    context = multiprocessing.get_context("spawn")
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # worker ถูก spawn ตอน submit งาน (ใน thread นี้) → ส่งงานทั้งหมดภายใน _spawn_as_worker_main()
+        with _spawn_as_worker_main():
+            if engine == "vectorized":
+                symbols, _, closes = align_closes(frames)
+                jobs = [
+                    loop.run_in_executor(pool, _vectorized_chunk, symbols[start:start + chunk_size],
+                                         np.ascontiguousarray(closes[start:start + chunk_size]))
+                    for start in range(0, len(symbols), chunk_size)
+                ]
+            else:
+                items = [(symbol, *pack_history(df)) for symbol, df in frames.items()]
+                jobs = [
+                    loop.run_in_executor(pool, _incremental_chunk, items[start:start + chunk_size])
+                    for start in range(0, len(items), chunk_size)
+                ]
+        
+        results = {}
+        for chunk in await asyncio.gather(*jobs):
+            results.update({symbol: values for symbol, values in chunk.items() if values})
+    
+    return results
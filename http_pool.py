@@ -0,0 +1,97 @@
+"""
+HTTP client ที่ใช้ร่วมกันทุก request ออกนอกเครื่อง (Finnhub, Twelve Data)
+
+เดิม requests.get ทุกครั้งเปิด TCP + TLS ใหม่ → ตอนนี้มี client ต่อ host ที่เก็บ connection ไว้ใช้ซ้ำ (keep-alive)
+- มี httpx + h2 → ใช้ httpx.Client แบบ HTTP/2 (หลาย request วิ่งบน connection เดียว)
+- ไม่มี → ใช้ requests.Session + HTTPAdapter ที่มี pool ขนาด HTTP_POOL_SIZE
+ทั้งสองแบบใช้จากหลาย thread พร้อมกันได้ จึงเรียกผ่าน run_blocking() ได้เหมือน requests.get
+
+Supabase client (postgrest) มี httpx connection pool ของตัวเองอยู่แล้ว
+is_connection_error() ใช้ตัดสินว่าต้องสร้าง client ใหม่หรือไม่ (เฉพาะตอน connection เสียจริง)
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from run_metrics import metrics
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    from curl_cffi.requests import exceptions as curl_errors  # transport ของ yfinance
+except ImportError:
+    curl_errors = None
+
+try:
+    import h2  # noqa: F401  (httpx ต้องมี h2 ถึงจะใช้ HTTP/2 ได้)
+    HAS_HTTP2 = httpx is not None
+except ImportError:
+    HAS_HTTP2 = False
+
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))  # connection ต่อ host (ควร >= MAX_CONCURRENCY)
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "1") != "0"         # 0 = ใช้ requests แม้มี httpx
+
+
+class HttpPool:
+    """Client ต่อ host สร้างครั้งแรกที่มี request ไป host นั้น แล้วใช้ซ้ำตลอดรอบ"""
+    
+    def __init__(self, pool_size=HTTP_POOL_SIZE, http2=HTTP_HTTP2):
+        self.pool_size = pool_size
+        self.http2 = http2 and HAS_HTTP2
+        self._guard = threading.Lock()
+        self._clients = {}
+    
+    def _create(self):
+        if self.http2:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            return httpx.Client(http2=True, limits=limits, follow_redirects=True)
+        
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    def client(self, url):
+        host = urlsplit(url).netloc
+        with self._guard:
+            if host not in self._clients:
+                self._clients[host] = self._create()
+            return self._clients[host]
+    
+    def get(self, url, **kwargs):
+        """ใช้แทน requests.get (params / timeout / raise_for_status() / json() เหมือนกัน)"""
+        response = self.client(url).get(url, **kwargs)
+        metrics.add_bytes(len(response.content))
+        return response
+    
+    def close(self):
+        with self._guard:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+
+def is_connection_error(error):
+    """error มาจาก connection เสีย (ต่อไม่ติด, ถูกตัด, timeout) ไม่ใช่ error จาก API"""
+    transport_errors = (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout)
+    if httpx is not None:
+        transport_errors += (httpx.TransportError,)
+    if curl_errors is not None:
+        transport_errors += (curl_errors.ConnectionError, curl_errors.Timeout)
+    
+    while error is not None:
+        if isinstance(error, transport_errors):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+http = HttpPool()
@@ -0,0 +1,226 @@
+"""
+คำนวณ indicator ของหุ้นทั้งหมดพร้อมกันบนเมทริกซ์ NumPy (symbols × dates)
+
+ราคาปิดของทุกหุ้นถูกจัดเรียงตามวันที่ในเมทริกซ์เดียว (วันที่ไม่มีข้อมูล = NaN)
+แล้วคำนวณ EMA / RSI / MACD / Bollinger ทีละคอลัมน์แบบ vectorized ข้ามทุกหุ้น
+แทนการเรียก TA-Lib ทีละตัว และใช้ทำ cross-sectional rank ได้
+"""
+import numpy as np
+import pandas as pd
+
+from indicator_state import EMA_PERIODS, RSI_PERIOD, MACD_FAST, MACD_SLOW, MACD_SIGNAL, BB_PERIOD, BB_NBDEV
+
+
+def align_closes(frames):
+    """
+    รวมราคาปิดของทุกหุ้นเป็นเมทริกซ์เดียว
+    
+    Returns: (symbols, dates, closes) โดย closes มีขนาด len(symbols) × len(dates)
+    """
+    symbols = [symbol for symbol, df in frames.items() if df is not None and not df.empty]
+    if not symbols:
+        return [], pd.DatetimeIndex([]), np.empty((0, 0))
+    
+    # แปลงวันที่เป็นวันปฏิทินตามเวลาท้องถิ่นของตลาด แล้วจัดตำแหน่งด้วย searchsorted แทน pd.concat
+    days = []
+    for symbol in symbols:
+        index = frames[symbol].index
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        days.append(index.values.astype('datetime64[D]'))
+    dates = np.unique(np.concatenate(days))
+    
+    closes = np.full((len(symbols), len(dates)), np.nan)
+    for row, symbol in enumerate(symbols):
+        closes[row, np.searchsorted(dates, days[row])] = frames[symbol]['Close'].values
+    
+    return symbols, pd.DatetimeIndex(dates), closes
+
+
+def _compact(closes):
+    """
+    เลื่อนราคาของแต่ละหุ้นมาชิดซ้าย (แท่งที่ k ของหุ้นตัวเอง = คอลัมน์ k)
+    
+    ทำให้ทุกหุ้นเริ่ม seed indicator ที่คอลัมน์เดียวกัน เหมือนเรียก TA-Lib ทีละตัว
+    คืนค่าเป็นเมทริกซ์แบบ time-major (bars × symbols) เพื่อให้แต่ละรอบของลูปอ่านหน่วยความจำต่อเนื่อง
+    """
+    valid = ~np.isnan(closes)
+    order = np.argsort(~valid, axis=1, kind='stable')
+    compact = np.take_along_axis(closes, order, axis=1)
+    return np.ascontiguousarray(compact.T), order, valid.sum(axis=1)
+
+
+def _expand(values, order):
+    """คืนค่าจากตำแหน่งชิดซ้าย (time-major) กลับไปที่คอลัมน์วันที่เดิม (symbols × dates)"""
+    out = np.full(order.shape, np.nan)
+    np.put_along_axis(out, order, values.T, axis=1)
+    return out
+
+
+def _ema(x, period, start=0):
+    """EMA ตาม TA-Lib: seed ด้วย SMA ของ period แท่งแรก (นับจากแท่ง start)"""
+    out = np.full(x.shape, np.nan)
+    seed = start + period - 1
+    if x.shape[0] <= seed:
+        return out
+    
+    k = 2.0 / (period + 1)
+    prev = x[start:seed + 1].mean(axis=0)
+    out[seed] = prev
+    step = np.empty(x.shape[1])
+    for j in range(seed + 1, x.shape[0]):
+        np.subtract(x[j], prev, out=step)
+        step *= k
+        prev += step
+        out[j] = prev
+    return out
+
+
+def _rsi(x):
+    out = np.full(x.shape, np.nan)
+    if x.shape[0] <= RSI_PERIOD:
+        return out
+    
+    change = np.diff(x, axis=0)
+    gain = np.where(change > 0, change, 0.0)
+    loss = np.where(change < 0, -change, 0.0)
+    gain[np.isnan(change)] = np.nan
+    loss[np.isnan(change)] = np.nan
+    
+    # Wilder smoothing = EMA ที่ k = 1/period (seed ด้วย SMA เหมือนกัน)
+    avg_gain = np.full(x.shape, np.nan)
+    avg_loss = np.full(x.shape, np.nan)
+    avg_gain[1:] = _wilder(gain)
+    avg_loss[1:] = _wilder(loss)
+    
+    total = avg_gain + avg_loss
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = np.where(np.abs(total) < 0.00000001, 0.0, 100.0 * avg_gain / total)
+    out[np.isnan(total) | np.isnan(x)] = np.nan
+    return out
+
+
+def _wilder(x):
+    out = np.full(x.shape, np.nan)
+    if x.shape[0] < RSI_PERIOD:
+        return out
+    
+    prev = x[:RSI_PERIOD].mean(axis=0)
+    out[RSI_PERIOD - 1] = prev
+    for j in range(RSI_PERIOD, x.shape[0]):
+        prev = (prev * (RSI_PERIOD - 1) + x[j]) / RSI_PERIOD
+        out[j] = prev
+    return out
+
+
+def _macd(x):
+    macd = np.full(x.shape, np.nan)
+    signal = np.full(x.shape, np.nan)
+    if x.shape[0] < MACD_SLOW:
+        return macd, signal
+    
+    # TA-Lib seed fast และ slow EMA ที่แท่งเดียวกัน (แท่งที่ MACD_SLOW)
+    fast = _ema(x, MACD_FAST, start=MACD_SLOW - MACD_FAST)
+    slow = _ema(x, MACD_SLOW)
+    line = fast - slow
+    
+    signal = _ema(line, MACD_SIGNAL, start=MACD_SLOW - 1)
+    macd = np.where(np.isnan(signal), np.nan, line)
+    return macd, signal
+
+
+def _bollinger(x):
+    upper = np.full(x.shape, np.nan)
+    lower = np.full(x.shape, np.nan)
+    if x.shape[0] < BB_PERIOD:
+        return upper, lower
+    
+    zeros = np.zeros((1, x.shape[1]))
+    cum = np.concatenate([zeros, np.cumsum(x, axis=0)])
+    cum_sq = np.concatenate([zeros, np.cumsum(x * x, axis=0)])
+    
+    mean = (cum[BB_PERIOD:] - cum[:-BB_PERIOD]) / BB_PERIOD
+    variance = (cum_sq[BB_PERIOD:] - cum_sq[:-BB_PERIOD]) / BB_PERIOD - mean * mean
+    stddev = np.sqrt(np.where(variance > 0.00000001, variance, 0.0))
+    
+    upper[BB_PERIOD - 1:] = mean + BB_NBDEV * stddev
+    lower[BB_PERIOD - 1:] = mean - BB_NBDEV * stddev
+    return upper, lower
+
+
+def _compute_compact(compact):
+    values = {"price": compact, "rsi": _rsi(compact)}
+    values["macd"], values["macd_signal"] = _macd(compact)
+    for period in EMA_PERIODS:
+        values[f"ema_{period}"] = _ema(compact, period)
+    values["bb_upper"], values["bb_lower"] = _bollinger(compact)
+    return values
+
+
+def compute_indicator_matrix(closes):
+    """
+    คำนวณ indicator ทุกวันของทุกหุ้น
+    
+    Returns: {"rsi": N×T, "macd": N×T, ...} (NaN = ยังไม่พอคำนวณหรือวันนั้นไม่มีข้อมูล)
+    """
+    compact, order, _ = _compact(closes)
+    return {name: _expand(values, order) for name, values in _compute_compact(compact).items()}
+
+
+def compute_indicator_bars(closes):
+    """
+    คำนวณ indicator ทุกแท่งของทุกหุ้นแบบชิดซ้าย (ไม่ย้อนกลับไปตามวันที่)
+    
+    Returns: ({"price": bars×symbols, "rsi": bars×symbols, ...}, จำนวนแท่งของแต่ละหุ้น)
+    แท่งที่ k ของทุกหุ้นอยู่แถวเดียวกัน จึงเลื่อนไปข้างหน้า k แท่งได้ตรงๆ (เช่น forward return)
+    """
+    compact, _, lengths = _compact(closes)
+    return _compute_compact(compact), lengths
+
+
+def latest_indicators(closes):
+    """
+    ค่า indicator ณ แท่งสุดท้ายของแต่ละแถวใน closes (symbols × dates)
+    
+    Returns: list ของ dict (รูปแบบเดียวกับ calculate_technical_indicators) หรือ None ถ้าแถวนั้นไม่มีข้อมูล
+    """
+    compact, _, lengths = _compact(closes)
+    values = _compute_compact(compact)
+    
+    rows = np.arange(closes.shape[0])
+    last = np.maximum(lengths - 1, 0)
+    latest = {name: matrix[last, rows].tolist() for name, matrix in values.items()}
+    
+    return [
+        {name: (column[row] if column[row] == column[row] else None) for name, column in latest.items()}
+        if lengths[row] else None
+        for row in rows
+    ]
+
+
+def compute_universe_indicators(frames):
+    """
+    คำนวณ indicator ล่าสุดของทุกหุ้นในครั้งเดียว
+    
+    Returns: {symbol: dict} รูปแบบเดียวกับ calculate_technical_indicators()
+    """
+    symbols, _, closes = align_closes(frames)
+    if not symbols:
+        return {}
+    
+    return {
+        symbol: values
+        for symbol, values in zip(symbols, latest_indicators(closes))
+        if values is not None
+    }
+
+
+def cross_sectional_rank(matrix):
+    """Percentile rank (0-1) ของแต่ละหุ้นเทียบกับหุ้นอื่นในวันเดียวกัน (ทุกคอลัมน์)"""
+    return pd.DataFrame(matrix).rank(axis=0, pct=True).values
+
+
+def rank_universe(results, field):
+    """Percentile rank ของค่า field ล่าสุด เช่น rank_universe(results, 'rsi')"""
+    values = pd.Series({symbol: data.get(field) for symbol, data in results.items()}, dtype=float)
+    return values.rank(pct=True).dropna().round(4).to_dict()
@@ -0,0 +1,279 @@
+"""
+Indicator state แบบ incremental ต่อหุ้น (EMA, RSI, MACD, Bollinger Bands)
+
+เก็บค่าล่าสุดของแต่ละ indicator ไว้ในไฟล์ JSON แล้วอัพเดตทีละแท่ง O(1)
+แทนการคำนวณ TA-Lib ใหม่ทั้ง 2 ปีทุกรอบ
+
+สูตรและการ seed ค่าเริ่มต้นเลียนแบบ TA-Lib (EMA seed ด้วย SMA, RSI แบบ Wilder,
+MACD ที่ seed fast/slow EMA ณ แท่งเดียวกัน, Bollinger ใช้ population stddev)
+ผลลัพธ์จึงตรงกับ TA-Lib ภายใน tolerance ของ floating point
+"""
+import os
+import logging
+import re
+import json
+import copy
+from collections import deque
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+INDICATOR_STATE_DIR = os.getenv("INDICATOR_STATE_DIR", ".cache/indicators")
+
+EMA_PERIODS = (20, 50, 200)
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BB_PERIOD, BB_NBDEV = 20, 2
+
+
+def _is_zero(value):
+    # เหมือน TA_IS_ZERO ของ TA-Lib
+    return -0.00000001 < value < 0.00000001
+
+
+class IndicatorState:
+    """สถานะ indicator ของหุ้น 1 ตัว ณ แท่ง last_date"""
+    
+    def __init__(self):
+        self.count = 0
+        self.last_date = None
+        self.last_close = None
+        self.closes = deque(maxlen=max(MACD_SLOW, BB_PERIOD))
+        
+        # EMA 20/50/200 (ระหว่าง warm-up เก็บผลรวมไว้ทำ SMA seed)
+        self.ema = {period: None for period in EMA_PERIODS}
+        self.ema_sum = {period: 0.0 for period in EMA_PERIODS}
+        
+        # RSI (Wilder)
+        self.avg_gain = None
+        self.avg_loss = None
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        
+        # MACD
+        self.macd_fast = None
+        self.macd_slow = None
+        self.macd_slow_sum = 0.0
+        self.macd_line = None
+        self.macd_signal = None
+        self.macd_count = 0
+        self.macd_sum = 0.0
+    
+    def update(self, close, date=None):
+        """เพิ่มแท่งใหม่ 1 แท่ง (O(1))"""
+        close = float(close)
+        prev_close = self.last_close
+        
+        self.count += 1
+        self.closes.append(close)
+        self.last_close = close
+        self.last_date = date
+        
+        # --- EMA ---
+        for period in EMA_PERIODS:
+            self.ema[period], self.ema_sum[period] = self._step_ema(
+                self.ema[period], self.ema_sum[period], close, period
+            )
+        
+        # --- RSI ---
+        if prev_close is not None:
+            change = close - prev_close
+            gain = change if change > 0 else 0.0
+            loss = -change if change < 0 else 0.0
+            
+            if self.avg_gain is None:
+                self.gain_sum += gain
+                self.loss_sum += loss
+                if self.count - 1 == RSI_PERIOD:
+                    self.avg_gain = self.gain_sum / RSI_PERIOD
+                    self.avg_loss = self.loss_sum / RSI_PERIOD
+            else:
+                self.avg_gain = (self.avg_gain * (RSI_PERIOD - 1) + gain) / RSI_PERIOD
+                self.avg_loss = (self.avg_loss * (RSI_PERIOD - 1) + loss) / RSI_PERIOD
+        
+        # --- MACD ---
+        # TA-Lib seed ทั้ง fast และ slow EMA ที่แท่งที่ MACD_SLOW
+        if self.macd_slow is None:
+            self.macd_slow_sum += close
+            if self.count == MACD_SLOW:
+                self.macd_slow = self.macd_slow_sum / MACD_SLOW
+                self.macd_fast = sum(list(self.closes)[-MACD_FAST:]) / MACD_FAST
+        else:
+            self.macd_slow += (close - self.macd_slow) * (2.0 / (MACD_SLOW + 1))
+            self.macd_fast += (close - self.macd_fast) * (2.0 / (MACD_FAST + 1))
+        
+        if self.macd_slow is not None:
+            self.macd_line = self.macd_fast - self.macd_slow
+            self.macd_signal, self.macd_sum = self._step_ema(
+                self.macd_signal, self.macd_sum, self.macd_line, MACD_SIGNAL, self.macd_count + 1
+            )
+            self.macd_count += 1
+    
+    def _step_ema(self, ema, seed_sum, value, period, count=None):
+        count = self.count if count is None else count
+        if ema is not None:
+            return ema + (value - ema) * (2.0 / (period + 1)), seed_sum
+        seed_sum += value
+        if count == period:
+            return seed_sum / period, seed_sum
+        return None, seed_sum
+    
+    def rsi(self):
+        if self.avg_gain is None:
+            return None
+        total = self.avg_gain + self.avg_loss
+        return 0.0 if _is_zero(total) else 100.0 * (self.avg_gain / total)
+    
+    def bollinger(self):
+        if self.count < BB_PERIOD:
+            return None, None
+        window = list(self.closes)[-BB_PERIOD:]
+        mean = sum(window) / BB_PERIOD
+        variance = sum(x * x for x in window) / BB_PERIOD - mean * mean
+        stddev = variance ** 0.5 if variance > 0 and not _is_zero(variance) else 0.0
+        return mean + BB_NBDEV * stddev, mean - BB_NBDEV * stddev
+    
+    def values(self):
+        """ค่าล่าสุดในรูปแบบเดียวกับ calculate_technical_indicators()"""
+        bb_upper, bb_lower = self.bollinger()
+        has_signal = self.macd_signal is not None
+        
+        return {
+            "price": self.last_close,
+            "rsi": self.rsi(),
+            "macd": self.macd_line if has_signal else None,
+            "macd_signal": self.macd_signal,
+            "ema_20": self.ema[20],
+            "ema_50": self.ema[50],
+            "ema_200": self.ema[200],
+            "bb_upper": bb_upper,
+            "bb_lower": bb_lower
+        }
+    
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "last_date": self.last_date,
+            "last_close": self.last_close,
+            "closes": list(self.closes),
+            "ema": {str(p): v for p, v in self.ema.items()},
+            "ema_sum": {str(p): v for p, v in self.ema_sum.items()},
+            "avg_gain": self.avg_gain,
+            "avg_loss": self.avg_loss,
+            "gain_sum": self.gain_sum,
+            "loss_sum": self.loss_sum,
+            "macd_fast": self.macd_fast,
+            "macd_slow": self.macd_slow,
+            "macd_slow_sum": self.macd_slow_sum,
+            "macd_line": self.macd_line,
+            "macd_signal": self.macd_signal,
+            "macd_count": self.macd_count,
+            "macd_sum": self.macd_sum
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.closes.extend(data.pop("closes"))
+        state.ema = {int(p): v for p, v in data.pop("ema").items()}
+        state.ema_sum = {int(p): v for p, v in data.pop("ema_sum").items()}
+        state.__dict__.update(data)
+        return state
+
+
+def _state_path(symbol):
+    safe_name = re.sub(r'[^A-Za-z0-9_-]', '_', symbol)
+    return os.path.join(INDICATOR_STATE_DIR, f"{safe_name}.json")
+
+
+def load_state(symbol):
+    path = _state_path(symbol)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return IndicatorState.from_dict(json.load(f))
+    except Exception as e:
+        logger.warning("⚠️ Corrupted indicator state for %s, rebuilding: %s", symbol, e)
+        return None
+
+
+def save_state(symbol, state):
+    os.makedirs(INDICATOR_STATE_DIR, exist_ok=True)
+    path = _state_path(symbol)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning("⚠️ Cannot write indicator state for %s: %s", symbol, e)
+
+
+def reset_state(symbol):
+    """ลบ state ของหุ้น (ราคาย้อนหลังถูก adjust ใหม่ → รอบถัดไปคำนวณใหม่ทั้งหมด)"""
+    try:
+        os.remove(_state_path(symbol))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("⚠️ Cannot remove indicator state for %s: %s", symbol, e)
+
+
+def _resume_position(state, df):
+    """หาตำแหน่งแท่งถัดจาก state.last_date ใน df (ถ้าราคาไม่ตรง เช่นโดน adjust ย้อนหลัง → None)"""
+    if state is None or state.last_date is None:
+        return None
+    
+    try:
+        last_date = pd.Timestamp(state.last_date)
+        if last_date.tz is not None and df.index.tz is None:
+            last_date = last_date.tz_localize(None)  # state จากก่อน bar store เก็บวันที่แบบไม่มี tz
+        pos = df.index.get_indexer([last_date])[0]
+    except Exception:
+        return None
+    
+    if pos < 0:
+        return None
+    
+    close = float(df['Close'].iloc[pos])
+    if abs(close - state.last_close) > 1e-9 * max(1.0, abs(close)):
+        return None
+    
+    return pos + 1
+
+
+def update_indicators(symbol, df):
+    """
+    อัพเดต state ของหุ้นด้วยแท่งใหม่ใน df แล้วคืนค่า indicator ล่าสุด
+    
+    แท่งสุดท้ายอาจเป็นแท่งระหว่างวันที่ยังเปลี่ยนได้ จึงไม่ถูกบันทึกลง state
+    (คำนวณจากสำเนาแทน) รอบถัดไปจะบันทึกเมื่อมีแท่งใหม่กว่ามาแล้ว
+    """
+    if df is None or df.empty:
+        return None
+    
+    state = load_state(symbol)
+    start = _resume_position(state, df)
+    
+    if start is None:
+        state = IndicatorState()
+        start = 0
+    
+    closes = df['Close'].values
+    dates = df.index
+    last = len(df) - 1
+    
+    for i in range(start, last):
+        state.update(closes[i], dates[i].isoformat())
+    
+    if start < len(df):
+        save_state(symbol, state)
+        current = copy.deepcopy(state)
+        current.update(closes[last], dates[last].isoformat())
+    else:
+        current = state
+    
+    return current.values()
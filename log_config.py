@@ -0,0 +1,153 @@
+"""
+Logging ของ collector (แทน print)
+
+- ระดับ log จาก LOG_LEVEL: INFO = 1 บรรทัดสรุปต่อหุ้น + คำเตือน, DEBUG = ทุกขั้นตอนแบบเดิม
+  ข้อความใช้ format แบบ lazy (logger.debug("... %s", x)) → ระดับที่ปิดอยู่ไม่เสียเวลา format
+- LOG_FORMAT=text (ข้อความแบบเดิม) หรือ json (1 บรรทัดต่อ record สำหรับเก็บ/ค้นภายหลัง)
+- ผู้เรียกแค่ใส่ record ลง queue (QueueHandler) การเขียนลง stream ทำใน thread ของ QueueListener
+- log ของแต่ละหุ้นเก็บไว้ก่อน แล้วปล่อยออกตามลำดับ [idx/total] (OrderedLog) เหมือน OrderedOutput เดิม
+  ใช้ได้ทั้งใน coroutine และใน thread ของ run_blocking (asyncio.to_thread คัดลอก contextvars ไปด้วย)
+"""
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()        # text | json
+LOG_ORDERED = os.getenv("LOG_ORDERED", "1") != "0"          # 0 = ไม่รอเรียงตามหุ้น (เห็น log เร็วกว่า แต่ปนกัน)
+
+# หุ้นที่ task / thread ปัจจุบันกำลังทำ + buffer ของ record ที่รอปล่อยตามลำดับ
+current_symbol = contextvars.ContextVar("current_symbol", default=None)
+_symbol_records = contextvars.ContextVar("symbol_records", default=None)
+
+_log_queue = queue.SimpleQueue()
+_listener = None
+_buffer_lock = threading.Lock()
+
+
+class SymbolFilter(logging.Filter):
+    """ใส่ record.symbol จาก contextvar (ใช้ใน JSON)"""
+    
+    def filter(self, record):
+        if not hasattr(record, "symbol"):
+            record.symbol = current_symbol.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """1 record = 1 บรรทัด JSON (ค่าใน extra={"data": {...}} ถูกรวมเข้าไปด้วย)"""
+    
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "symbol", None):
+            entry["symbol"] = record.symbol
+        entry.update(getattr(record, "data", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SymbolBuffer(list):
+    """record ที่รอปล่อยของหุ้น 1 ตัว (closed = ปล่อยไปแล้ว record ที่ตามมาทีหลังเข้า queue ทันที)"""
+    closed = False
+
+
+class SymbolQueueHandler(QueueHandler):
+    """record ของหุ้นที่กำลังทำงานเก็บเข้า buffer ของหุ้นนั้น ที่เหลือเข้า queue ทันที"""
+    
+    def prepare(self, record):
+        """
+        เหมือน QueueHandler.prepare (format ข้อความก่อนส่งข้าม thread) แต่เก็บ traceback ไว้ใน exc_text
+        แยกจากข้อความ → JsonFormatter ใส่เป็น field "exc" ได้ ส่วน text ยังต่อท้ายข้อความเหมือนเดิม
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.message = record.msg
+        return record
+    
+    def enqueue(self, record):
+        buffer = _symbol_records.get()
+        with _buffer_lock:
+            if buffer is not None and not buffer.closed:
+                buffer.append(record)
+                return
+        self.queue.put_nowait(record)
+
+
+class OrderedLog:
+    """ปล่อย log ของแต่ละหุ้นออกตามลำดับ idx (หุ้นที่เสร็จก่อนคิวจะรอตัวก่อนหน้า)"""
+    
+    def __init__(self):
+        self.completed = {}
+        self.next_idx = 1
+    
+    def start(self, symbol):
+        """เรียกตอนเริ่มหุ้นแต่ละตัว (ใน task ของหุ้นนั้น) → คืน buffer ที่ต้องส่งให้ complete()"""
+        current_symbol.set(symbol)
+        buffer = SymbolBuffer() if LOG_ORDERED else None
+        _symbol_records.set(buffer)
+        return buffer
+    
+    def complete(self, idx, buffer):
+        _symbol_records.set(None)
+        current_symbol.set(None)
+        if buffer is not None:
+            with _buffer_lock:
+                buffer.closed = True  # task / thread ที่ยังถือ context ของหุ้นนี้อยู่ → log ออกทันที
+        self.completed[idx] = buffer or []
+        while self.next_idx in self.completed:
+            for record in self.completed.pop(self.next_idx):
+                _log_queue.put_nowait(record)
+            self.next_idx += 1
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """ตั้ง root logger ให้เขียนผ่าน queue (เรียกครั้งเดียวตอนเริ่มโปรแกรม)"""
+    global _listener
+    if _listener is not None:
+        return
+    
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter("%(message)s"))
+    
+    queue_handler = SymbolQueueHandler(_log_queue)
+    queue_handler.addFilter(SymbolFilter())
+    
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    # log ของ library (yfinance, httpx, ...) ไม่ต้องละเอียดเท่า collector
+    for name in ("yfinance", "httpx", "httpcore", "urllib3", "hpack", "peewee"):
+        logging.getLogger(name).setLevel(max(logging.getLevelName(level), logging.WARNING))
+    
+    _listener = QueueListener(_log_queue, handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """เขียน record ที่ค้างใน queue ให้หมดแล้วหยุด listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
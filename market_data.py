@@ -0,0 +1,79 @@
+"""
+ชั้นกลางสำหรับดึงข้อมูล yfinance ต่อหุ้น (history, info, recommendations, news)
+
+ทุก endpoint ถูกเรียกไม่เกิน 1 ครั้งต่อหุ้นต่อรอบ และใช้ yf.Ticker ตัวเดียวกัน
+ฟังก์ชันที่ต้องการข้อมูลเดียวกัน (เช่น .info ใน main() และ fetch_fundamental_data())
+จะได้ผลลัพธ์ชุดเดียวกัน ถ้ามีหลาย thread ขอพร้อมกันจะรอผลจากครั้งแรก
+"""
+import threading
+import yfinance as yf
+
+from rate_limiter import is_provider_error
+
+
+class MarketData:
+    """Cache ผลลัพธ์ yfinance ต่อ (symbol, endpoint) ภายในรอบการทำงานเดียว"""
+    
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._tickers = {}
+        self._locks = {}
+        self._results = {}
+    
+    def ticker(self, symbol):
+        with self._guard:
+            if symbol not in self._tickers:
+                self._tickers[symbol] = yf.Ticker(symbol)
+            return self._tickers[symbol]
+    
+    def _load(self, symbol, endpoint, loader):
+        key = (symbol, endpoint)
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        
+        with lock:
+            if key not in self._results:
+                try:
+                    self._results[key] = (True, loader())
+                except Exception as e:
+                    if is_provider_error(e):
+                        raise  # rate limit / provider ล่ม: ไม่เก็บไว้ เพื่อให้ retry ยิงใหม่ได้
+                    # เก็บ error ไว้ด้วย ผู้เรียกคนถัดไปจะไม่ยิง request ที่เพิ่งล้มเหลวซ้ำ
+                    self._results[key] = (False, e)
+            
+            ok, value = self._results[key]
+        
+        if not ok:
+            raise value
+        return value
+    
+    def history(self, symbol, **kwargs):
+        # ดึงแบบต่อท้าย (start=...) กับดึงใหม่ทั้ง period (หลัง split) เป็นคนละผลลัพธ์
+        endpoint = ("history",) + tuple(sorted(kwargs.items()))
+        return self._load(symbol, endpoint, lambda: self.ticker(symbol).history(**kwargs))
+    
+    def info(self, symbol):
+        return self._load(symbol, "info", lambda: self.ticker(symbol).info)
+    
+    def recommendations(self, symbol):
+        return self._load(symbol, "recommendations", lambda: self.ticker(symbol).recommendations)
+    
+    def news(self, symbol):
+        return self._load(symbol, "news", lambda: self.ticker(symbol).news)
+    
+    def release(self, symbol):
+        """ลบข้อมูลของหุ้นที่ประมวลผลเสร็จแล้ว (คืนหน่วยความจำ)"""
+        with self._guard:
+            self._tickers.pop(symbol, None)
+            for key in [key for key in self._results if key[0] == symbol]:
+                self._results.pop(key, None)
+                self._locks.pop(key, None)
+    
+    def clear(self):
+        with self._guard:
+            self._tickers.clear()
+            self._locks.clear()
+            self._results.clear()
+
+
+market_data = MarketData()
@@ -0,0 +1,116 @@
+"""
+ดัชนี URL ข่าวที่เคยบันทึกแล้ว (เก็บในเครื่อง ใช้ข้ามรอบ)
+
+Finnhub คืนข่าวย้อนหลัง 7 วันทุกรอบ ข่าวส่วนใหญ่จึงเคยบันทึกไปแล้ว
+ตัดข่าวที่รู้จักแล้วออกก่อนแปลภาษาและก่อนเขียน Supabase
+
+เก็บเป็น hash 64-bit ของ URL + วันที่เผยแพร่ (ไว้ลบข่าวที่เก่ากว่า NEWS_RETENTION_DAYS)
+"""
+import os
+import logging
+import hashlib
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+
+logger = logging.getLogger(__name__)
+
+
+SEEN_NEWS_PATH = os.getenv("SEEN_NEWS_PATH", ".cache/seen_news.bin")
+NEWS_RETENTION_DAYS = int(os.getenv("NEWS_RETENTION_DAYS", "14"))
+
+
+def _url_key(url):
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _day_number(published_at=None):
+    if not published_at:
+        return datetime.now().toordinal()
+    try:
+        return datetime.fromisoformat(str(published_at).replace("Z", "+00:00")).toordinal()
+    except ValueError:
+        return datetime.now().toordinal()
+
+
+class SeenNewsIndex:
+    """Set ของ hash URL → วันที่เผยแพร่ (ordinal)"""
+    
+    def __init__(self, path=SEEN_NEWS_PATH, retention_days=NEWS_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._seen = None
+    
+    def _ensure_loaded(self):
+        if self._seen is not None:
+            return
+        self._seen = {}
+        
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            keys = array("Q")
+            days = array("I")
+            count = len(raw) // (keys.itemsize + days.itemsize)
+            keys.frombytes(raw[:count * keys.itemsize])
+            days.frombytes(raw[count * keys.itemsize:count * (keys.itemsize + days.itemsize)])
+            self._seen = dict(zip(keys, days))
+        except Exception as e:
+            logger.warning("⚠️ Corrupted seen-news index, starting empty: %s", e)
+            self._seen = {}
+    
+    def needs_seed(self):
+        """ยังไม่มีดัชนีในเครื่อง (รอบแรก หรือ cache หาย) → ควร seed จาก stock_news"""
+        with self._lock:
+            self._ensure_loaded()
+            return not self._seen
+    
+    def contains(self, url):
+        if not url:
+            return False
+        with self._lock:
+            self._ensure_loaded()
+            return _url_key(url) in self._seen
+    
+    def add(self, url, published_at=None):
+        if not url:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            self._seen[_url_key(url)] = _day_number(published_at)
+    
+    def add_many(self, rows):
+        """เพิ่มจากแถวของ stock_news (ต้องมี url และ published_at)"""
+        for row in rows:
+            self.add(row.get("url"), row.get("published_at"))
+    
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._seen)
+    
+    def save(self):
+        """บันทึกลงไฟล์ (ลบข่าวที่เก่ากว่า retention ออก)"""
+        with self._lock:
+            if self._seen is None:
+                return
+            
+            cutoff = (datetime.now() - timedelta(days=self.retention_days)).toordinal()
+            self._seen = {key: day for key, day in self._seen.items() if day >= cutoff}
+            
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(array("Q", self._seen.keys()).tobytes())
+                    f.write(array("I", self._seen.values()).tobytes())
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.warning("⚠️ Cannot write seen-news index: %s", e)
+
+
+seen_news = SeenNewsIndex()
@@ -0,0 +1,441 @@
+"""
+บันทึก/เล่นซ้ำข้อมูลจาก provider (yfinance, Finnhub, Google Translate) + Supabase จำลองในหน่วยความจำ
+
+ใช้กับ benchmark.py เพื่อวัดความเร็วของ main() โดยไม่ต้องต่อเน็ต
+
+    record_fixtures(["AAPL", "MSFT"], path)   # ดึงข้อมูลจริงครั้งเดียวเก็บเป็นไฟล์
+    install_replay(stock_collector, symbols=100, fixtures_dir=path)
+
+โครงสร้าง fixture (BENCH_FIXTURES_DIR):
+    manifest.json            รายชื่อหุ้น + เวลาที่บันทึก
+    history/<SYMBOL>.parquet OHLCV รายวัน 2 ปี (แบบเดียวกับ yf.download auto_adjust)
+    yfinance/<SYMBOL>.json   info, recommendations, news
+    finnhub/<SYMBOL>.json    company-news 7 วันล่าสุด
+    translations.json        {ข้อความอังกฤษ: คำแปลไทย}
+
+หุ้นจำลองแต่ละตัว (BM0001, BM0002, ...) ใช้ข้อมูลของหุ้นใน fixture วนไปตามลำดับ
+ถ้ายังไม่มี fixture จะสร้างราคาแบบสุ่ม (seed ตามชื่อหุ้น) ให้ผลเหมือนเดิมทุกครั้ง
+"""
+import os
+import json
+import time
+import zlib
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+BENCH_FIXTURES_DIR = os.getenv("BENCH_FIXTURES_DIR", "bench_fixtures")
+BENCH_HISTORY_BARS = 504  # ~2 ปี
+CATEGORIES = ["Core", "Growth", "Value", "Dividend", "ETF"]
+
+
+# ============================================
+# บันทึก fixture จาก provider จริง
+# ============================================
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, default=str)
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def record_fixtures(symbols, path=BENCH_FIXTURES_DIR, finnhub_key=None, translate=True):
+    """ดึงข้อมูลจริงของ symbols แล้วเก็บเป็น fixture (ต้องต่อเน็ต)"""
+    import yfinance as yf
+    import requests
+    from deep_translator import GoogleTranslator
+    
+    history = yf.download(symbols, period="2y", group_by="ticker", auto_adjust=True, threads=True, progress=False)
+    os.makedirs(os.path.join(path, "history"), exist_ok=True)
+    
+    texts = set()
+    recorded = []
+    for symbol in symbols:
+        try:
+            df = history[symbol].dropna(how="all") if len(symbols) > 1 else history.dropna(how="all")
+            if df.empty:
+                print(f"⚠️ No history for {symbol}, skipping")
+                continue
+            df.to_parquet(os.path.join(path, "history", f"{symbol}.parquet"))
+            
+            ticker = yf.Ticker(symbol)
+            recommendations = ticker.recommendations
+            _write_json(os.path.join(path, "yfinance", f"{symbol}.json"), {
+                "info": ticker.info,
+                "recommendations": recommendations.to_dict("records") if recommendations is not None else [],
+                "news": ticker.news or [],
+            })
+            
+            news = []
+            if finnhub_key:
+                to_date = datetime.now()
+                resp = requests.get("https://finnhub.io/api/v1/company-news", params={
+                    "symbol": symbol,
+                    "from": (to_date - timedelta(days=7)).strftime('%Y-%m-%d'),
+                    "to": to_date.strftime('%Y-%m-%d'),
+                    "token": finnhub_key,
+                }, timeout=10)
+                resp.raise_for_status()
+                news = resp.json()
+            _write_json(os.path.join(path, "finnhub", f"{symbol}.json"), news)
+            
+            for article in news[:10]:
+                texts.add(article.get("headline", ""))
+                texts.add((article.get("summary") or "")[:4500])
+            recorded.append(symbol)
+            print(f"📼 Recorded {symbol}: {len(df)} bars, {len(news)} news")
+        except Exception as e:
+            print(f"⚠️ Cannot record {symbol}: {e}")
+    
+    translations = _read_json(os.path.join(path, "translations.json"), {})
+    if translate:
+        translator = GoogleTranslator(source="en", target="th")
+        for text in sorted(texts - set(translations) - {""}):
+            try:
+                translations[text] = translator.translate(text)
+            except Exception as e:
+                print(f"⚠️ Translation failed: {e}")
+    _write_json(os.path.join(path, "translations.json"), translations)
+    
+    _write_json(os.path.join(path, "manifest.json"), {
+        "symbols": recorded,
+        "recorded_at": datetime.now().isoformat(),
+    })
+    return recorded
+
+
+# ============================================
+# เล่นซ้ำ
+# ============================================
+def synthetic_history(symbol, bars=BENCH_HISTORY_BARS, end=None):
+    """ราคาสุ่มแบบ random walk (seed ตามชื่อหุ้น → ได้ค่าเดิมทุกครั้ง)"""
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    index = pd.bdate_range(end=end or pd.Timestamp.today().normalize(), periods=bars)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, bars)))
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.003, bars)),
+        "High": close * 1.01,
+        "Low": close * 0.99,
+        "Close": close,
+        "Volume": rng.integers(100_000, 5_000_000, bars),
+    }, index=index)
+
+
+def _synthetic_news(symbol, count=10):
+    now = int(time.time())
+    headlines = [
+        "{s} shares surge after strong earnings beat",
+        "{s} faces lawsuit over weak guidance",
+        "Analysts upgrade {s} on record revenue growth",
+        "{s} stock falls as investors weigh risk",
+        "{s} announces buyback, outlook remains stable",
+    ]
+    return [{
+        "headline": headlines[i % len(headlines)].format(s=symbol),
+        "summary": f"{symbol} reported results that were not weak, analysts said. #{i}",
+        "url": f"https://news.example/{symbol}/{i}",
+        "datetime": now - 3600 * i,
+        "source": "Replay",
+    } for i in range(count)]
+
+
+class ReplayFixtures:
+    """ข้อมูลของหุ้นจำลองแต่ละตัว (อ่านจาก fixture ของหุ้นต้นแบบ หรือสร้างขึ้นถ้าไม่มี)"""
+    
+    def __init__(self, path=BENCH_FIXTURES_DIR, latency=0.0):
+        self.path = path
+        self.latency = latency
+        manifest = _read_json(os.path.join(path, "manifest.json"), {})
+        self.sources = manifest.get("symbols", [])
+        self.translations = _read_json(os.path.join(path, "translations.json"), {})
+        self._lock = threading.Lock()
+        self._mapping = {}
+        self._histories = {}
+        self.calls = {}
+    
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+    
+    def map_symbols(self, symbols):
+        """กำหนดหุ้นต้นแบบให้หุ้นจำลองแต่ละตัว (วนตามลำดับ)"""
+        for i, symbol in enumerate(symbols):
+            self._mapping[symbol] = self.sources[i % len(self.sources)] if self.sources else None
+    
+    def history(self, symbol):
+        if symbol not in self._histories:
+            source = self._mapping.get(symbol)
+            path = os.path.join(self.path, "history", f"{source}.parquet") if source else None
+            self._histories[symbol] = pd.read_parquet(path) if path and os.path.exists(path) else synthetic_history(symbol)
+        return self._histories[symbol]
+    
+    def yfinance(self, symbol):
+        source = self._mapping.get(symbol)
+        data = _read_json(os.path.join(self.path, "yfinance", f"{source}.json"), None) if source else None
+        if data is None:
+            rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+            data = {
+                "info": {"marketCap": float(rng.uniform(1e9, 5e11)), "forwardPE": float(rng.uniform(8, 40)),
+                         "pegRatio": float(rng.uniform(0.5, 3)), "earningsGrowth": float(rng.uniform(-0.1, 0.4))},
+                "recommendations": [{"To Grade": grade} for grade in ("Buy", "Hold", "Outperform", "Sell", "Buy")],
+                "news": [{"title": article["headline"]} for article in _synthetic_news(symbol, 5)],
+            }
+        return data
+    
+    def finnhub_news(self, symbol):
+        source = self._mapping.get(symbol)
+        news = _read_json(os.path.join(self.path, "finnhub", f"{source}.json"), None) if source else None
+        if news is None:
+            return _synthetic_news(symbol)
+        # url ต้องไม่ซ้ำกันระหว่างหุ้นจำลองที่ใช้ต้นแบบเดียวกัน (ไม่งั้นถูกตัดเป็นข่าวซ้ำ)
+        return [dict(article, url=f"{article.get('url', '')}#{symbol}") for article in news]
+
+
+def _download(fixtures):
+    def download(tickers, period=None, start=None, group_by="ticker", **kwargs):
+        tickers = tickers.split() if isinstance(tickers, str) else list(tickers)
+        fixtures._count("yfinance.download")
+        frames = {}
+        for symbol in tickers:
+            df = fixtures.history(symbol)
+            frames[symbol] = df[df.index >= pd.Timestamp(start)] if start else df
+        return pd.concat(frames, axis=1)
+    return download
+
+
+def _ticker_class(fixtures):
+    class ReplayTicker:
+        def __init__(self, symbol):
+            self.symbol = symbol
+        
+        def history(self, period=None, start=None, **kwargs):
+            fixtures._count("yfinance.history")
+            df = fixtures.history(self.symbol)
+            return df[df.index >= pd.Timestamp(start)] if start else df
+        
+        @property
+        def info(self):
+            fixtures._count("yfinance.info")
+            return fixtures.yfinance(self.symbol)["info"]
+        
+        @property
+        def recommendations(self):
+            fixtures._count("yfinance.recommendations")
+            return pd.DataFrame(fixtures.yfinance(self.symbol)["recommendations"])
+        
+        @property
+        def news(self):
+            fixtures._count("yfinance.news")
+            return fixtures.yfinance(self.symbol)["news"]
+    
+    return ReplayTicker
+
+
+class ReplayResponse:
+    def __init__(self, data, status_code=200):
+        self._data = data
+        self.status_code = status_code
+        self.headers = {}
+        self.content = json.dumps(data).encode()
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+    
+    def json(self):
+        return self._data
+
+
+def _http_get(fixtures):
+    def get(url, params=None, **kwargs):
+        if "finnhub.io" in url:
+            fixtures._count("finnhub.company_news")
+            return ReplayResponse(fixtures.finnhub_news(params["symbol"]))
+        fixtures._count("http.other")
+        return ReplayResponse({"status": "error", "code": 404, "message": "not recorded"})
+    return get
+
+
+def _translator_class(fixtures):
+    class ReplayTranslator:
+        def __init__(self, source="en", target="th"):
+            pass
+        
+        def translate(self, text):
+            fixtures._count("google_translate")
+            return fixtures.translations.get(text) or f"[th] {text}"
+    
+    return ReplayTranslator
+
+
+# ============================================
+# Supabase จำลอง (รองรับเฉพาะ query ที่ stock_collector ใช้)
+# ============================================
+class MemoryResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class MemoryQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.op = "select"
+        self.payload = None
+        self.options = {}
+        self._order = []
+        self._range = None
+        self._limit = None
+    
+    def select(self, *columns, **kwargs):
+        self.op = "select"
+        return self
+    
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+    
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+    
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) <= value)
+        return self
+    
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+    
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+    
+    def is_(self, column, value):
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+    
+    def order(self, column, desc=False):
+        self._order.append((column, desc))
+        return self
+    
+    def range(self, start, end):
+        self._range = (start, end)
+        return self
+    
+    def limit(self, count):
+        self._limit = count
+        return self
+    
+    def insert(self, rows, **kwargs):
+        self.op, self.payload, self.options = "insert", rows, kwargs
+        return self
+    
+    def upsert(self, rows, **kwargs):
+        self.op, self.payload, self.options = "upsert", rows, kwargs
+        return self
+    
+    def update(self, values):
+        self.op, self.payload = "update", values
+        return self
+    
+    def execute(self):
+        with self.db.lock:
+            self.db.calls += 1
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.op in ("insert", "upsert"):
+                return MemoryResponse(self._write(rows))
+            
+            selected = [row for row in rows if all(check(row) for check in self.filters)]
+            if self.op == "update":
+                for row in selected:
+                    row.update(self.payload)
+                return MemoryResponse(selected)
+            
+            for column, desc in reversed(self._order):
+                selected.sort(key=lambda row: (row.get(column) is None, row.get(column) or 0), reverse=desc)
+            if self._range:
+                selected = selected[self._range[0]:self._range[1] + 1]
+            if self._limit is not None:
+                selected = selected[:self._limit]
+            return MemoryResponse([dict(row) for row in selected])
+    
+    def _write(self, rows):
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        conflict_key = self.options.get("on_conflict")
+        existing = {row.get(conflict_key): row for row in rows} if conflict_key else {}
+        
+        written = []
+        for item in payload:
+            current = existing.get(item.get(conflict_key)) if conflict_key else None
+            if current is not None:
+                if self.options.get("ignore_duplicates"):
+                    continue
+                current.update(item)
+                written.append(dict(current))
+                continue
+            row = dict(item)
+            row.setdefault("id", len(rows) + 1)
+            rows.append(row)
+            if conflict_key:
+                existing[row.get(conflict_key)] = row
+            written.append(dict(row))
+        return written
+
+
+class MemorySupabase:
+    """ตารางในหน่วยความจำที่ตอบแบบ supabase-py (table().select().eq()...execute().data)"""
+    
+    def __init__(self, stock_master=None):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.tables = {"stock_master": list(stock_master or [])}
+    
+    def table(self, name):
+        return MemoryQuery(self, name)
+
+
+def synthetic_universe(count):
+    """stock_master จำลอง count ตัว (BM0001, ...) category วนตาม CATEGORIES"""
+    return [
+        {"symbol": f"BM{i:04d}", "category": CATEGORIES[(i - 1) % len(CATEGORIES)], "is_active": True}
+        for i in range(1, count + 1)
+    ]
+
+
+def install_replay(collector, symbols, fixtures_dir=BENCH_FIXTURES_DIR, latency=0.0):
+    """
+    สลับ provider ทั้งหมดของ stock_collector เป็นตัวเล่นซ้ำ (ใช้ใน process ของ benchmark เท่านั้น)
+    
+    Returns: (fixtures, db) ไว้ดูจำนวนครั้งที่เรียกแต่ละ provider และแถวที่เขียน
+    """
+    import yfinance as yf
+    
+    universe = synthetic_universe(symbols)
+    fixtures = ReplayFixtures(fixtures_dir, latency)
+    fixtures.map_symbols([row["symbol"] for row in universe])
+    db = MemorySupabase(universe)
+    
+    yf.download = _download(fixtures)
+    yf.Ticker = _ticker_class(fixtures)
+    collector.http.get = _http_get(fixtures)
+    collector.GoogleTranslator = _translator_class(fixtures)
+    collector.supabase = db
+    collector.create_client = lambda *args, **kwargs: db
+    collector.FINNHUB_KEY = collector.FINNHUB_KEY or "replay"
+    collector.TWELVE_DATA_KEY = None
+    return fixtures, db
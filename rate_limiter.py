@@ -0,0 +1,226 @@
+"""
+Rate limit ต่อ provider (yfinance, Finnhub, Twelve Data, Supabase)
+
+ใช้แทน asyncio.sleep แบบตายตัวหลังแต่ละหุ้น
+- Token bucket ต่อ provider: ยิงต่อเนื่องได้ไม่เกิน burst แล้วเฉลี่ยไม่เกิน calls_per_minute
+- โดน 429 (Too Many Requests) → รอตาม Retry-After หรือ exponential backoff + jitter แล้วลองใหม่
+  และหยุด provider นั้นทั้งหมดระหว่างรอ (ไม่ใช่แค่ request ที่โดน)
+- ล้มเหลวติดกันหลายครั้ง → เปิด circuit breaker ไม่เรียก provider นั้นชั่วคราว
+  (fetch_data_waterfall จะไปใช้ Twelve Data / ข้อมูลใน cache แทนทันที)
+
+circuit breaker นับเฉพาะ error ของ provider (is_provider_error: rate limit, connection, timeout, HTTP 5xx)
+error ของหุ้นตัวเดียว (delisted, ไม่มีข้อมูล, 404) แปลว่า provider ยังตอบได้ ไม่นับ
+fetch function ทุกตัวจึงส่ง error ของ provider ต่อให้ run_blocking และคืนค่า default เฉพาะ error ของหุ้น
+"""
+import os
+import logging
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+from run_metrics import metrics
+from http_pool import is_connection_error
+
+
+logger = logging.getLogger(__name__)
+
+
+# จำนวน request ต่อนาทีของแต่ละ provider (0 = ไม่จำกัด)
+PROVIDER_RATE_LIMITS = {
+    "yfinance": int(os.getenv("YFINANCE_RPM", "120")),
+    "finnhub": int(os.getenv("FINNHUB_RPM", "60")),         # Free tier: 60/min
+    "twelvedata": int(os.getenv("TWELVE_DATA_RPM", "8")),    # Free tier: 8/min
+    "supabase": int(os.getenv("SUPABASE_RPM", "0")),
+}
+
+# จำนวน request ที่ยิงติดกันได้ทันทีเมื่อ bucket เต็ม
+PROVIDER_BURSTS = {
+    "yfinance": int(os.getenv("YFINANCE_BURST", "5")),
+    "finnhub": int(os.getenv("FINNHUB_BURST", "5")),
+    # batch ของ Twelve Data ใช้ TWELVE_DATA_BATCH credit → burst ต้องไม่น้อยกว่านั้น ไม่งั้น batch แรกต้องรอเกือบนาที
+    "twelvedata": int(os.getenv("TWELVE_DATA_BURST", os.getenv("TWELVE_DATA_BATCH", "8"))),
+    "supabase": int(os.getenv("SUPABASE_BURST", "1")),
+}
+
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("BACKOFF_BASE", "2"))    # วินาที (2, 4, 8, ...)
+BACKOFF_MAX = float(os.getenv("BACKOFF_MAX", "60"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # ล้มเหลวติดกันกี่ครั้งถึงเปิด circuit
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "120"))  # วินาทีก่อนลองเรียก provider อีกครั้ง
+
+
+class ProviderUnavailable(Exception):
+    """circuit breaker ของ provider เปิดอยู่ (ไม่เรียกจริง)"""
+
+
+class TokenBucket:
+    """
+    Token bucket ของ provider เดียว (จองเวลาแบบ GCRA ไม่มี await ระหว่างจอง จึงไม่ต้องใช้ lock)
+
+    ยิงได้ทันที burst ครั้ง จากนั้นได้ token ใหม่ทุก 60/calls_per_minute วินาที
+    request ที่ใช้หลาย token (เช่น batch หลายหุ้นของ Twelve Data คิด 1 credit ต่อหุ้น) ขอได้ด้วย tokens=n
+    """
+
+    def __init__(self, calls_per_minute, burst=1):
+        self.interval = 60.0 / calls_per_minute if calls_per_minute else 0.0
+        self.tolerance = (max(1, burst) - 1) * self.interval
+        self._theoretical_arrival = 0.0
+        self._paused_until = 0.0
+
+    async def acquire(self, tokens=1):
+        """รอจนได้ token แล้วคืนเวลาที่รอ (วินาที)"""
+        now = time.monotonic()
+        start = max(now, self._paused_until)
+
+        if self.interval:
+            arrival = max(start, self._theoretical_arrival)
+            start = max(start, arrival + (tokens - 1) * self.interval - self.tolerance)
+            self._theoretical_arrival = arrival + tokens * self.interval
+
+        if start > now:
+            await asyncio.sleep(start - now)
+        return max(0.0, start - now)
+
+    def pause(self, seconds):
+        """หยุดทุก request ของ provider นี้ seconds วินาที (เช่นหลังโดน 429)"""
+        until = time.monotonic() + seconds
+        self._paused_until = max(self._paused_until, until)
+        self._theoretical_arrival = max(self._theoretical_arrival, until)
+
+
+class CircuitBreaker:
+    """ล้มเหลวติดกัน threshold ครั้ง → ไม่เรียก provider cooldown วินาที แล้วค่อยลองใหม่ 1 ครั้ง"""
+
+    def __init__(self, provider, threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN):
+        self.provider = provider
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    def check(self):
+        if self.opened_at is None:
+            return
+        if time.monotonic() - self.opened_at < self.cooldown:
+            raise ProviderUnavailable(f"{self.provider} circuit open after {self.failures} consecutive failures")
+        # half-open: ให้ request นี้ลองก่อน ตัวอื่นรอรอบ cooldown ถัดไป
+        self.opened_at = time.monotonic()
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("🔌 %s recovered, circuit closed", self.provider)
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning("🔌 %s failed %s times in a row, pausing calls for %.0fs", self.provider, self.failures, self.cooldown)
+            self.opened_at = time.monotonic()
+
+
+def retry_after(error):
+    """
+    ถ้า error คือโดนจำกัด rate (HTTP 429 / yfinance YFRateLimitError) คืนเวลาที่ต้องรอ (วินาที)
+
+    0 = ไม่ได้ระบุ Retry-After (ใช้ backoff), None = ไม่ใช่ error เรื่อง rate limit
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    status = getattr(response, "status_code", None) or getattr(error, "status_code", None)
+    message = str(error).lower()
+
+    limited = (
+        status == 429
+        or (status == 503 and "Retry-After" in headers)
+        or type(error).__name__ == "YFRateLimitError"
+        or "too many requests" in message
+        or "rate limit" in message
+    )
+    if not limited:
+        return None
+
+    header = headers.get("Retry-After")
+    if not header:
+        return 0
+    try:
+        return max(0.0, float(header))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_provider_error(error):
+    """error ที่มาจาก provider เอง (ไม่ใช่หุ้นตัวนั้น) → นับเข้า circuit breaker"""
+    if retry_after(error) is not None or is_connection_error(error):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status_code", None)
+    try:
+        return int(status) >= 500
+    except (TypeError, ValueError):
+        return False
+
+
+def backoff_delay(attempt, wait=0):
+    """เวลารอก่อนลองใหม่: ตาม Retry-After ถ้ามี ไม่งั้น exponential backoff แบบมี jitter"""
+    if wait:
+        return min(wait, BACKOFF_MAX) + random.uniform(0, 1)
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+rate_limiters = {
+    provider: TokenBucket(rpm, PROVIDER_BURSTS.get(provider, 1)) for provider, rpm in PROVIDER_RATE_LIMITS.items()
+}
+
+circuit_breakers = {
+    provider: CircuitBreaker(provider) for provider in PROVIDER_RATE_LIMITS
+}
+
+
+async def run_blocking(provider, func, *args, cost=1, **kwargs):
+    """
+    รอ rate limit ของ provider แล้วรันฟังก์ชันแบบ blocking ใน thread pool (provider=None → ไม่ต้องรอ)
+
+    cost = จำนวน token ที่ request นี้ใช้ (ค่าเริ่มต้น 1)
+
+    โดน rate limit → backoff แล้วลองใหม่ไม่เกิน RATE_LIMIT_MAX_RETRIES ครั้ง
+    error ของ provider (ลองครบแล้ว) → นับเข้า circuit breaker, error ของหุ้น → ไม่นับ (provider ยังตอบได้)
+    ทั้งสองแบบส่ง error ต่อให้ผู้เรียก
+    """
+    limiter = rate_limiters.get(provider)
+    breaker = circuit_breakers.get(provider)
+
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        if breaker:
+            breaker.check()
+        if limiter:
+            waited = await limiter.acquire(cost)
+            if waited:
+                metrics.observe(f"wait:{provider}", waited)
+
+        try:
+            result = await asyncio.to_thread(func, *args, **kwargs)
+        except Exception as error:
+            wait = retry_after(error)
+            if limiter and wait is not None and attempt < RATE_LIMIT_MAX_RETRIES:
+                delay = backoff_delay(attempt, wait)
+                logger.warning("⏳ %s rate limited, retrying in %.1fs", provider, delay)
+                limiter.pause(delay)
+                continue
+            if breaker:
+                if is_provider_error(error):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            raise
+
+        if breaker:
+            breaker.record_success()
+        return result
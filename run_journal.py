@@ -0,0 +1,130 @@
+"""
+บันทึกความคืบหน้าของแต่ละรอบ (run journal) เพื่อให้รอบที่ตายกลางทางรันต่อจากจุดเดิมได้
+
+ทุกครั้งที่หุ้นตัวหนึ่งเขียนขั้นตอนใดเสร็จ (snapshot / news / prediction) จะเพิ่ม 1 บรรทัด JSON ต่อท้ายไฟล์
+    {"run_id": "...", "symbol": "AAPL", "stage": "prediction", "recorded_at": "...", "data": {...}}
+รอบที่เริ่มใหม่ด้วย run ID เดิมจะข้ามขั้นตอนที่เสร็จแล้ว (ไม่เขียนซ้ำ ไม่เสีย quota ของ API)
+
+run ID มาจาก --run-id / RUN_ID / GITHUB_RUN_ID (กด re-run ใน GitHub Actions ได้ run ID เดิม)
+ถ้ามี RUN_JOURNAL_TABLE จะเขียนลง Supabase ด้วย (runner ของ GitHub Actions ไม่มีไฟล์ในเครื่องข้ามรอบ)
+    create table run_journal (run_id text, symbol text, stage text, data jsonb, recorded_at timestamptz);
+"""
+import os
+import json
+import logging
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+
+logger = logging.getLogger(__name__)
+
+
+RUN_JOURNAL_PATH = os.getenv("RUN_JOURNAL_PATH", ".cache/run_journal.jsonl")  # ว่าง = ไม่เขียนไฟล์
+RUN_JOURNAL_TABLE = os.getenv("RUN_JOURNAL_TABLE", "")  # ว่าง = ไม่เขียน Supabase
+RUN_JOURNAL_RETENTION_DAYS = int(os.getenv("RUN_JOURNAL_RETENTION_DAYS", "7"))
+RUN_ID = os.getenv("RUN_ID") or os.getenv("GITHUB_RUN_ID")
+
+STAGES = ("snapshot", "news", "prediction")
+RUN_COMPLETE = "run_complete"  # stage พิเศษ: ทุกหุ้นสำเร็จแล้ว (--resume ไม่ต้องกลับมาทำ)
+
+
+def new_run_id():
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}"
+
+
+class RunJournal:
+    """ขั้นตอนที่เสร็จแล้วของรอบปัจจุบัน: {symbol: {stage: data}}"""
+    
+    def __init__(self, path=RUN_JOURNAL_PATH, retention_days=RUN_JOURNAL_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self.run_id = None
+        self._lock = threading.Lock()
+        self._done = {}
+    
+    def _read_entries(self):
+        if not self.path or not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # บรรทัดสุดท้ายที่เขียนไม่จบตอน process ตาย
+        return entries
+    
+    def latest_unfinished(self):
+        """run ID ล่าสุดในไฟล์ที่ยังไม่มี run_complete (ใช้กับ --resume)"""
+        runs = {}
+        for entry in self._read_entries():
+            finished = runs.get(entry.get("run_id"), False)
+            runs.pop(entry.get("run_id"), None)
+            runs[entry.get("run_id")] = finished or entry.get("stage") == RUN_COMPLETE
+        unfinished = [run_id for run_id, finished in runs.items() if run_id and not finished]
+        return unfinished[-1] if unfinished else None
+    
+    def begin(self, run_id, remote_entries=()):
+        """
+        เริ่มรอบ run_id: โหลดขั้นตอนที่เสร็จแล้วจากไฟล์ (+ แถวจาก Supabase ถ้ามี)
+        แล้วลบรอบที่เก่ากว่า retention_days ออกจากไฟล์
+        """
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        entries = self._read_entries()
+        
+        with self._lock:
+            self.run_id = run_id
+            self._done = {}
+            for entry in list(entries) + list(remote_entries):
+                if entry.get("run_id", run_id) == run_id and entry.get("symbol"):
+                    self._done.setdefault(entry["symbol"], {})[entry["stage"]] = entry.get("data") or {}
+            
+            kept = [entry for entry in entries if entry.get("recorded_at", "") >= cutoff]
+            if self.path and len(kept) < len(entries):
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.writelines(json.dumps(entry, default=str) + "\n" for entry in kept)
+                os.replace(tmp_path, self.path)
+        
+        return len(self.completed_symbols())
+    
+    def stages(self, symbol):
+        """{stage: data} ของขั้นตอนที่เสร็จแล้ว"""
+        with self._lock:
+            return dict(self._done.get(symbol, {}))
+    
+    def is_complete(self, symbol):
+        return all(stage in self.stages(symbol) for stage in STAGES)
+    
+    def completed_symbols(self):
+        with self._lock:
+            return [symbol for symbol, done in self._done.items() if all(stage in done for stage in STAGES)]
+    
+    def mark(self, symbol, stage, **data):
+        """บันทึกว่าขั้นตอนเสร็จแล้ว (flush ทันที ถ้า process ตายหลังจากนี้ก็ไม่ต้องทำซ้ำ) → คืนแถวที่บันทึก"""
+        entry = {
+            "run_id": self.run_id,
+            "symbol": symbol,
+            "stage": stage,
+            "recorded_at": datetime.now().isoformat(),
+            "data": data,
+        }
+        with self._lock:
+            if symbol:
+                self._done.setdefault(symbol, {})[stage] = data
+            if self.path:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    with open(self.path, "a") as f:
+                        f.write(json.dumps(entry, default=str) + "\n")
+                except OSError as e:
+                    logger.warning("⚠️ Cannot write run journal: %s", e)
+        return entry
+    
+    def finish(self):
+        """ทุกหุ้นของรอบนี้สำเร็จแล้ว"""
+        return self.mark(None, RUN_COMPLETE)
+
+
+run_journal = RunJournal()
@@ -0,0 +1,167 @@
+"""
+จับเวลาและนับจำนวนครั้งของแต่ละขั้นตอนในรอบการทำงาน (history, info, analyst, news, แปล, indicator, scoring, เขียน DB)
+
+    with metrics.stage("info", "yfinance", symbol):
+        ...
+
+แต่ละ stage เก็บเวลา (wall time), จำนวนครั้ง, error และจำนวน byte ที่รับ/ส่ง
+แยกตาม stage / provider / หุ้น แล้วสรุปเป็น p50/p95/p99 + รายงาน JSON ตอนจบรอบ
+
+stage ซ้อนกันได้ (เช่น finnhub_news รวมเวลา translation ที่อยู่ข้างใน)
+add_bytes() / fail() จะนับเข้า stage ในสุดที่กำลังทำงาน แม้จะถูกเรียกจาก thread ของ run_blocking
+(asyncio.to_thread คัดลอก contextvars ไปด้วย)
+"""
+import os
+import json
+import logging
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+
+RUN_REPORT_PATH = os.getenv("RUN_REPORT_PATH", ".cache/run_report.json")  # ว่าง = ไม่เขียนไฟล์
+RUN_REPORT_TOP_SYMBOLS = int(os.getenv("RUN_REPORT_TOP_SYMBOLS", "10"))  # จำนวนหุ้นที่ช้าที่สุดที่แสดงตอนจบ
+PERCENTILES = (50, 95, 99)
+
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+logger = logging.getLogger(__name__)
+
+
+class StageStats:
+    """ผลรวมของ stage เดียว (หรือ provider เดียว)"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.durations = []
+    
+    def add(self, seconds, errors=0, nbytes=0):
+        self.calls += 1
+        self.errors += errors
+        self.bytes += nbytes
+        self.durations.append(seconds)
+    
+    def summary(self):
+        durations = np.asarray(self.durations)
+        result = {
+            "calls": self.calls,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "total_seconds": round(float(durations.sum()), 3),
+        }
+        if len(durations):
+            for pct, value in zip(PERCENTILES, np.percentile(durations, PERCENTILES)):
+                result[f"p{pct}_seconds"] = round(float(value), 4)
+            result["max_seconds"] = round(float(durations.max()), 4)
+        return result
+
+
+class RunMetrics:
+    """ตัวเก็บสถิติของรอบการทำงานเดียว (ใช้จากหลาย thread พร้อมกันได้)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now()
+            self._started = time.perf_counter()
+            self.stages = {}
+            self.providers = {}
+            self.symbols = {}
+    
+    @contextmanager
+    def stage(self, name, provider=None, symbol=None):
+        """จับเวลาโค้ดใน with (exception ที่หลุดออกมานับเป็น error)"""
+        record = {"errors": 0, "bytes": 0}
+        token = _current_stage.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            record["errors"] += 1
+            raise
+        finally:
+            _current_stage.reset(token)
+            self.observe(name, time.perf_counter() - start, provider, symbol, record["errors"], record["bytes"])
+    
+    def add_bytes(self, nbytes):
+        record = _current_stage.get()
+        if record is not None:
+            record["bytes"] += nbytes
+    
+    def fail(self):
+        """นับ error ให้ stage ปัจจุบัน (ใช้ในฟังก์ชันที่จับ exception เองแล้วคืนค่า default)"""
+        record = _current_stage.get()
+        if record is not None:
+            record["errors"] += 1
+    
+    def observe(self, name, seconds, provider=None, symbol=None, errors=0, nbytes=0):
+        with self._lock:
+            self.stages.setdefault(name, StageStats()).add(seconds, errors, nbytes)
+            if provider:
+                self.providers.setdefault(provider, StageStats()).add(seconds, errors, nbytes)
+            if symbol:
+                stages = self.symbols.setdefault(symbol, {})
+                stages[name] = stages.get(name, 0.0) + seconds
+    
+    def _slowest_symbols(self, limit):
+        totals = [(stages.get("symbol", sum(stages.values())), symbol) for symbol, stages in self.symbols.items()]
+        return [symbol for _, symbol in sorted(totals, reverse=True)[:limit]]
+    
+    def report(self):
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(),
+                "wall_seconds": round(time.perf_counter() - self._started, 3),
+                "stages": {name: stats.summary() for name, stats in self.stages.items()},
+                "providers": {name: stats.summary() for name, stats in self.providers.items()},
+                "symbols": {
+                    symbol: {name: round(seconds, 4) for name, seconds in stages.items()}
+                    for symbol, stages in self.symbols.items()
+                },
+                "slowest_symbols": self._slowest_symbols(RUN_REPORT_TOP_SYMBOLS),
+            }
+    
+    def save(self, path=RUN_REPORT_PATH, **extra):
+        """เขียนรายงานเป็น JSON (extra เช่น stats / shard ของรอบนี้ถูกรวมเข้าไปด้วย)"""
+        if not path:
+            return None
+        report = self.report()
+        report.update(extra)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, path)
+        return report
+    
+    def print_summary(self):
+        report = self.report()
+        stages = sorted(report["stages"].items(), key=lambda item: item[1]["total_seconds"], reverse=True)
+        
+        logger.info("⏱️ Stage timings (wall %.1fs)", report['wall_seconds'],
+                    extra={"data": {"event": "run_metrics", "stages": report["stages"]}})
+        logger.info("   %-24s %7s %7s %9s %8s %8s %8s %9s", "Stage", "Calls", "Errors", "Total s", "p50", "p95", "p99", "KB")
+        for name, stats in stages:
+            if not stats["calls"]:
+                continue
+            logger.info("   %-24s %7d %7d %9.2f %8.3f %8.3f %8.3f %9.1f", name, stats['calls'], stats['errors'],
+                        stats['total_seconds'], stats['p50_seconds'], stats['p95_seconds'], stats['p99_seconds'],
+                        stats['bytes'] / 1024)
+        
+        if report["slowest_symbols"]:
+            slowest = ", ".join(
+                f"{symbol} {report['symbols'][symbol].get('symbol', 0):.1f}s" for symbol in report["slowest_symbols"]
+            )
+            logger.info("   Slowest symbols: %s", slowest)
+
+
+metrics = RunMetrics()
@@ -0,0 +1,343 @@
+"""
+คำศัพท์ Sentiment ของข่าว + ตัวนับคำแบบ compiled regex
+
+สร้างครั้งเดียวตอน import แล้วใช้ร่วมกันทั้ง fetch_news_data() และ fetch_sentiment_score()
+นับคำบวก/ลบได้ในการสแกนข้อความรอบเดียว และตรวจขอบเขตคำ
+(เช่น "high" จะไม่นับใน "highlight" อีกต่อไป)
+"""
+import re
+
+
+# คำศัพท์สำหรับข่าวจาก Finnhub (fetch_news_data)
+NEWS_POSITIVE_KEYWORDS = [
+    # Price Movement (ขึ้น/ดี)
+    'surge', 'soar', 'jump', 'gain', 'rise', 'rally', 'climb', 'spike', 
+    'advance', 'boost', 'pop', 'breakout', 'breakthrough', 'skyrocket',
+
+    # Trend & Market (แนวโน้มดี)
+    'bull', 'bullish', 'uptrend', 'momentum', 'strength', 'resilient',
+
+    # Performance (ผลงานดี)
+    'beat', 'exceed', 'outperform', 'top', 'best', 'leading', 'dominance',
+    'strong', 'robust', 'solid', 'impressive', 'stellar', 'outstanding',
+
+    # Growth & Expansion (เติบโต)
+    'growth', 'expand', 'expansion', 'increase', 'accelerate', 'boom',
+    'thriving', 'flourish', 'prosper',
+
+    # Records & Achievements (สถิติ/ความสำเร็จ)
+    'record', 'high', 'peak', 'all-time', 'milestone', 'historic',
+    'breakthrough', 'achievement',
+
+    # Upgrades & Ratings (อัพเกรด)
+    'upgrade', 'upgraded', 'raised', 'lift', 'improve', 'improved',
+    'positive', 'optimistic', 'confidence', 'bullish',
+
+    # Profits & Revenue (กำไร)
+    'profit', 'profitable', 'revenue', 'earnings', 'income', 'dividend',
+
+    # Success & Winners (ชนะ/สำเร็จ)
+    'win', 'winner', 'winning', 'success', 'successful', 'triumph',
+
+    # Sentiment (บวก)
+    'optimism', 'hope', 'excited', 'enthusiasm', 'promising', 'favorable',
+    'opportunity', 'potential', 'bright', 'positive',
+
+    # Guidance & Outlook (สำคัญมากสำหรับหุ้น Growth)
+    'raise guidance', 'raised outlook', 'upward revision', 'beat-and-raise', 'favorable outlook',
+
+    # Tech & AI Specific (สำหรับ NVDA / Tech)
+    'ai demand', 'gpu demand', 'data center growth', 'next-gen', 'backlog', 'production ramp',
+    'market share gain', 'technological lead', 'innovation',
+
+    # Subscription & User Base (สำหรับ NFLX)
+    'subscriber growth', 'low churn', 'content hit', 'ad-tier success', 'average revenue per user',
+
+    # Options & Technical Signals
+    'short squeeze', 'gamma squeeze', 'consolidation breakout', 'accumulation', 'high volume rally',
+
+    # Valuation & GARP
+    'undervalued', 'attractive valuation', 'reasonable price', 'strong cash flow', 'buyback', 'share repurchase'
+]
+
+NEWS_NEGATIVE_KEYWORDS = [
+    # Price Movement (ลง/แย่)
+    'fall', 'drop', 'plunge', 'crash', 'tumble', 'sink', 'slide', 'slump',
+    'decline', 'decrease', 'dive', 'plummet', 'collapse', 'tank', 'nosedive',
+
+    # Trend & Market (แนวโน้มแย่)
+    'bear', 'bearish', 'downtrend', 'downturn', 'recession', 'correction',
+
+    # Performance (ผลงานแย่)
+    'miss', 'missed', 'underperform', 'disappoint', 'disappointing',
+    'weak', 'weaken', 'poor', 'worst', 'struggle', 'struggling',
+    'fail', 'failure', 'failed', 'underwhelm',
+
+    # Loss & Damage (ขาดทุน/เสียหาย)
+    'loss', 'losses', 'losing', 'deficit', 'debt', 'bankrupt', 'bankruptcy',
+    'insolvent', 'write-down', 'impairment',
+
+    # Risk & Concern (ความเสี่ยง/กังวล)
+    'concern', 'concerned', 'worry', 'worried', 'fear', 'fearful', 'anxiety',
+    'risk', 'risky', 'danger', 'threat', 'threaten', 'warning', 'alert',
+    'uncertain', 'uncertainty', 'doubt', 'skeptical', 'cautious',
+
+    # Downgrades & Negative Ratings (ลดระดับ)
+    'downgrade', 'downgraded', 'cut', 'lower', 'lowered', 'reduce', 'reduced',
+    'negative', 'pessimistic',
+
+    # Crisis & Problems (วิกฤต/ปัญหา)
+    'crisis', 'problem', 'issue', 'trouble', 'challenge', 'difficulty',
+    'setback', 'hurdle', 'obstacle',
+
+    # Records & Extremes (สถิติแย่)
+    'low', 'bottom', 'trough', 'lowest', 'worst', 'record-low',
+
+    # Legal & Regulatory (กฎหมาย/ควบคุม)
+    'lawsuit', 'sue', 'sued', 'investigation', 'probe', 'fine', 'penalty',
+    'violation', 'fraud', 'scandal',
+
+    # Layoffs & Cuts (ลดพนักงาน/ตัด)
+    'layoff', 'layoffs', 'fire', 'fired', 'cut', 'cuts', 'cutting',
+    'eliminate', 'restructure', 'downsize',
+
+    # Sentiment (ลบ)
+    'pessimism', 'gloomy', 'bleak', 'dire', 'dismal', 'disappointing',
+
+    # Guidance & Outlook (ตัวทำลายราคาหุ้น Tech)
+    'lowered guidance', 'guidance cut', 'weak outlook', 'downward revision', 'cautious guidance',
+    'shortfall', 'missed estimates',
+
+    # Tech & AI Specific
+    'supply constraints', 'chip ban', 'export restriction', 'inventory glut', 'component shortage',
+    'obsolescence', 'stiff competition',
+
+    # Subscription & User Base (สำหรับ NFLX)
+    'subscriber loss', 'high churn', 'content fatigue', 'account sharing crackdown impact',
+
+    # Macro & Regulatory (กลุ่ม Tech โดนบ่อย)
+    'antitrust', 'regulation', 'investigation', 'probe', 'monopoly concerns', 'interest rate hike',
+
+    # Options & Technical Signals
+    'overbought', 'valuation bubble', 'profit taking', 'distribution', 'dead cat bounce',
+
+    # Valuation & Financials
+    'overvalued', 'expensive', 'stretched valuation', 'cash burn', 'margin compression'
+]
+
+# คำศัพท์ชุดเล็กสำหรับหัวข้อข่าว yfinance (fetch_sentiment_score)
+HEADLINE_POSITIVE_KEYWORDS = [
+    'surge', 'soar', 'jump', 'gain', 'rise', 'rally', 'bull', 
+    'upgrade', 'beat', 'strong', 'growth', 'record', 'high'
+]
+HEADLINE_NEGATIVE_KEYWORDS = [
+    'fall', 'drop', 'plunge', 'crash', 'bear', 'downgrade', 
+    'miss', 'weak', 'loss', 'decline', 'low', 'concern'
+]
+
+
+# คำที่มีตัวอักษรพวกนี้ติดกันถือเป็นคำเดียวกัน (ขีด - และช่องว่างถือเป็นขอบเขตคำ)
+_WORD_CHAR = "a-z0-9"
+_VOWELS = set("aeiou")
+
+
+def _inflections(keyword):
+    """รูปผันของคำ (ผันเฉพาะคำสุดท้าย) เช่น surge → surges, surged, surging"""
+    forms = {keyword}
+    last = keyword.split(" ")[-1]
+    if not last.isalpha():
+        return forms
+    
+    for suffix in ("s", "es", "ed", "ing", "er", "est"):
+        forms.add(keyword + suffix)
+    
+    if keyword.endswith("e"):
+        forms.update({keyword + "d", keyword + "r", keyword[:-1] + "ing"})
+    
+    if keyword.endswith("y") and len(last) > 2 and last[-2] not in _VOWELS:
+        forms.update({keyword[:-1] + "ies", keyword[:-1] + "ied"})
+    
+    # พยัญชนะ-สระ-พยัญชนะ → เบิ้ลตัวท้าย เช่น drop → dropped, top → topping
+    if (len(last) >= 3 and last[-1] not in _VOWELS | set("wxy")
+            and last[-2] in _VOWELS and last[-3] not in _VOWELS):
+        for suffix in ("ed", "ing", "er"):
+            forms.add(keyword + last[-1] + suffix)
+    
+    return forms
+
+
+def _trie_pattern(words):
+    """
+    รวมคำทั้งหมดเป็น regex แบบ trie (prefix เดียวกันใช้ร่วมกัน)
+    
+    regex engine จึงตัดทิ้งได้ตั้งแต่ตัวอักษรแรกที่ไม่ตรง แทนการลองทีละคำ
+    และ ? แบบ greedy ทำให้ได้คำที่ยาวที่สุดก่อน (เช่น "profit taking" ก่อน "profit")
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+    
+    def build(node):
+        is_end = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if is_end else body
+    
+    return build(trie)
+
+
+class KeywordMatcher:
+    """นับจำนวนคำบวก/ลบ (นับคำละครั้ง) ในข้อความด้วยการสแกนรอบเดียว"""
+    
+    def __init__(self, positive_keywords, negative_keywords):
+        # รูปผันทุกแบบ → (คำหลัก, +1/-1)
+        self.forms = {}
+        for polarity, keywords in ((1, positive_keywords), (-1, negative_keywords)):
+            for keyword in keywords:
+                for form in _inflections(keyword.lower()):
+                    self.forms.setdefault(form, (keyword.lower(), polarity))
+        
+        # lookahead ทำให้หาคำที่ซ้อนกันได้ (เช่น "record-low" และ "low")
+        self.pattern = re.compile(
+            f"(?<![{_WORD_CHAR}])(?=({_trie_pattern(self.forms)})(?![{_WORD_CHAR}]))"
+        )
+    
+    def matches(self, text):
+        """คำหลักที่พบในข้อความ (set)"""
+        return {self.forms[match.group(1)] for match in self.pattern.finditer(text.lower())}
+    
+    def count(self, text):
+        """คืน (จำนวนคำบวก, จำนวนคำลบ)"""
+        found = self.matches(text)
+        positive = sum(1 for _, polarity in found if polarity > 0)
+        return positive, len(found) - positive
+
+
+news_lexicon = KeywordMatcher(NEWS_POSITIVE_KEYWORDS, NEWS_NEGATIVE_KEYWORDS)
+headline_lexicon = KeywordMatcher(HEADLINE_POSITIVE_KEYWORDS, HEADLINE_NEGATIVE_KEYWORDS)
+
+
+# ============================================
+# Sentiment แบบถ่วงน้ำหนัก + ตรวจ Negation (calculate_news_sentiment_advanced)
+# ============================================
+# คำปฏิเสธ: นับเมื่อปรากฏเป็น substring ใน 3 คำก่อนหน้า (รวม "fails to" ที่คร่อม 2 คำ)
+NEGATION_WORDS = ['not', 'no', 'never', 'neither', 'nobody', 'nothing',
+                  'fails to', 'unable to', 'without']
+
+# น้ำหนักของคำ/วลี (วลีหลายคำคั่นด้วยช่องว่าง)
+SENTIMENT_WEIGHTS = {
+    # Strong Signal
+    'surge': 2, 'soar': 2, 'skyrocket': 2, 'breakout': 2,
+    'beat': 1.5, 'exceed': 1.5, 'strong': 1.5, 'rally': 1.5,
+    'plunge': -2, 'crash': -2, 'collapse': -2, 'tank': -2,
+    'miss': -1.5, 'disappoint': -1.5, 'weak': -1.5, 'slump': -1.5,
+    
+    # Moderate Signal
+    'gain': 1, 'rise': 1, 'growth': 1, 'increase': 1,
+    'upgrade': 1, 'positive': 1, 'bullish': 1,
+    'fall': -1, 'drop': -1, 'decline': -1, 'concern': -1,
+    'downgrade': -1, 'negative': -1, 'bearish': -1,
+}
+
+NEGATION_WINDOW = 3
+NEGATION_DAMPING = 0.8
+
+
+class NegationScorer:
+    """
+    ให้คะแนน sentiment (-1 ถึง 1) ในเวลาเชิงเส้นตามจำนวนคำ
+    
+    แยกคำด้วยช่องว่าง (เหมือน str.split()) แล้วเดินรอบเดียว จำตำแหน่งล่าสุดที่เจอคำปฏิเสธ
+    แทนการต่อ 3 คำก่อนหน้าแล้วค้นคำปฏิเสธใหม่ทุกคำ
+    ผลลัพธ์ตรงกับการตรวจแบบเดิมทุกกรณี
+    """
+    
+    def __init__(self, weights=SENTIMENT_WEIGHTS, negations=NEGATION_WORDS, window=NEGATION_WINDOW):
+        self.window = window
+        
+        # วลี → tuple ของคำ (คำเดียวก็เป็น tuple ยาว 1) และจำความยาววลีที่ขึ้นต้นด้วยคำนั้น
+        self.weights = {}
+        self.phrase_lengths = {}
+        for phrase, weight in weights.items():
+            tokens = tuple(phrase.lower().split())
+            self.weights[tokens] = weight
+            lengths = self.phrase_lengths.setdefault(tokens[0], set())
+            lengths.add(len(tokens))
+        self.phrase_lengths = {
+            token: sorted(lengths, reverse=True) for token, lengths in self.phrase_lengths.items()
+        }
+        
+        # คำปฏิเสธคำเดียว → ค้นในแต่ละคำ, คำปฏิเสธ 2 คำ → (ท้ายคำแรก, ต้นคำถัดไป)
+        self.single_negations = [neg for neg in negations if ' ' not in neg]
+        self.split_negations = [tuple(neg.split(' ', 1)) for neg in negations if ' ' in neg]
+        self._negation_cache = {}
+    
+    def _token_negation(self, token):
+        """(คำนี้มีคำปฏิเสธอยู่ในตัว, ส่วนท้ายของคำนี้ที่อาจต่อกับคำถัดไปเป็นคำปฏิเสธ)"""
+        cached = self._negation_cache.get(token)
+        if cached is None:
+            inside = any(neg in token for neg in self.single_negations)
+            tails = tuple(tail for head, tail in self.split_negations if token.endswith(head))
+            cached = (inside, tails)
+            if len(self._negation_cache) < 100000:
+                self._negation_cache[token] = cached
+        return cached
+    
+    def score(self, headline, summary=''):
+        return self.score_text(f"{headline} {summary}")
+    
+    def score_text(self, text):
+        words = text.lower().split()
+        
+        sentiment = 0
+        last_negation = -self.window - 1  # ตำแหน่งเริ่มของคำปฏิเสธล่าสุด
+        pending_tails = ()                # ส่วนต้นคำที่จะทำให้ "fails to" ครบ
+        skip_until = 0
+        
+        for i, word in enumerate(words):
+            is_negated = i - last_negation <= self.window
+            
+            # อัปเดต negation ด้วยคำปัจจุบัน (มีผลกับคำถัดไป)
+            inside, tails = self._token_negation(word)
+            if inside:
+                last_negation = i
+            elif any(word.startswith(tail) for tail in pending_tails):
+                last_negation = i - 1  # "fails to" เริ่มที่คำก่อนหน้า
+            pending_tails = tails
+            
+            if i < skip_until:
+                continue  # เป็นส่วนหนึ่งของวลีที่นับไปแล้ว
+            
+            score = 0
+            for length in self.phrase_lengths.get(word, ()):
+                phrase = tuple(words[i:i + length])
+                if phrase in self.weights:
+                    score = self.weights[phrase]
+                    skip_until = i + length
+                    break
+            
+            # ถ้ามี Negation → กลับเครื่องหมาย
+            if is_negated and score != 0:
+                score = -score * NEGATION_DAMPING  # ลดน้ำหนักเล็กน้อย
+            
+            sentiment += score
+        
+        # Normalize (-1 to 1) โดยสมมติทุกคำเป็น strong signal
+        max_possible = len(words) * 2
+        normalized = sentiment / max(max_possible, 1)
+        
+        return round(max(-1, min(1, normalized)), 2)
+    
+    def score_many(self, articles):
+        """ให้คะแนนหลายข่าวในครั้งเดียว: articles = [(headline, summary), ...]"""
+        return [self.score(headline, summary) for headline, summary in articles]
+
+
+news_scorer = NegationScorer()
@@ -0,0 +1,140 @@
+"""
+แบ่งหุ้นใน stock_master ให้หลาย runner ทำพร้อมกัน (--shard i/N) แล้วรวมผลทีหลัง (--merge-reports)
+
+ทุก shard ต้องแบ่งได้ผลเหมือนกันโดยไม่ต้องคุยกัน และหุ้นต้องอยู่ shard เดิมทุกรอบ
+(.cache ของแต่ละ shard เก็บราคา / indicator state / fundamentals / คำแปลของหุ้นใน shard นั้นเท่านั้น):
+- hash (ค่าเริ่มต้น): blake2b(symbol) % N
+- ถ้ามี SHARD_WEIGHTS_PATH (run report ที่ merge แล้วของรอบก่อน) หุ้นที่เคยทำแล้วอยู่ shard เดิมตาม "assignment"
+  เฉพาะหุ้นใหม่ที่ถูกแบ่งตามเวลา (ช้าที่สุดลงก่อน → shard ที่เวลารวมน้อยที่สุด)
+  ทุก shard ต้องใช้ไฟล์เดียวกัน ไม่งั้นจะได้หุ้นซ้ำ/หาย
+
+.github/workflows/stock_updater.yml รันแบบนี้:
+- job plan หา cache ของ SHARD_WEIGHTS_PATH ล่าสุดครั้งเดียว → ทุก shard restore key เดียวกัน (แบ่งหุ้นเหมือนกัน)
+- matrix update-data รัน --shard i/N (แต่ละ shard มี .cache แยก) แล้วอัปโหลด run report ของตัวเอง
+- job merge-reports รัน --merge-reports แล้วเก็บรายงานที่รวมแล้วเป็น SHARD_WEIGHTS_PATH ของรอบถัดไป
+  (หุ้นของ shard ที่ล้ม / ไม่มีรายงาน ใช้ assignment เดิมจาก SHARD_WEIGHTS_PATH ต่อ)
+
+ทุก job ยังต้องมี SUPABASE_URL / SUPABASE_KEY เหมือนเดิม (stock_collector ตรวจตอน import)
+ทุก shard ใช้ run ID เดียวกันได้ (GITHUB_RUN_ID, หุ้นของแต่ละ shard ไม่ซ้ำกัน)
+→ re-run เฉพาะ shard ที่ล้มก็ทำต่อจาก run journal ได้ (ต้องตั้ง RUN_JOURNAL_TABLE เพราะ job ที่ล้มไม่ save .cache)
+"""
+import os
+import json
+import heapq
+import hashlib
+import argparse
+import statistics
+
+
+SHARD_WEIGHTS_PATH = os.getenv("SHARD_WEIGHTS_PATH", "")  # run report ที่มีเวลาต่อหุ้น (ว่าง = แบ่งด้วย hash)
+
+
+def parse_shard(value):
+    """"2/4" → (2, 4) ใช้เป็น type ของ argparse (shard เริ่มที่ 1)"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {index} is outside 1..{count}")
+    return index, count
+
+
+def shard_of(symbol, count):
+    """shard ของหุ้นแบบ hash (0-based) ไม่ขึ้นกับ PYTHONHASHSEED"""
+    digest = hashlib.blake2b(symbol.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % count
+
+
+def load_runtimes(path=SHARD_WEIGHTS_PATH):
+    """เวลาต่อหุ้น (วินาที) จาก run report → {symbol: seconds} (ไม่มีไฟล์ = {})"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        report = json.load(f)
+    return {
+        symbol: stages.get("symbol", sum(stages.values()))
+        for symbol, stages in (report.get("symbols") or {}).items()
+    }
+
+
+def load_assignment(path=SHARD_WEIGHTS_PATH, count=None):
+    """shard ของแต่ละหุ้นในรอบก่อนจาก run report → {symbol: shard (0-based)} (จำนวน shard ไม่ตรง = {})"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        report = json.load(f)
+    if count is not None and report.get("shard_count") != count:
+        return {}
+    return dict(report.get("assignment") or {})
+
+
+def assign_shards(symbols, count, runtimes=None, previous=None):
+    """
+    {symbol: shard (0-based)}
+    
+    ไม่มี previous → hash, มี previous → หุ้นเดิมอยู่ shard เดิม หุ้นใหม่ลง shard ที่เวลารวมน้อยที่สุด
+    (ไม่ย้ายหุ้นเดิมเพื่อ balance ใหม่ เพราะ .cache ของหุ้นอยู่กับ shard เดิม)
+    """
+    if not previous:
+        return {symbol: shard_of(symbol, count) for symbol in symbols}
+    
+    runtimes = runtimes or {}
+    assignment = {symbol: previous[symbol] for symbol in symbols if 0 <= previous.get(symbol, -1) < count}
+    new_symbols = set(symbols) - set(assignment)
+    if not new_symbols:
+        return assignment
+    
+    # หุ้นที่ยังไม่มีเวลาในรายงาน ใช้ค่ากลางของหุ้นที่มี
+    default = statistics.median(runtimes.values()) if runtimes else 1.0
+    totals = [0.0] * count
+    for symbol, shard in assignment.items():
+        totals[shard] += runtimes.get(symbol, default)
+    
+    weighted = sorted(((runtimes.get(symbol, default), symbol) for symbol in new_symbols),
+                      key=lambda item: (-item[0], item[1]))
+    loads = [(total, shard) for shard, total in enumerate(totals)]
+    heapq.heapify(loads)
+    for seconds, symbol in weighted:
+        load, shard = heapq.heappop(loads)
+        assignment[symbol] = shard
+        heapq.heappush(loads, (load + seconds, shard))
+    return assignment
+
+
+def select_shard(stocks, index, count, runtimes=None, previous=None):
+    """แถวของ stock_master ที่เป็นของ shard index/count (index เริ่มที่ 1)"""
+    assignment = assign_shards([stock_data['symbol'] for stock_data in stocks], count, runtimes, previous)
+    return [stock_data for stock_data in stocks if assignment[stock_data['symbol']] == index - 1]
+
+
+def merge_reports(paths):
+    """
+    รวม run report ของทุก shard: สถิติ (stats / total) บวกกัน, เวลาต่อหุ้นรวมเป็นชุดเดียว
+    (ใช้เป็น SHARD_WEIGHTS_PATH ของรอบถัดไปได้) stage รวมได้แค่ calls / errors / bytes / เวลารวม
+    assignment = shard ของหุ้นแต่ละตัว (จาก "assigned" ของแต่ละรายงาน)
+    """
+    merged = {"shards": [], "total": 0, "stats": {}, "wall_seconds": 0.0, "stages": {}, "symbols": {},
+              "shard_count": None, "assignment": {}}
+    for path in paths:
+        with open(path) as f:
+            report = json.load(f)
+        
+        merged["shards"].append(report.get("shard") or path)
+        if report.get("shard"):
+            index, count = parse_shard(report["shard"])
+            merged["shard_count"] = count
+            merged["assignment"].update((symbol, index - 1) for symbol in report.get("assigned") or [])
+        merged["total"] += report.get("total", 0)
+        merged["wall_seconds"] = max(merged["wall_seconds"], report.get("wall_seconds", 0.0))
+        for key, value in (report.get("stats") or {}).items():
+            merged["stats"][key] = merged["stats"].get(key, 0) + value
+        for name, stats in (report.get("stages") or {}).items():
+            stage = merged["stages"].setdefault(name, {"calls": 0, "errors": 0, "bytes": 0, "total_seconds": 0.0})
+            for key in stage:
+                stage[key] += stats.get(key, 0)
+        merged["symbols"].update(report.get("symbols") or {})
+    
+    for stage in merged["stages"].values():
+        stage["total_seconds"] = round(stage["total_seconds"], 3)
+    return merged
@@ -1,12 +1,32 @@
 import os
+import json
+import argparse
+import time
 import asyncio
+import logging
 import yfinance as yf
 import pandas as pd
 import talib
 from supabase import create_client, Client
-import requests 
 from datetime import datetime, timedelta
 from deep_translator import GoogleTranslator 
+from rate_limiter import run_blocking, is_provider_error
+from http_pool import http, is_connection_error
+from run_metrics import metrics, RUN_REPORT_PATH
+from run_journal import run_journal, new_run_id, RUN_ID, RUN_JOURNAL_TABLE
+from sharding import parse_shard, select_shard, load_runtimes, load_assignment, merge_reports
+from log_config import OrderedLog, setup_logging
+from bar_store import load_bars, save_bars, overlap_start, is_readjusted, merge_bars, split_bulk_history
+from indicator_state import update_indicators, reset_state
+from indicator_engine import compute_universe_indicators
+from cpu_pool import CPU_WORKERS, compute_indicators_parallel
+from market_data import market_data
+from ttl_cache import fundamentals_cache
+from write_buffer import WriteBuffer, WRITE_BATCH_SIZE
+from news_dedup import seen_news, NEWS_RETENTION_DAYS
+from translation_cache import translate_texts, translation_cache
+from sentiment_lexicon import news_lexicon, headline_lexicon, news_scorer
+from batch_scoring import score_universe
 
 
 # --- Configuration ---
@@ -14,13 +34,22 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 TWELVE_DATA_KEY = os.getenv("TWELVE_DATA_KEY")
 FINNHUB_KEY = os.getenv("FINNHUB_KEY") 
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "8"))  # จำนวนหุ้นที่ประมวลผลพร้อมกัน
+BULK_DOWNLOAD_CHUNK = int(os.getenv("BULK_DOWNLOAD_CHUNK", "100"))  # จำนวนหุ้นต่อ 1 request ของ yf.download
+TWELVE_DATA_BATCH = int(os.getenv("TWELVE_DATA_BATCH", "8"))  # จำนวนหุ้นต่อ 1 request ของ Twelve Data (1 credit ต่อหุ้น)
+TWELVE_DATA_OUTPUTSIZE = int(os.getenv("TWELVE_DATA_OUTPUTSIZE", "500"))  # จำนวนแท่งรายวัน (~2 ปี ให้ EMA 200 มีค่า)
+INDICATOR_ENGINE = os.getenv("INDICATOR_ENGINE", "incremental")  # incremental (state ต่อหุ้น) หรือ vectorized (ทั้งตลาดพร้อมกัน)
+SNAPSHOT_LOOKBACK_DAYS = int(os.getenv("SNAPSHOT_LOOKBACK_DAYS", "7"))  # --rescore ใช้ snapshot ล่าสุดภายในกี่วัน
+OUTCOME_HORIZON_DAYS = int(os.getenv("OUTCOME_HORIZON_DAYS", "30"))  # prediction ที่เก่ากว่านี้ถึงจะคำนวณ actual_outcome
  
 
+logger = logging.getLogger("stock_collector")
+
 # Debug
 if FINNHUB_KEY:
-    print(f"✅ FINNHUB_KEY loaded: {FINNHUB_KEY[:10]}...{FINNHUB_KEY[-4:]}")
+    logger.debug("✅ FINNHUB_KEY loaded: %s...%s", FINNHUB_KEY[:10], FINNHUB_KEY[-4:])
 else:
-    print("❌ FINNHUB_KEY not found")
+    logger.warning("❌ FINNHUB_KEY not found")
     
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("❌ Missing SUPABASE_URL or SUPABASE_KEY")
@@ -203,15 +232,19 @@ def calculate_actual_outcome(symbol, prediction_date):
         return round(((current_price - prediction_price) / prediction_price) * 100, 2)
         
     except Exception as e:
-        print(f"⚠️ Error calculating actual outcome: {e}")
+        logger.warning("⚠️ Error calculating actual outcome: %s", e)
         return None
 
 
 def fetch_news_data(symbol):
-    """ดึงข่าวล่าสุดจาก Finnhub API และคำนวณ sentiment + แปลภาษาไทย"""
+    """
+    ดึงข่าวล่าสุดจาก Finnhub API และคำนวณ sentiment + แปลภาษาไทย
+    
+    คืน [] เมื่อไม่มีข่าวใหม่ และ None เมื่อดึงไม่สำเร็จ (run journal จะไม่จดว่าเสร็จ รอบที่ restart ดึงใหม่)
+    """
     try:
         if not FINNHUB_KEY or FINNHUB_KEY == "":
-            print(f"⚠️ FINNHUB_KEY not configured, skipping news for {symbol}")
+            logger.warning("⚠️ FINNHUB_KEY not configured, skipping news for %s", symbol)
             return []
         
         # 1. กำหนดช่วงเวลา: 7 วันล่าสุด
@@ -228,153 +261,49 @@ def fetch_news_data(symbol):
         }
         
         # 3. ยิง Request ไปที่ API
-        response = requests.get(url, params=params, timeout=10)
+        response = http.get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
         # 4. ตรวจสอบข้อมูล
         if not data or not isinstance(data, list):
-            print(f"📭 No news available for {symbol}")
+            logger.debug("📭 No news available for %s", symbol)
             return []
         
-        print(f"📰 Found {len(data)} news articles for {symbol}")
+        logger.debug("📰 Found %s news articles for %s", len(data), symbol)
+        
+        # 4.1 ตัดข่าวที่เคยบันทึกแล้วออก (ไม่ต้องแปลและเขียนซ้ำ)
+        new_articles = [news for news in data if not seen_news.contains(news.get('url'))]
+        if len(new_articles) < len(data):
+            logger.debug("   Skipping %s already saved articles", len(data) - len(new_articles))
         
         # 5. เอาแค่ 10 ข่าวล่าสุด
-        news_list = data[:10]
+        news_list = new_articles[:10]
         
-        # 6. แปลภาษาไทย
+        # 6. แปลภาษาไทย (ใช้คำแปลใน cache ก่อน ที่เหลือแปลพร้อมกัน)
         try:
-            translator = GoogleTranslator(source='en', target='th')
+            texts = []
             for news in news_list:
-                headline = news.get('headline', '')
-                summary = news.get('summary', '')
+                texts.append(news.get('headline', ''))
+                texts.append((news.get('summary') or '')[:4500])
+            
+            with metrics.stage("translation", "google_translate", symbol):
+                translated = translate_texts(texts, lambda: GoogleTranslator(source='en', target='th'))
+            
+            for i, news in enumerate(news_list):
+                headline_th, summary_th = translated[2 * i], translated[2 * i + 1]
                 
-                if headline:
-                    news['headline_th'] = translator.translate(headline)
+                if headline_th:
+                    news['headline_th'] = headline_th
                 
-                if summary:
-                    news['summary_th'] = translator.translate(summary[:4500])
+                if summary_th:
+                    news['summary_th'] = summary_th
         except Exception as trans_error:
-            print(f"⚠️ Translation failed for {symbol}: {trans_error}")
+            logger.warning("⚠️ Translation failed for %s: %s", symbol, trans_error)
             # ถ้าแปลไม่ได้ ใช้ภาษาอังกฤษเดิม
  
  
-
-        positive_keywords = [
-            # Price Movement (ขึ้น/ดี)
-            'surge', 'soar', 'jump', 'gain', 'rise', 'rally', 'climb', 'spike', 
-            'advance', 'boost', 'pop', 'breakout', 'breakthrough', 'skyrocket',
-            
-            # Trend & Market (แนวโน้มดี)
-            'bull', 'bullish', 'uptrend', 'momentum', 'strength', 'resilient',
-            
-            # Performance (ผลงานดี)
-            'beat', 'exceed', 'outperform', 'top', 'best', 'leading', 'dominance',
-            'strong', 'robust', 'solid', 'impressive', 'stellar', 'outstanding',
-            
-            # Growth & Expansion (เติบโต)
-            'growth', 'expand', 'expansion', 'increase', 'accelerate', 'boom',
-            'thriving', 'flourish', 'prosper',
-            
-            # Records & Achievements (สถิติ/ความสำเร็จ)
-            'record', 'high', 'peak', 'all-time', 'milestone', 'historic',
-            'breakthrough', 'achievement',
-            
-            # Upgrades & Ratings (อัพเกรด)
-            'upgrade', 'upgraded', 'raised', 'lift', 'improve', 'improved',
-            'positive', 'optimistic', 'confidence', 'bullish',
-            
-            # Profits & Revenue (กำไร)
-            'profit', 'profitable', 'revenue', 'earnings', 'income', 'dividend',
-            
-            # Success & Winners (ชนะ/สำเร็จ)
-            'win', 'winner', 'winning', 'success', 'successful', 'triumph',
-            
-            # Sentiment (บวก)
-            'optimism', 'hope', 'excited', 'enthusiasm', 'promising', 'favorable',
-            'opportunity', 'potential', 'bright', 'positive',
-            
-            # Guidance & Outlook (สำคัญมากสำหรับหุ้น Growth)
-            'raise guidance', 'raised outlook', 'upward revision', 'beat-and-raise', 'favorable outlook',
-            
-            # Tech & AI Specific (สำหรับ NVDA / Tech)
-            'ai demand', 'gpu demand', 'data center growth', 'next-gen', 'backlog', 'production ramp',
-            'market share gain', 'technological lead', 'innovation',
-            
-            # Subscription & User Base (สำหรับ NFLX)
-            'subscriber growth', 'low churn', 'content hit', 'ad-tier success', 'average revenue per user',
-            
-            # Options & Technical Signals
-            'short squeeze', 'gamma squeeze', 'consolidation breakout', 'accumulation', 'high volume rally',
-            
-            # Valuation & GARP
-            'undervalued', 'attractive valuation', 'reasonable price', 'strong cash flow', 'buyback', 'share repurchase'
-        ]
-        
-        negative_keywords = [
-            # Price Movement (ลง/แย่)
-            'fall', 'drop', 'plunge', 'crash', 'tumble', 'sink', 'slide', 'slump',
-            'decline', 'decrease', 'dive', 'plummet', 'collapse', 'tank', 'nosedive',
-            
-            # Trend & Market (แนวโน้มแย่)
-            'bear', 'bearish', 'downtrend', 'downturn', 'recession', 'correction',
-            
-            # Performance (ผลงานแย่)
-            'miss', 'missed', 'underperform', 'disappoint', 'disappointing',
-            'weak', 'weaken', 'poor', 'worst', 'struggle', 'struggling',
-            'fail', 'failure', 'failed', 'underwhelm',
-            
-            # Loss & Damage (ขาดทุน/เสียหาย)
-            'loss', 'losses', 'losing', 'deficit', 'debt', 'bankrupt', 'bankruptcy',
-            'insolvent', 'write-down', 'impairment',
-            
-            # Risk & Concern (ความเสี่ยง/กังวล)
-            'concern', 'concerned', 'worry', 'worried', 'fear', 'fearful', 'anxiety',
-            'risk', 'risky', 'danger', 'threat', 'threaten', 'warning', 'alert',
-            'uncertain', 'uncertainty', 'doubt', 'skeptical', 'cautious',
-            
-            # Downgrades & Negative Ratings (ลดระดับ)
-            'downgrade', 'downgraded', 'cut', 'lower', 'lowered', 'reduce', 'reduced',
-            'negative', 'pessimistic',
-            
-            # Crisis & Problems (วิกฤต/ปัญหา)
-            'crisis', 'problem', 'issue', 'trouble', 'challenge', 'difficulty',
-            'setback', 'hurdle', 'obstacle',
-            
-            # Records & Extremes (สถิติแย่)
-            'low', 'bottom', 'trough', 'lowest', 'worst', 'record-low',
-            
-            # Legal & Regulatory (กฎหมาย/ควบคุม)
-            'lawsuit', 'sue', 'sued', 'investigation', 'probe', 'fine', 'penalty',
-            'violation', 'fraud', 'scandal',
-            
-            # Layoffs & Cuts (ลดพนักงาน/ตัด)
-            'layoff', 'layoffs', 'fire', 'fired', 'cut', 'cuts', 'cutting',
-            'eliminate', 'restructure', 'downsize',
-            
-            # Sentiment (ลบ)
-            'pessimism', 'gloomy', 'bleak', 'dire', 'dismal', 'disappointing',
-
-            # Guidance & Outlook (ตัวทำลายราคาหุ้น Tech)
-            'lowered guidance', 'guidance cut', 'weak outlook', 'downward revision', 'cautious guidance',
-            'shortfall', 'missed estimates',
-            
-            # Tech & AI Specific
-            'supply constraints', 'chip ban', 'export restriction', 'inventory glut', 'component shortage',
-            'obsolescence', 'stiff competition',
-            
-            # Subscription & User Base (สำหรับ NFLX)
-            'subscriber loss', 'high churn', 'content fatigue', 'account sharing crackdown impact',
-            
-            # Macro & Regulatory (กลุ่ม Tech โดนบ่อย)
-            'antitrust', 'regulation', 'investigation', 'probe', 'monopoly concerns', 'interest rate hike',
-            
-            # Options & Technical Signals
-            'overbought', 'valuation bubble', 'profit taking', 'distribution', 'dead cat bounce',
-            
-            # Valuation & Financials
-            'overvalued', 'expensive', 'stretched valuation', 'cash burn', 'margin compression'
-        ]
+        
  
         # 8. สร้าง news_records พร้อม sentiment
         news_records = []
@@ -383,14 +312,13 @@ def fetch_news_data(symbol):
             headline = news.get('headline', '')
             
             if not headline:
-                print(f"⚠️ News #{idx}: No headline found, skipping...")
+                logger.debug("⚠️ News #%s: No headline found, skipping...", idx)
                 continue
             
             headline_lower = headline.lower()
             
             # คำนวณ sentiment
-            pos_count = sum(1 for word in positive_keywords if word in headline_lower)
-            neg_count = sum(1 for word in negative_keywords if word in headline_lower)
+            pos_count, neg_count = news_lexicon.count(headline_lower)
             
             if pos_count > 0 or neg_count > 0:
                 sentiment = round((pos_count - neg_count) / max(pos_count + neg_count, 1), 2)
@@ -420,38 +348,66 @@ def fetch_news_data(symbol):
             
             # Debug: แสดงข้อมูลข่าวแรก
             if idx == 1:
-                print(f"   Sample: {headline[:50]}...")
-                print(f"   Thai: {news.get('headline_th', '')[:50]}...")
-                print(f"   Sentiment: {sentiment} | Source: {news.get('source')}")
+                logger.debug("   Sample: %s...", headline[:50])
+                logger.debug("   Thai: %s...", news.get('headline_th', '')[:50])
+                logger.debug("   Sentiment: %s | Source: %s", sentiment, news.get('source'))
         
         return news_records
         
     except Exception as e:
-        print(f"⚠️ Cannot fetch news for {symbol}: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
+        if is_provider_error(e):
+            raise  # ให้ run_blocking retry / นับเข้า circuit breaker
+        metrics.fail()
+        logger.warning("⚠️ Cannot fetch news for %s: %s", symbol, e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return None
          
     
+FUNDAMENTAL_FIELDS = ("pe_ratio", "peg_ratio", "eps_growth_pct", "market_cap")
+
+
 def fetch_fundamental_data(symbol):
-    """ดึงข้อมูล Fundamental สำหรับกลยุทธ์ GARP"""
+    """
+    ดึงข้อมูล Fundamental สำหรับกลยุทธ์ GARP
+    
+    field ที่ยังไม่หมดอายุใช้ค่าใน cache, ดึง .info ใหม่และบันทึกเฉพาะ field ที่หมดอายุแล้ว
+    """
+    cached, missing = fundamentals_cache.get_many(symbol, FUNDAMENTAL_FIELDS)
+    if not missing:
+        return cached
+    
     try:
-        stock = yf.Ticker(symbol)
-        info = stock.info
+        info = market_data.info(symbol)
         
-        return {
+        fetched = {
             "pe_ratio": info.get('forwardPE') or info.get('trailingPE'),
             "peg_ratio": info.get('pegRatio'),
             "eps_growth_pct": info.get('earningsGrowth', 0) * 100 if info.get('earningsGrowth') else None,
             "market_cap": info.get('marketCap')
         }
+        refreshed = {field: fetched[field] for field in missing}
+        fundamentals_cache.set_many(symbol, refreshed)
+        return {**cached, **refreshed}
     except Exception as e:
-        print(f"⚠️ Cannot fetch fundamental data for {symbol}: {e}")
-        return {}
+        if is_provider_error(e):
+            raise  # ให้ run_blocking retry / นับเข้า circuit breaker
+        metrics.fail()
+        logger.warning("⚠️ Cannot fetch fundamental data for %s: %s", symbol, e)
+        return cached
 
  
-def calculate_technical_indicators(df):
-    """คำนวณค่าเทคนิคด้วย TA-Lib"""
+def calculate_technical_indicators(df, symbol=None):
+    """
+    คำนวณค่าเทคนิคด้วย TA-Lib
+    
+    ถ้าระบุ symbol จะใช้ indicator state ที่เก็บไว้ อัพเดตเฉพาะแท่งใหม่
+    (ผลลัพธ์ตรงกับ TA-Lib และไม่ต้องมีข้อมูลครบ 200 แท่ง - ค่าไหนยังไม่พอจะเป็น None)
+    """
+    if symbol:
+        try:
+            return update_indicators(symbol, df)
+        except Exception as e:
+            logger.warning("⚠️ Indicator state failed for %s, using TA-Lib: %s", symbol, e)
+    
     try:
         if len(df) < 200:  # ต้องมีข้อมูลอย่างน้อย 200 แท่ง
             return None
@@ -482,7 +438,7 @@ def calculate_technical_indicators(df):
             "bb_lower": float(bb_lower[-1]) if not pd.isna(bb_lower[-1]) else None
         }
     except Exception as e:
-        print(f"❌ Error calculating indicators: {e}")
+        logger.error("❌ Error calculating indicators: %s", e)
         return None
 
 
@@ -503,10 +459,14 @@ def calculate_upside_pct(current_price, ema_200, ema_50=None):
 
 
 def fetch_analyst_data(symbol):
-    """ดึงข้อมูล Analyst Recommendations จาก yfinance"""
+    """ดึงข้อมูล Analyst Recommendations จาก yfinance (ใช้ค่าใน cache ถ้ายังไม่หมดอายุ)"""
+    hit, cached = fundamentals_cache.get(symbol, "analyst_buy_pct")
+    if hit:
+        return cached
+    
     try:
-        stock = yf.Ticker(symbol)
-        recommendations = stock.recommendations
+        recommendations = market_data.recommendations(symbol)
+        buy_pct = None
         
         if recommendations is not None and not recommendations.empty:
             recent = recommendations.tail(10)
@@ -519,10 +479,16 @@ def fetch_analyst_data(symbol):
                     buy_count += 1
             
             total = len(recent)
-            return round((buy_count / total) * 100, 2) if total > 0 else None
+            buy_pct = round((buy_count / total) * 100, 2) if total > 0 else None
+        
+        fundamentals_cache.set(symbol, "analyst_buy_pct", buy_pct)
+        return buy_pct
             
     except Exception as e:
-        print(f"⚠️ Cannot fetch analyst data for {symbol}: {e}")
+        if is_provider_error(e):
+            raise  # ให้ run_blocking retry / นับเข้า circuit breaker
+        metrics.fail()
+        logger.warning("⚠️ Cannot fetch analyst data for %s: %s", symbol, e)
     
     return None
 
@@ -530,28 +496,18 @@ def fetch_analyst_data(symbol):
 def fetch_sentiment_score(symbol):
     """คำนวณ Sentiment Score จากข่าวของ yfinance"""
     try:
-        stock = yf.Ticker(symbol)
-        news = stock.news
+        news = market_data.news(symbol)
         
         if not news or len(news) == 0:
             return None
         
-        positive_keywords = [
-            'surge', 'soar', 'jump', 'gain', 'rise', 'rally', 'bull', 
-            'upgrade', 'beat', 'strong', 'growth', 'record', 'high'
-        ]
-        negative_keywords = [
-            'fall', 'drop', 'plunge', 'crash', 'bear', 'downgrade', 
-            'miss', 'weak', 'loss', 'decline', 'low', 'concern'
-        ]
         
         score = 0
         analyzed_count = 0
         
         for article in news[:20]:
             title = article.get('title', '').lower()
-            pos_count = sum(1 for word in positive_keywords if word in title)
-            neg_count = sum(1 for word in negative_keywords if word in title)
+            pos_count, neg_count = headline_lexicon.count(title)
             
             if pos_count > 0 or neg_count > 0:
                 score += pos_count - neg_count
@@ -564,22 +520,258 @@ def fetch_sentiment_score(symbol):
         return round(max(-1, min(1, normalized_score)), 2)
         
     except Exception as e:
-        print(f"⚠️ Cannot fetch sentiment for {symbol}: {e}")
+        if is_provider_error(e):
+            raise  # ให้ run_blocking retry / นับเข้า circuit breaker
+        metrics.fail()
+        logger.warning("⚠️ Cannot fetch sentiment for %s: %s", symbol, e)
     
     return None
 
 
-async def fetch_data_waterfall(symbol):
-    """กลยุทธ์ดึงข้อมูลแบบน้ำตก: yfinance -> Twelve Data"""
-    print(f"🔍 Fetching data for {symbol}...")
+async def _download_bulk(chunk, **kwargs):
+    with metrics.stage("history_bulk", "yfinance"):
+        # yf.download ยิง request แยกต่อ ticker → ใช้ token ตามจำนวนหุ้นใน chunk
+        df = await run_blocking(
+            "yfinance",
+            yf.download,
+            chunk,
+            cost=len(chunk),
+            group_by="ticker",
+            auto_adjust=True,
+            threads=True,
+            progress=False,
+            **kwargs
+        )
+        metrics.add_bytes(int(df.memory_usage(deep=False).sum()) if df is not None else 0)
+    return split_bulk_history(df, chunk)
+
+
+async def fetch_price_history_bulk(symbols, period="2y"):
+    """
+    ดึง OHLCV ของหุ้นทั้งหมด: อ่านจาก cache ในเครื่องก่อน แล้วดึงด้วย yf.download ครั้งละหลาย ticker
+    
+    - หุ้นที่มี cache แล้ว → ดึงเฉพาะตั้งแต่แท่งก่อนแท่งล่าสุดที่มี (ซ้อน 1 แท่งไว้ตรวจ split / ปันผล)
+    - หุ้นที่ยังไม่มี cache หรือราคาย้อนหลังถูก adjust ใหม่ → ดึงเต็ม period
+    - ถ้าดึงไม่สำเร็จ → ใช้ข้อมูลเดิมใน cache
+    
+    Returns: {symbol: DataFrame} (หุ้นที่ไม่มีข้อมูลเลยจะไม่มีใน dict → fallback ไปดึงทีละตัว)
+    """
+    cached = {symbol: load_bars(symbol) for symbol in symbols}
+    
+    # จัดกลุ่มตามวันเริ่มดึง เพื่อให้ 1 request ใช้ start เดียวกัน
+    groups = {}
+    for symbol in symbols:
+        start_date = overlap_start(cached[symbol])
+        start = start_date.strftime('%Y-%m-%d') if start_date is not None else None
+        groups.setdefault(start, []).append(symbol)
+    
+    frames = {}
+    request_count = 0
+    cache_only = 0
+    readjusted = []
+    pending = list(groups.items())
+    
+    while pending:
+        start, group = pending.pop(0)
+        refetch = []
+        for i in range(0, len(group), BULK_DOWNLOAD_CHUNK):
+            chunk = group[i:i + BULK_DOWNLOAD_CHUNK]
+            request_count += 1
+            
+            try:
+                if start:
+                    new_frames = await _download_bulk(chunk, start=start)
+                else:
+                    new_frames = await _download_bulk(chunk, period=period)
+            except Exception as e:
+                logger.warning("⚠️ Bulk download failed for %s symbols: %s", len(chunk), e)
+                new_frames = {}
+            
+            for symbol in chunk:
+                # split / ปันผล: แท่งใน cache อยู่บนฐานราคาเดิม → ทิ้ง cache + indicator state แล้วดึงเต็ม period
+                if start and is_readjusted(cached[symbol], new_frames.get(symbol)):
+                    logger.info("🔁 %s history was re-adjusted (split/dividend), refetching %s", symbol, period)
+                    reset_state(symbol)
+                    cached[symbol] = None
+                    refetch.append(symbol)
+                    continue
+                
+                # cache ของหุ้นตัวเดียวที่เสีย ไม่ควรทำให้ทั้งรอบหยุด → หุ้นตัวนั้นไป fallback ทีละตัวแทน
+                try:
+                    merged = merge_bars(cached[symbol], new_frames.get(symbol))
+                except Exception as e:
+                    logger.warning("⚠️ Cannot merge bars for %s: %s", symbol, e)
+                    continue
+                if merged is None or merged.empty:
+                    continue
+                
+                frames[symbol] = merged
+                if symbol in new_frames:
+                    save_bars(symbol, merged)
+                else:
+                    cache_only += 1
+        
+        if refetch:
+            readjusted.extend(refetch)
+            pending.append((None, refetch))
+    
+    logger.info("📦 Bulk history: %s/%s symbols in %s request(s) (%s incremental, %s re-adjusted, %s from cache only)",
+                len(frames), len(symbols), request_count, len(symbols) - len(groups.get(None, [])),
+                len(readjusted), cache_only)
+    return frames
+
+
+class TwelveDataError(Exception):
+    """Twelve Data ตอบ HTTP 200 แต่ body เป็น error (เช่น code 429 เมื่อ credit ของนาทีนี้หมด)"""
+    
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# หุ้นที่ Twelve Data ไม่มีข้อมูลในรอบนี้ (fetch_data_waterfall จะไม่ยิง quote ซ้ำ)
+twelve_data_misses = set()
+
+
+def _parse_twelve_data_series(item):
+    """values ของ time_series (ใหม่ → เก่า) → DataFrame OHLCV เรียงเก่า → ใหม่ แบบเดียวกับ yfinance"""
+    df = pd.DataFrame(item["values"])
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.pop("datetime")), name="Date")
+    df = df.rename(columns={"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"})
+    df = df.apply(pd.to_numeric, errors="coerce").sort_index()
+    df.attrs["source"] = "twelvedata"
+    return df
+
+
+def _fetch_twelve_data_series(chunk, outputsize=TWELVE_DATA_OUTPUTSIZE):
+    """time_series รายวันของหลายหุ้นใน request เดียว (symbol=A,B,C) → {symbol: DataFrame}"""
+    resp = http.get(
+        "https://api.twelvedata.com/time_series",
+        params={
+            "symbol": ",".join(chunk),
+            "interval": "1day",
+            "outputsize": outputsize,
+            "apikey": TWELVE_DATA_KEY,
+        },
+        timeout=30
+    )
+    resp.raise_for_status()
+    payload = resp.json()
+    
+    # error ทั้ง request (key ผิด, credit หมด) มาเป็น object เดียวที่มี code
+    if payload.get("status") == "error" and "code" in payload:
+        raise TwelveDataError(payload.get("message", "Twelve Data error"), payload.get("code"))
+    
+    # ขอหุ้นเดียว → ได้ object ของหุ้นนั้นตรงๆ ไม่ได้ key ด้วย symbol
+    if len(chunk) == 1:
+        payload = {chunk[0]: payload}
+    
+    frames = {}
+    for symbol in chunk:
+        item = payload.get(symbol) or {}
+        if item.get("status") == "error" or not item.get("values"):
+            continue
+        frames[symbol] = _parse_twelve_data_series(item)
+    return frames
+
+
+def _fetch_twelve_data_quote(symbol):
+    """ราคาล่าสุดของหุ้นตัวเดียว (raise_for_status ใน thread เดียวกัน → HTTP 5xx นับเข้า circuit breaker)"""
+    resp = http.get(f"https://api.twelvedata.com/quote?symbol={symbol}&apikey={TWELVE_DATA_KEY}", timeout=10)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def fetch_twelve_data_bulk(symbols):
+    """
+    ดึงราคาย้อนหลังจาก Twelve Data ให้หุ้นที่ yfinance ไม่มีข้อมูล ครั้งละ TWELVE_DATA_BATCH ตัว
+    
+    ได้ทั้งแท่งราคา จึงคำนวณ indicator ได้ครบเหมือนข้อมูลจาก yfinance (ไม่ใช่แค่ราคาล่าสุดจาก quote)
+    ไม่บันทึกลง bar store เพราะราคาไม่ได้ adjust แบบเดียวกับ yfinance
+    
+    Returns: {symbol: DataFrame} (df.attrs["source"] = "twelvedata")
+    """
+    frames = {}
+    if not TWELVE_DATA_KEY or not symbols:
+        return frames
+    
+    request_count = 0
+    for i in range(0, len(symbols), TWELVE_DATA_BATCH):
+        chunk = symbols[i:i + TWELVE_DATA_BATCH]
+        request_count += 1
+        
+        try:
+            with metrics.stage("history_bulk", "twelvedata"):
+                frames.update(await run_blocking("twelvedata", _fetch_twelve_data_series, chunk, cost=len(chunk)))
+        except Exception as e:
+            logger.warning("⚠️ Twelve Data batch failed for %s symbols: %s", len(chunk), e)
+    
+    twelve_data_misses.update(symbol for symbol in symbols if symbol not in frames)
+    logger.info("🔄 Twelve Data fallback: %s/%s symbols in %s request(s)", len(frames), len(symbols), request_count)
+    return frames
+
+
+def _fetch_history_incremental(symbol, period="2y"):
+    """
+    ดึงราคาย้อนหลังของหุ้นตัวเดียว โดยอ่าน cache ก่อนแล้วดึงเฉพาะแท่งใหม่
+    (ราคาย้อนหลังถูก adjust ใหม่จาก split / ปันผล → ทิ้ง cache + indicator state แล้วดึงเต็ม period)
+    """
+    cached = load_bars(symbol)
+    start_date = overlap_start(cached)
+    
+    try:
+        if start_date is not None:
+            new_bars = market_data.history(symbol, start=start_date.strftime('%Y-%m-%d'))
+            if is_readjusted(cached, new_bars):
+                logger.info("🔁 %s history was re-adjusted (split/dividend), refetching %s", symbol, period)
+                reset_state(symbol)
+                cached = None
+                new_bars = market_data.history(symbol, period=period)
+        else:
+            new_bars = market_data.history(symbol, period=period)
+    except Exception as e:
+        if is_provider_error(e):
+            raise  # นับเข้า circuit breaker, fetch_data_waterfall ใช้ cache แทน
+        logger.warning("⚠️ No new yfinance history for %s: %s", symbol, e)
+        new_bars = None
+    
+    merged = merge_bars(cached, new_bars)
+    if new_bars is not None and not new_bars.empty:
+        save_bars(symbol, merged)
+    
+    return merged if merged is not None else pd.DataFrame()
+
+
+async def fetch_data_waterfall(symbol, history=None, precomputed=None):
+    """
+    กลยุทธ์ดึงข้อมูลแบบน้ำตก: yfinance -> Twelve Data
+    
+    ถ้ามี history จาก fetch_price_history_bulk แล้ว จะไม่ยิง request ซ้ำ
+    ถ้ามี precomputed จาก compute_universe_indicators แล้ว จะไม่คำนวณ indicator ซ้ำ
+    history ที่มาจาก fetch_twelve_data_bulk จะได้ source เป็น "twelvedata"
+    """
+    logger.debug("🔍 Fetching data for %s...", symbol)
     
     # --- Source 1: yfinance (Primary) ---
     try:
-        stock = yf.Ticker(symbol)
-        df = stock.history(period="2y")
+        if history is not None and not history.empty:
+            df = history
+        else:
+            try:
+                with metrics.stage("history", "yfinance", symbol):
+                    df = await run_blocking("yfinance", _fetch_history_incremental, symbol)
+            except Exception as e:
+                # yfinance ล่ม / circuit เปิดอยู่ → ใช้แท่งใน cache ถ้ามี
+                df = load_bars(symbol)
+                if df is None:
+                    raise
+                logger.warning("⚠️ yfinance failed for %s, using cached history: %s", symbol, e)
         
         if not df.empty and len(df) >= 2:
-            tech_data = calculate_technical_indicators(df)
+            tech_data = precomputed
+            if not tech_data:
+                with metrics.stage("indicators", symbol=symbol):
+                    tech_data = calculate_technical_indicators(df, symbol)
             
             # ถ้าคำนวณไม่ได้ (ETF หรือข้อมูลน้อย) ใช้ข้อมูลพื้นฐาน
             if not tech_data:
@@ -587,11 +779,11 @@ async def fetch_data_waterfall(symbol):
                 current_price = float(df['Close'].iloc[-1])
                 change_pct = ((current_price - prev_close) / prev_close) * 100
                 
-                print(f"⚠️ Using basic data only for {symbol}")
+                logger.warning("⚠️ Using basic data only for %s", symbol)
                 return {
                     "price": current_price,
                     "change_pct": round(change_pct, 2),
-                    "source": "yfinance_basic",
+                    "source": f"{df.attrs.get('source', 'yfinance')}_basic",
                     "rsi": None,
                     "macd": None,
                     "macd_signal": None,
@@ -607,23 +799,21 @@ async def fetch_data_waterfall(symbol):
             change_pct = ((current_price - prev_close) / prev_close) * 100
             
             tech_data['change_pct'] = round(change_pct, 2)
-            tech_data['source'] = 'yfinance'
+            tech_data['source'] = df.attrs.get('source', 'yfinance')
             return tech_data
         else:
-            print(f"⚠️ Insufficient data from yfinance for {symbol}")
+            logger.warning("⚠️ Insufficient data from yfinance for %s", symbol)
             
     except Exception as e:
-        print(f"⚠️ yfinance failed for {symbol}: {e}")
-
+        logger.warning("⚠️ yfinance failed for %s: %s", symbol, e)
+    
     # --- Source 2: Twelve Data (Fallback) ---
-    if TWELVE_DATA_KEY:
+    # หุ้นที่ fetch_twelve_data_bulk ลองแล้วไม่มีข้อมูล ไม่ต้องเสีย credit ซ้ำ
+    if TWELVE_DATA_KEY and symbol not in twelve_data_misses:
         try:
-            print(f"🔄 Falling back to Twelve Data for {symbol}...")
-            url = f"https://api.twelvedata.com/quote?symbol={symbol}&apikey={TWELVE_DATA_KEY}"
-            resp = requests.get(url, timeout=10)
-            resp.raise_for_status()
-            
-            data = resp.json()
+            logger.debug("🔄 Falling back to Twelve Data for %s...", symbol)
+            with metrics.stage("quote", "twelvedata", symbol):
+                data = await run_blocking("twelvedata", _fetch_twelve_data_quote, symbol)
             
             if "close" in data and "percent_change" in data:
                 return {
@@ -640,12 +830,12 @@ async def fetch_data_waterfall(symbol):
                     "bb_lower": None
                 }
             else:
-                print(f"⚠️ Invalid response from Twelve Data: {data}")
+                logger.warning("⚠️ Invalid response from Twelve Data: %s", data)
                 
         except Exception as e:
-            print(f"❌ Twelve Data fallback failed for {symbol}: {e}")
-
-    print(f"❌ All sources failed for {symbol}")
+            logger.error("❌ Twelve Data fallback failed for %s: %s", symbol, e)
+    
+    logger.error("❌ All sources failed for %s", symbol)
     return None
  
 
@@ -837,7 +1027,7 @@ def calculate_overall_score_with_risk(symbol, tech_data, fundamental_data, news_
     # ปรับ Score
     final_score = adjust_score_by_risk(base_score, risk_score)
     
-    print(f"   Base Score: {base_score} | Risk: {risk_score} | Final: {final_score}")
+    logger.debug("   Base Score: %s | Risk: %s | Final: %s", base_score, risk_score, final_score)
     
     return final_score 
 
@@ -965,158 +1155,217 @@ def calculate_overall_score(symbol, tech_data, fundamental_data, news_sentiment,
 
 def calculate_news_sentiment_advanced(headline, summary=''):
     """
-    Sentiment Analysis แบบละเอียดขึ้น
+    Sentiment Analysis แบบละเอียดขึ้น (ถ่วงน้ำหนักคำ + กลับเครื่องหมายเมื่อมีคำปฏิเสธ)
+    
+    ตารางน้ำหนักและตัวนับอยู่ใน sentiment_lexicon (สร้างครั้งเดียวตอน import)
     
     Returns: sentiment_score (-1 to 1)
     """
-    
-    text = f"{headline} {summary}".lower()
-    
-    # 1. ตรวจสอบ Negation (ปฏิเสธ)
-    negation_words = ['not', 'no', 'never', 'neither', 'nobody', 'nothing', 
-                      'fails to', 'unable to', 'without']
-    
-    # 2. คำที่มีน้ำหนักมาก (Strong Signal)
-    strong_positive = {
-        'surge': 2, 'soar': 2, 'skyrocket': 2, 'breakout': 2,
-        'beat': 1.5, 'exceed': 1.5, 'strong': 1.5, 'rally': 1.5
-    }
-    
-    strong_negative = {
-        'plunge': -2, 'crash': -2, 'collapse': -2, 'tank': -2,
-        'miss': -1.5, 'disappoint': -1.5, 'weak': -1.5, 'slump': -1.5
-    }
-    
-    # 3. คำทั่วไป (Moderate Signal)
-    moderate_positive = {
-        'gain': 1, 'rise': 1, 'growth': 1, 'increase': 1,
-        'upgrade': 1, 'positive': 1, 'bullish': 1
-    }
-    
-    moderate_negative = {
-        'fall': -1, 'drop': -1, 'decline': -1, 'concern': -1,
-        'downgrade': -1, 'negative': -1, 'bearish': -1
-    }
-    
-    # 4. คำนวณ Sentiment
-    sentiment = 0
-    words = text.split()
-    
-    for i, word in enumerate(words):
-        # เช็ค Negation (3 คำก่อนหน้า)
-        is_negated = False
-        if i > 0:
-            prev_words = ' '.join(words[max(0, i-3):i])
-            if any(neg in prev_words for neg in negation_words):
-                is_negated = True
-        
-        # คำนวณคะแนน
-        score = 0
-        if word in strong_positive:
-            score = strong_positive[word]
-        elif word in strong_negative:
-            score = strong_negative[word]
-        elif word in moderate_positive:
-            score = moderate_positive[word]
-        elif word in moderate_negative:
-            score = moderate_negative[word]
-        
-        # ถ้ามี Negation → กลับเครื่องหมาย
-        if is_negated and score != 0:
-            score = -score * 0.8  # ลดน้ำหนักเล็กน้อย
-        
-        sentiment += score
-    
-    # 5. Normalize (-1 to 1)
-    max_possible = len(words) * 2  # สมมติทุกคำเป็น strong signal
-    normalized = sentiment / max(max_possible, 1)
-    
-    return round(max(-1, min(1, normalized)), 2)
+    return news_scorer.score(headline, summary)
+
+
+
+# ตารางที่เขียนแบบ upsert (ข้ามแถวที่ซ้ำ) → คอลัมน์ที่ใช้ตรวจซ้ำ
+UPSERT_CONFLICT_KEYS = {
+    "stock_news": os.getenv("NEWS_CONFLICT_KEY", "url"),
+}
 
 
+def _write_rows(table, rows):
+    conflict_key = UPSERT_CONFLICT_KEYS.get(table)
+    if conflict_key:
+        return supabase.table(table).upsert(rows, on_conflict=conflict_key, ignore_duplicates=True).execute()
+    return supabase.table(table).insert(rows).execute()
 
-async def main():
+
+def _reset_supabase_client(error):
+    """สร้าง client ใหม่เฉพาะตอน connection เสีย (error จาก API ใช้ connection pool เดิมต่อได้)"""
     global supabase
-    
-    # ดึงข้อมูลหุ้นทั้งหมด
-    res = supabase.table("stock_master")\
-        .select("symbol, category")\
-        .eq("is_active", True)\
-        .execute()
-    stocks = res.data
-    
-    if not stocks:
-        print("📭 No active symbols found in stock_master.")
+    if not is_connection_error(error):
         return
+    logger.warning("🔌 Supabase connection broken, reconnecting: %s", error)
+    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+def _load_recent_news_urls():
+    """ดึง url ข่าวล่าสุดจาก stock_news (ใช้ seed ดัชนีข่าวที่เคยบันทึก)"""
+    cutoff = (datetime.now() - timedelta(days=NEWS_RETENTION_DAYS)).isoformat()
+    page_size = 1000
+    rows = []
+    
+    while True:
+        res = supabase.table("stock_news")\
+            .select("url, published_at")\
+            .gte("published_at", cutoff)\
+            .range(len(rows), len(rows) + page_size - 1)\
+            .execute()
+        page = res.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+write_buffer = WriteBuffer(_write_rows, conflict_keys=UPSERT_CONFLICT_KEYS, on_retry=_reset_supabase_client)
+
+
+def _journal(symbol, stage, **data):
+    """บันทึกว่าขั้นตอนของหุ้นนี้เสร็จแล้ว (ไฟล์ในเครื่องทันที + Supabase แบบไม่รอผล)"""
+    entry = run_journal.mark(symbol, stage, **data)
+    if RUN_JOURNAL_TABLE:
+        write_buffer.submit(RUN_JOURNAL_TABLE, [entry])
 
-    print(f"\n🚀 Starting technical analysis for {len(stocks)} symbols")
-    print(f"📅 Analysis time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+def _load_journal_entries(run_id):
+    """ดึงขั้นตอนที่เสร็จแล้วของ run_id จาก RUN_JOURNAL_TABLE"""
+    page_size = 1000
+    rows = []
+    
+    while True:
+        res = supabase.table(RUN_JOURNAL_TABLE)\
+            .select("run_id, symbol, stage, data")\
+            .eq("run_id", run_id)\
+            .range(len(rows), len(rows) + page_size - 1)\
+            .execute()
+        page = res.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+async def _fetch_optional(stage, provider, func, symbol, default=None):
+    """
+    เรียก fetch function ของข้อมูลเสริม (fundamental, analyst, sentiment, news) โดยจับเวลาเป็น stage
     
-    # ตัวแปรสำหรับสถิติ
-    stats = {
-        'success': 0,
-        'failed': 0,
-        'strong_buy': 0,
-        'buy': 0,
-        'hold': 0,
-        'sell': 0,
-        'high_confidence': 0,
-        'medium_confidence': 0,
-        'low_confidence': 0
-    }
+    ถ้า provider ยังโดน rate limit หลัง retry ครบ หรือ circuit breaker เปิดอยู่ ใช้ default แทน
+    (หุ้นตัวนั้นยังบันทึก snapshot + prediction ได้ตามปกติ)
+    provider=None → ข้อมูลอยู่ใน cache ไม่ต้องรอ rate limit
+    """
+    try:
+        with metrics.stage(stage, provider or "cache", symbol):
+            return await run_blocking(provider, func, symbol)
+    except Exception as e:
+        logger.warning("⚠️ Skipped %s for %s: %s", func.__name__, symbol, e)
+        return default
+
+
+async def _collect_news(symbol, category, fetch_slots):
+    """
+    ดึงข่าวจาก Finnhub แล้วบันทึกลง stock_news → คืน (ข่าวที่ดึงได้, sentiment ของข่าวที่บันทึก)
+    
+    ถ้าดึงและบันทึกครบจะจด "news" ลง run journal (รอบที่ restart ไม่ต้องดึง/แปลข่าวซ้ำ)
+    """
+    news_sentiment_advanced = None
+    news_records = []
+    completed = True
     
-    for idx, stock_data in enumerate(stocks, 1):
-        symbol = stock_data['symbol']
-        category = stock_data.get('category', 'Core')
+    if category != 'ETF':
+        logger.debug("📰 Fetching news for %s...", symbol)
+        async with fetch_slots:
+            news_records = await _fetch_optional("finnhub_news", "finnhub", fetch_news_data, symbol)
+        completed = news_records is not None
+        news_records = news_records or []
         
-        print(f"\n{'='*60}")
-        print(f"[{idx}/{len(stocks)}] Processing: {symbol} ({category})")
-        print(f"{'='*60}")
+        logger.debug("📊 Retrieved %s valid news articles", len(news_records))
         
+        if news_records:
+            try:
+                saved_count = 0
+                saved_news = []
+                
+                # เขียนข่าวทั้งหมดใน batch เดียว (upsert ข้ามข่าวที่มีอยู่แล้ว)
+                results = await write_buffer.write_many("stock_news", news_records)
+                
+                for news, result in zip(news_records, results):
+                    if isinstance(result, Exception):
+                        if "duplicate" not in str(result).lower():
+                            logger.warning("⚠️ News error: %s", result)
+                            completed = False
+                        continue
+                    
+                    # บันทึกแล้ว (หรือมีอยู่แล้วใน DB) → รอบหน้าไม่ต้องดึงมาแปลอีก
+                    seen_news.add(news.get('url'), news.get('published_at'))
+                    
+                    if not result:
+                        continue  # ข่าวซ้ำ
+                    
+                    saved_count += 1
+                    saved_news.append((news.get('title', ''), news.get('summary', '')))
+                
+                logger.debug("✅ Saved %s/%s news for %s", saved_count, len(news_records), symbol)
+                
+                # คำนวณ Sentiment แบบใหม่ของข่าวที่บันทึกทั้งหมดในครั้งเดียว
+                sentiment_scores = news_scorer.score_many(saved_news)
+                
+                if sentiment_scores:
+                    news_sentiment_advanced = round(sum(sentiment_scores) / len(sentiment_scores), 2)
+                    logger.debug("   Advanced Sentiment: %.2f", news_sentiment_advanced)
+                
+            except Exception as news_error:
+                logger.warning("⚠️ Failed to save news for %s: %s", symbol, news_error)
+                completed = False
+        else:
+            logger.debug("📭 No valid news found for %s", symbol)
+    
+    if completed:
+        _journal(symbol, "news", saved=len(news_records), sentiment=news_sentiment_advanced)
+    return news_records, news_sentiment_advanced
+
+
+async def process_symbol(idx, total, stock_data, stats, fetch_slots, history=None, precomputed=None):
+    """ประมวลผลหุ้น 1 ตัว: Technical → Fundamental → Snapshot → News → Prediction"""
+    symbol = stock_data['symbol']
+    category = stock_data.get('category', 'Core')
+    started = time.perf_counter()
+    done = run_journal.stages(symbol)  # ขั้นตอนที่ทำเสร็จแล้วก่อนรอบนี้ถูก restart
+    
+    logger.debug("[%s/%s] Processing: %s (%s)", idx, total, symbol, category)
+    
+    if "snapshot" in done and "prediction" in done:
+        # เหลือแค่ข่าวที่ครั้งก่อนบันทึกไม่สำเร็จ → ไม่ต้องดึงราคาและคำนวณใหม่
+        await _collect_news(symbol, category, fetch_slots)
+        _count_prediction(stats, **done["prediction"])
+        stats['resumed'] += 1
+        logger.info("[%s/%s] %s resumed: news only", idx, total, symbol)
+        return
+    
+    # ขั้นตอนดึงข้อมูลใช้ slot ของ worker pool (ตอนรอเขียน DB จะคืน slot ให้หุ้นตัวอื่น)
+    async with fetch_slots:
         # ============================================
         # STEP 1: ดึงข้อมูล Technical
         # ============================================
-        data = await fetch_data_waterfall(symbol)
+        data = await fetch_data_waterfall(symbol, history, precomputed)
         
         if not data:
-            print(f"❌ Failed: {symbol}")
+            logger.error("❌ Failed: %s", symbol)
             stats['failed'] += 1
-            await asyncio.sleep(5)
-            continue
+            return
         
         if not data.get("ema_200"):
-            print(f"⚠️ {symbol}: No EMA 200 data available")
+            logger.debug("⚠️ %s: No EMA 200 data available", symbol)
         
         # ============================================
         # STEP 2: ดึง Market Cap + Fundamental Data
         # ============================================
-        print(f"📊 Calculating metrics for {symbol}...")
+        logger.debug("📊 Calculating metrics for %s...", symbol)
         
         market_cap = None
         fundamental_data = None
         
         if category != 'ETF':
-            try:
-                stock = yf.Ticker(symbol)
-                info = stock.info
-                
-                # ดึง market_cap
-                market_cap = info.get('marketCap')
-                
-                # ดึง fundamental data
-                fundamental_data = {
-                    "pe_ratio": info.get('forwardPE') or info.get('trailingPE'),
-                    "peg_ratio": info.get('pegRatio'),
-                    "eps_growth_pct": info.get('earningsGrowth', 0) * 100 if info.get('earningsGrowth') else None,
-                    "market_cap": market_cap
-                }
-                
-                if market_cap:
-                    market_cap_str = f"${market_cap/1e9:.1f}B" if market_cap >= 1e9 else f"${market_cap/1e6:.1f}M"
-                    print(f"   Market Cap: {market_cap_str}")
-                
-            except Exception as yf_error:
-                print(f"⚠️ Could not fetch yfinance data: {yf_error}")
+            # ดึง market_cap + fundamental data จาก .info (ครั้งเดียวต่อหุ้น ผ่าน market_data)
+            # ถ้าทุก field ยังอยู่ใน cache ไม่ต้องรอ rate limit ของ yfinance
+            # yfinance ล้ม → ใช้ field ที่ยังไม่หมดอายุไปก่อน
+            cached, missing = fundamentals_cache.get_many(symbol, FUNDAMENTAL_FIELDS)
+            fundamental_data = await _fetch_optional(
+                "info", "yfinance" if missing else None, fetch_fundamental_data, symbol, default=cached
+            ) or None
+        
+            if fundamental_data:
+                market_cap = fundamental_data.get('market_cap')
+        
+            if market_cap:
+                market_cap_str = f"${market_cap/1e9:.1f}B" if market_cap >= 1e9 else f"${market_cap/1e6:.1f}M"
+                logger.debug("   Market Cap: %s", market_cap_str)
         
         # คำนวณ Upside
         upside_pct = calculate_upside_pct(
@@ -1126,285 +1375,762 @@ async def main():
         )
         
         # ข้าม analyst/sentiment สำหรับ ETF
-        analyst_pct = None if category == 'ETF' else fetch_analyst_data(symbol)
-        sentiment = None if category == 'ETF' else fetch_sentiment_score(symbol)
-        
-        # ============================================
-        # STEP 3: บันทึก Snapshot
-        # ============================================
-        snapshot_payload = {
-            "symbol": symbol,
-            "price": data.get("price"),
-            "change_pct": data.get("change_pct"),
-            "rsi": data.get("rsi"),
-            "macd": data.get("macd"),
-            "macd_signal": data.get("macd_signal"),
-            "ema_20": data.get("ema_20"),
-            "ema_50": data.get("ema_50"),
-            "ema_200": data.get("ema_200"),
-            "bb_upper": data.get("bb_upper"),
-            "bb_lower": data.get("bb_lower"),
-            "upside_pct": upside_pct,
-            "analyst_buy_pct": analyst_pct,
-            "sentiment_score": sentiment,
-            "recorded_at": datetime.now().isoformat()
-        }
+        if category == 'ETF':
+            analyst_pct = None
+        else:
+            cached, _ = fundamentals_cache.get(symbol, "analyst_buy_pct")
+            analyst_pct = await _fetch_optional("analyst", None if cached else "yfinance", fetch_analyst_data, symbol)
+        sentiment = None if category == 'ETF' else await _fetch_optional("yfinance_news", "yfinance", fetch_sentiment_score, symbol)
+    
+    # ============================================
+    # STEP 3: บันทึก Snapshot
+    # ============================================
+    snapshot_payload = {
+        "symbol": symbol,
+        "price": data.get("price"),
+        "change_pct": data.get("change_pct"),
+        "rsi": data.get("rsi"),
+        "macd": data.get("macd"),
+        "macd_signal": data.get("macd_signal"),
+        "ema_20": data.get("ema_20"),
+        "ema_50": data.get("ema_50"),
+        "ema_200": data.get("ema_200"),
+        "bb_upper": data.get("bb_upper"),
+        "bb_lower": data.get("bb_lower"),
+        "upside_pct": upside_pct,
+        "analyst_buy_pct": analyst_pct,
+        "sentiment_score": sentiment,
+        "recorded_at": datetime.now().isoformat()
+    }
+    
+    # เพิ่ม fundamental data ใน snapshot
+    if fundamental_data:
+        snapshot_payload["pe_ratio"] = fundamental_data.get("pe_ratio")
+        snapshot_payload["peg_ratio"] = fundamental_data.get("peg_ratio")
+        snapshot_payload["eps_growth_pct"] = fundamental_data.get("eps_growth_pct")
+        snapshot_payload["market_cap"] = market_cap
+    
+    # บันทึก snapshot (รวม batch กับหุ้นตัวอื่น, retry อยู่ใน write_buffer)
+    try:
+        if "snapshot" in done:
+            logger.debug("⏭️ Snapshot already saved in this run: %s", symbol)
+        else:
+            await write_buffer.write("stock_snapshots", snapshot_payload)
+            _journal(symbol, "snapshot")
+            logger.debug("✅ Snapshot saved: %s", symbol)
+        logger.debug("   Price: $%.2f | Change: %.2f%%", data.get('price'), data.get('change_pct'))
+        if data.get('rsi'):
+            logger.debug("   RSI: %.2f | Upside: %s%%", data.get('rsi'), upside_pct)
+    except Exception as db_error:
+        logger.warning("⚠️ Database error: %s", db_error)
+        logger.error("❌ Failed to save snapshot for %s", symbol)
+        stats['failed'] += 1
+        return
+    
+    # ============================================
+    # STEP 4: ดึงและบันทึกข่าว
+    # ============================================
+    if "news" in done:
+        news_records, news_sentiment_advanced = [], done["news"].get("sentiment")
+    else:
+        news_records, news_sentiment_advanced = await _collect_news(symbol, category, fetch_slots)
+    
+    # ============================================
+    # STEP 5: คำนวณ AI Prediction
+    # ============================================
+    logger.debug("🤖 Calculating AI prediction for %s...", symbol)
+    scoring_started = time.perf_counter()
+    
+    # เตรียมข้อมูล Technical
+    tech_data_full = {
+        'price': data.get('price'),
+        'rsi': data.get('rsi'),
+        'macd': data.get('macd'),
+        'macd_signal': data.get('macd_signal'),
+        'ema_20': data.get('ema_20'),
+        'ema_50': data.get('ema_50'),
+        'ema_200': data.get('ema_200'),
+        'bb_upper': data.get('bb_upper'),
+        'bb_lower': data.get('bb_lower'),
+        'upside_pct': upside_pct,
+        'analyst_buy_pct': analyst_pct
+    }
+    
+    # ใช้ Sentiment แบบใหม่ถ้ามี
+    final_sentiment = news_sentiment_advanced if news_sentiment_advanced is not None else sentiment
+    
+    # คำนวณ Overall Score
+    if 'calculate_overall_score_with_risk' in globals():
+        # ใช้เวอร์ชันใหม่ที่มี Risk Management
+        overall_score = calculate_overall_score_with_risk(
+            symbol=symbol,
+            tech_data=tech_data_full,
+            fundamental_data=fundamental_data,
+            news_sentiment=final_sentiment,
+            category=category,
+            market_cap=market_cap
+        )
+        risk_score = calculate_risk_score(tech_data_full, fundamental_data, market_cap)
+    else:
+        # ใช้เวอร์ชันเดิม
+        overall_score = calculate_overall_score(
+            symbol=symbol,
+            tech_data=tech_data_full,
+            fundamental_data=fundamental_data,
+            news_sentiment=final_sentiment
+        )
+        risk_score = 0
+    
+    # สร้างคำแนะนำ
+    if 'generate_recommendation_advanced' in globals():
+        # ใช้เวอร์ชันใหม่
+        recommendation_data = generate_recommendation_advanced(
+            overall_score=overall_score,
+            price=data.get('price'),
+            upside_pct=upside_pct,
+            risk_score=risk_score,
+            category=category
+        )
         
-        # เพิ่ม fundamental data ใน snapshot
-        if fundamental_data:
-            snapshot_payload["pe_ratio"] = fundamental_data.get("pe_ratio")
-            snapshot_payload["peg_ratio"] = fundamental_data.get("peg_ratio")
-            snapshot_payload["eps_growth_pct"] = fundamental_data.get("eps_growth_pct")
-            snapshot_payload["market_cap"] = market_cap
+        recommendation = recommendation_data['recommendation']
+        reason = recommendation_data['reason']
+        price_target = recommendation_data['price_target']
+        confidence = recommendation_data.get('confidence', 'Medium')
+        time_horizon = recommendation_data.get('time_horizon', '6 months')
+    else:
+        # ใช้เวอร์ชันเดิม
+        recommendation, reason, price_target = generate_recommendation(
+            overall_score=overall_score,
+            price=data.get('price'),
+            upside_pct=upside_pct
+        )
+        confidence = None
+        time_horizon = None
+    
+    metrics.observe("scoring", time.perf_counter() - scoring_started, symbol=symbol)
+    
+    # ============================================
+    # STEP 6: บันทึก AI Prediction (พร้อมฟิลด์ใหม่)
+    # ============================================
+    prediction_payload = {
+        "symbol": symbol,
+        "ai_model": "rule_based_v2" if 'calculate_overall_score_with_risk' in globals() else "rule_based_v1",
+        "overall_score": overall_score,
+        "recommendation": recommendation,
+        "price_at_prediction": data.get('price'),
+        "actual_outcome": None
+    }
+    
+    # 🆕 เพิ่มฟิลด์ใหม่ (ตอนนี้ใช้ได้แล้ว!)
+    if risk_score > 0:
+        prediction_payload["risk_score"] = risk_score
+    
+    if confidence:
+        prediction_payload["confidence"] = confidence
+    
+    if price_target:
+        prediction_payload["price_target"] = price_target
+    
+    if time_horizon:
+        prediction_payload["time_horizon"] = time_horizon
+    
+    try:
+        await write_buffer.write("ai_predictions", prediction_payload)
+        _journal(symbol, "prediction", recommendation=recommendation, confidence=confidence,
+                 overall_score=overall_score)
         
-        # บันทึก snapshot
-        max_db_retries = 3
-        snapshot_saved = False
+        # แสดงผลแบบละเอียด
+        logger.debug("✅ AI Prediction saved: %s", symbol)
+        logger.debug("   📊 Score: %s/100 | %s", overall_score, recommendation)
         
-        for db_attempt in range(max_db_retries):
-            try:
-                supabase.table("stock_snapshots").insert(snapshot_payload).execute()
-                print(f"✅ Snapshot saved: {symbol}")
-                print(f"   Price: ${data.get('price'):.2f} | Change: {data.get('change_pct'):.2f}%")
-                if data.get('rsi'):
-                    print(f"   RSI: {data.get('rsi'):.2f} | Upside: {upside_pct}%")
-                snapshot_saved = True
-                break
-            except Exception as db_error:
-                print(f"⚠️ Database error (attempt {db_attempt + 1}/{max_db_retries}): {db_error}")
-                if db_attempt < max_db_retries - 1:
-                    await asyncio.sleep(2)
-                    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-                else:
-                    print(f"❌ Failed to save snapshot for {symbol}")
-                    break
+        if risk_score > 0:
+            risk_level = 'High' if risk_score >= 60 else 'Medium' if risk_score >= 30 else 'Low'
+            logger.debug("   💎 Risk: %s/100 (%s)", risk_score, risk_level)
         
-        if not snapshot_saved:
-            stats['failed'] += 1
-            await asyncio.sleep(3)
-            continue
+        if confidence:
+            logger.debug("   🎯 Confidence: %s", confidence)
         
-        # ============================================
-        # STEP 4: ดึงและบันทึกข่าว
-        # ============================================
-        news_sentiment_advanced = None
+        logger.debug("   📝 Reason: %s", reason)
         
-        if category != 'ETF':
-            print(f"📰 Fetching news for {symbol}...")
-            news_records = fetch_news_data(symbol)
-            
-            print(f"📊 Retrieved {len(news_records)} valid news articles")
-            
-            if news_records:
-                try:
-                    saved_count = 0
-                    sentiment_scores = []
-                    
-                    for news in news_records:
-                        try:
-                            supabase.table("stock_news").insert(news).execute()
-                            saved_count += 1
-                            
-                            # คำนวณ Sentiment แบบใหม่ (ถ้ามีฟังก์ชัน)
-                            if 'calculate_news_sentiment_advanced' in globals():
-                                adv_sentiment = calculate_news_sentiment_advanced(
-                                    news.get('title', ''),
-                                    news.get('summary', '')
-                                )
-                                sentiment_scores.append(adv_sentiment)
-                            
-                        except Exception as dup_error:
-                            if "duplicate" not in str(dup_error).lower():
-                                print(f"⚠️ News error: {dup_error}")
-                    
-                    print(f"✅ Saved {saved_count}/{len(news_records)} news for {symbol}")
-                    
-                    if sentiment_scores:
-                        news_sentiment_advanced = round(sum(sentiment_scores) / len(sentiment_scores), 2)
-                        print(f"   Advanced Sentiment: {news_sentiment_advanced:.2f}")
-                    
-                except Exception as news_error:
-                    print(f"⚠️ Failed to save news for {symbol}: {news_error}")
-            else:
-                print(f"📭 No valid news found for {symbol}")
-        
-        # ============================================
-        # STEP 5: คำนวณ AI Prediction
-        # ============================================
-        print(f"🤖 Calculating AI prediction for {symbol}...")
-        
-        # เตรียมข้อมูล Technical
-        tech_data_full = {
-            'price': data.get('price'),
-            'rsi': data.get('rsi'),
-            'macd': data.get('macd'),
-            'macd_signal': data.get('macd_signal'),
-            'ema_20': data.get('ema_20'),
-            'ema_50': data.get('ema_50'),
-            'ema_200': data.get('ema_200'),
-            'bb_upper': data.get('bb_upper'),
-            'bb_lower': data.get('bb_lower'),
-            'upside_pct': upside_pct,
-            'analyst_buy_pct': analyst_pct
-        }
+        if price_target:
+            upside_to_target = ((price_target - data.get('price')) / data.get('price')) * 100
+            logger.debug("   🎯 Target: $%.2f (+%.1f%%)", price_target, upside_to_target)
         
-        # ใช้ Sentiment แบบใหม่ถ้ามี
-        final_sentiment = news_sentiment_advanced if news_sentiment_advanced is not None else sentiment
-        
-        # คำนวณ Overall Score
-        if 'calculate_overall_score_with_risk' in globals():
-            # ใช้เวอร์ชันใหม่ที่มี Risk Management
-            overall_score = calculate_overall_score_with_risk(
-                symbol=symbol,
-                tech_data=tech_data_full,
-                fundamental_data=fundamental_data,
-                news_sentiment=final_sentiment,
-                category=category,
-                market_cap=market_cap
-            )
-            risk_score = calculate_risk_score(tech_data_full, fundamental_data, market_cap)
-        else:
-            # ใช้เวอร์ชันเดิม
-            overall_score = calculate_overall_score(
-                symbol=symbol,
-                tech_data=tech_data_full,
-                fundamental_data=fundamental_data,
-                news_sentiment=final_sentiment
-            )
-            risk_score = 0
-        
-        # สร้างคำแนะนำ
-        if 'generate_recommendation_advanced' in globals():
-            # ใช้เวอร์ชันใหม่
-            recommendation_data = generate_recommendation_advanced(
-                overall_score=overall_score,
-                price=data.get('price'),
-                upside_pct=upside_pct,
-                risk_score=risk_score,
-                category=category
-            )
+        if time_horizon:
+            logger.debug("   ⏰ Horizon: %s", time_horizon)
+        
+        # อัพเดตสถิติ
+        _count_prediction(stats, recommendation, confidence)
+        
+        # บรรทัดสรุปของหุ้นนี้ (ระดับ INFO) รายละเอียดแต่ละขั้นตอนอยู่ใน DEBUG
+        logger.info(
+            "[%s/%s] %s %s | score %s | risk %s | $%.2f (%+.2f%%) | news %s | %.1fs",
+            idx, total, symbol, recommendation, overall_score, risk_score,
+            data.get('price') or 0, data.get('change_pct') or 0, len(news_records),
+            time.perf_counter() - started,
+            extra={"data": {
+                "event": "symbol_done",
+                "recommendation": recommendation,
+                "overall_score": overall_score,
+                "risk_score": risk_score,
+                "confidence": confidence,
+                "price": data.get('price'),
+                "change_pct": data.get('change_pct'),
+                "source": data.get('source'),
+                "news": len(news_records),
+                "seconds": round(time.perf_counter() - started, 3),
+            }}
+        )
             
-            recommendation = recommendation_data['recommendation']
-            reason = recommendation_data['reason']
-            price_target = recommendation_data['price_target']
-            confidence = recommendation_data.get('confidence', 'Medium')
-            time_horizon = recommendation_data.get('time_horizon', '6 months')
+    except Exception as pred_error:
+        logger.warning("⚠️ Failed to save prediction for %s: %s", symbol, pred_error)
+        stats['failed'] += 1
+
+
+def _new_stats():
+    """ตัวนับสถิติของการรัน 1 ครั้ง"""
+    return {
+        'success': 0,
+        'failed': 0,
+        'strong_buy': 0,
+        'buy': 0,
+        'hold': 0,
+        'sell': 0,
+        'high_confidence': 0,
+        'medium_confidence': 0,
+        'low_confidence': 0,
+        'resumed': 0
+    }
+
+
+def _count_prediction(stats, recommendation, confidence=None, **_):
+    """นับสถิติของ prediction ที่บันทึกแล้ว (รวมถึงที่บันทึกไว้ก่อนรอบนี้ถูก restart)"""
+    stats['success'] += 1
+    
+    if confidence == 'High':
+        stats['high_confidence'] += 1
+    elif confidence == 'Medium':
+        stats['medium_confidence'] += 1
+    elif confidence == 'Low':
+        stats['low_confidence'] += 1
+    
+    if recommendation == 'Strong Buy':
+        stats['strong_buy'] += 1
+    elif recommendation == 'Buy':
+        stats['buy'] += 1
+    elif recommendation == 'Hold':
+        stats['hold'] += 1
+    elif recommendation in ['Sell', 'Strong Sell']:
+        stats['sell'] += 1
+
+
+def _print_summary(stats, total, title):
+    """สรุปผลการทำงาน"""
+    logger.info("✅ %s", title, extra={"data": {"event": "run_summary", "total": total, **stats}})
+    logger.info("📊 Summary Statistics:")
+    logger.info("   Total Processed: %s", total)
+    logger.info("   ✅ Success: %s", stats['success'])
+    logger.info("   ❌ Failed: %s", stats['failed'])
+    if stats.get('resumed'):
+        logger.info("   ⏭️ Done before restart: %s", stats['resumed'])
+    
+    logger.info("📈 Recommendations Breakdown:")
+    logger.info("   🟢 Strong Buy: %s", stats['strong_buy'])
+    logger.info("   🟢 Buy: %s", stats['buy'])
+    logger.info("   🟡 Hold: %s", stats['hold'])
+    logger.info("   🔴 Sell: %s", stats['sell'])
+    
+    # แสดงสถิติ Confidence
+    if stats['high_confidence'] + stats['medium_confidence'] + stats['low_confidence'] > 0:
+        logger.info("🎯 Confidence Distribution:")
+        logger.info("   🔥 High Confidence: %s", stats['high_confidence'])
+        logger.info("   📊 Medium Confidence: %s", stats['medium_confidence'])
+        logger.info("   ⚠️ Low Confidence: %s", stats['low_confidence'])
+    
+    # คำนวณ success rate
+    if total > 0:
+        success_rate = (stats['success'] / total) * 100
+        logger.info("✨ Success Rate: %.1f%%", success_rate)
+    
+    logger.info("⏰ Completed at: %s", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+
+async def main(run_id=None, resume=False, shard=None, force_refresh=False):
+    """
+    run_id: รอบที่ต้องการทำต่อ (ขั้นตอนที่เสร็จแล้วใน run journal จะถูกข้าม)
+    resume: ไม่ระบุ run_id → ทำต่อจากรอบล่าสุดในไฟล์ journal ที่ยังไม่จบ
+    shard: (i, N) → ทำเฉพาะหุ้นของ shard ที่ i จาก N (ดู sharding.py)
+    force_refresh: ไม่ใช้ค่า fundamental / analyst ใน cache (เหมือน FORCE_REFRESH=1) แต่ยังบันทึกค่าใหม่ลง cache
+    """
+    if force_refresh:
+        fundamentals_cache.force_refresh = True
+    market_data.clear()
+    twelve_data_misses.clear()
+    metrics.reset()
+    
+    # ดึงข้อมูลหุ้นทั้งหมด
+    res = await run_blocking(
+        "supabase",
+        lambda: supabase.table("stock_master").select("symbol, category").eq("is_active", True).execute()
+    )
+    stocks = res.data
+    
+    if not stocks:
+        logger.info("📭 No active symbols found in stock_master.")
+        return
+    
+    if shard:
+        runtimes = load_runtimes()
+        previous = load_assignment(count=shard[1])
+        universe = len(stocks)
+        stocks = select_shard(stocks, *shard, runtimes=runtimes, previous=previous)
+        shard_symbols = [stock_data['symbol'] for stock_data in stocks]  # ทั้ง shard (รวมหุ้นที่ resume ข้าม)
+        logger.info("🧩 Shard %s/%s: %s/%s symbols (%s)", *shard, len(stocks), universe,
+                    "previous assignment, new symbols by runtime" if previous else "hash")
+    total = len(stocks)
+    
+    # run journal: รอบเดิมที่ถูก restart ข้ามหุ้น/ขั้นตอนที่บันทึกเสร็จแล้ว
+    run_id = run_id or (run_journal.latest_unfinished() if resume else None) or RUN_ID or new_run_id()
+    remote_entries = []
+    if RUN_JOURNAL_TABLE:
+        try:
+            remote_entries = await run_blocking("supabase", _load_journal_entries, run_id)
+        except Exception as e:
+            logger.warning("⚠️ Cannot load run journal from %s: %s", RUN_JOURNAL_TABLE, e)
+    run_journal.begin(run_id, remote_entries)
+    
+    logger.info("🚀 Starting technical analysis for %s symbols", total)
+    logger.info("📅 Analysis time: %s", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    logger.info("🆔 Run ID: %s", run_id)
+    logger.info("⚙️ Concurrency: %s symbols in flight", MAX_CONCURRENCY)
+    
+    # ตัวแปรสำหรับสถิติ
+    stats = _new_stats()
+    
+    # หุ้นที่ทำครบทุกขั้นตอนแล้ว → นับสถิติจาก journal ไม่ต้องดึงข้อมูลใหม่
+    pending = []
+    for stock_data in stocks:
+        if run_journal.is_complete(stock_data['symbol']):
+            _count_prediction(stats, **run_journal.stages(stock_data['symbol'])["prediction"])
+            stats['resumed'] += 1
         else:
-            # ใช้เวอร์ชันเดิม
-            recommendation, reason, price_target = generate_recommendation(
-                overall_score=overall_score,
-                price=data.get('price'),
-                upside_pct=upside_pct
-            )
-            confidence = None
-            time_horizon = None
-        
-        # ============================================
-        # STEP 6: บันทึก AI Prediction (พร้อมฟิลด์ใหม่)
-        # ============================================
-        prediction_payload = {
-            "symbol": symbol,
-            "ai_model": "rule_based_v2" if 'calculate_overall_score_with_risk' in globals() else "rule_based_v1",
-            "overall_score": overall_score,
-            "recommendation": recommendation,
-            "price_at_prediction": data.get('price'),
+            pending.append(stock_data)
+    stocks = pending
+    if stats['resumed']:
+        logger.info("⏭️ Resuming run %s: %s/%s symbols already done", run_id, stats['resumed'], total)
+    
+    # seed ดัชนีข่าวที่เคยบันทึกจาก stock_news ถ้ายังไม่มีในเครื่อง
+    if seen_news.needs_seed():
+        try:
+            seen_news.add_many(await run_blocking("supabase", _load_recent_news_urls))
+            logger.info("📚 Seeded seen-news index with %s articles from stock_news", len(seen_news))
+        except Exception as e:
+            logger.warning("⚠️ Cannot seed seen-news index: %s", e)
+    
+    # ดึงราคาย้อนหลังของทุกหุ้นในไม่กี่ request (เฉพาะแท่งใหม่ที่ยังไม่มีใน cache)
+    histories = await fetch_price_history_bulk([stock_data['symbol'] for stock_data in stocks])
+    
+    # หุ้นที่ yfinance ไม่มีข้อมูล → รวมไปถาม Twelve Data ทีละหลายตัว (แทนการ fallback ทีละหุ้น)
+    missing = [stock_data['symbol'] for stock_data in stocks if stock_data['symbol'] not in histories]
+    histories.update(await fetch_twelve_data_bulk(missing))
+    
+    # คำนวณ indicator ของทุกหุ้นพร้อมกันบนเมทริกซ์เดียว (หรือกระจายไปหลาย process)
+    precomputed = {}
+    if CPU_WORKERS > 0:
+        with metrics.stage("indicators_universe"):
+            precomputed = await compute_indicators_parallel(histories, INDICATOR_ENGINE, CPU_WORKERS)
+        logger.info("🧮 %s indicators for %s symbols on %s processes", INDICATOR_ENGINE.capitalize(), len(precomputed), CPU_WORKERS)
+    elif INDICATOR_ENGINE == "vectorized":
+        with metrics.stage("indicators_universe"):
+            precomputed = compute_universe_indicators(histories)
+        logger.info("🧮 Vectorized indicators for %s symbols", len(precomputed))
+    
+    # จำกัดจำนวนหุ้นที่ทำงานพร้อมกัน (แทนการ sleep หลังแต่ละตัว)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    ordered_log = OrderedLog()
+    
+    async def worker(idx, stock_data):
+        buffer = ordered_log.start(stock_data['symbol'])
+        try:
+            with metrics.stage("symbol", symbol=stock_data['symbol']):
+                await process_symbol(
+                    idx, len(stocks), stock_data, stats, semaphore,
+                    history=histories.pop(stock_data['symbol'], None),
+                    precomputed=precomputed.get(stock_data['symbol'])
+                )
+        except Exception as e:
+            logger.error("❌ Unexpected error for %s: %s", stock_data.get('symbol'), e)
+            stats['failed'] += 1
+        finally:
+            market_data.release(stock_data['symbol'])
+            ordered_log.complete(idx, buffer)
+    
+    write_buffer.start()
+    try:
+        await asyncio.gather(*(worker(idx, stock_data) for idx, stock_data in enumerate(stocks, 1)))
+    finally:
+        await write_buffer.close()
+        fundamentals_cache.save()
+        seen_news.save()
+        translation_cache.close()
+        http.close()
+    
+    write_buffer.report()
+    if stats['failed'] == 0:
+        run_journal.finish()
+    
+    _print_summary(stats, total, "Technical data collection completed!")
+    metrics.print_summary()
+    try:
+        if metrics.save(RUN_REPORT_PATH, run_id=run_id, shard="%s/%s" % shard if shard else None,
+                        assigned=shard_symbols if shard else None,
+                        total=total, stats=stats):
+            logger.info("📝 Run report saved to %s", RUN_REPORT_PATH)
+    except OSError as e:
+        logger.warning("⚠️ Cannot write run report: %s", e)
+
+
+# ============================================
+# Rescore: คำนวณคะแนนใหม่จาก snapshot ที่บันทึกไว้ (ไม่เรียก API ภายนอก)
+# ============================================
+def _load_latest_snapshots(symbols):
+    """ดึง snapshot ล่าสุดของแต่ละหุ้นจาก stock_snapshots (ภายใน SNAPSHOT_LOOKBACK_DAYS วัน)"""
+    cutoff = (datetime.now() - timedelta(days=SNAPSHOT_LOOKBACK_DAYS)).isoformat()
+    page_size = 1000
+    rows = []
+    
+    for start in range(0, len(symbols), BULK_DOWNLOAD_CHUNK):
+        chunk = symbols[start:start + BULK_DOWNLOAD_CHUNK]
+        offset = 0
+        while True:
+            res = supabase.table("stock_snapshots")\
+                .select("*")\
+                .in_("symbol", chunk)\
+                .gte("recorded_at", cutoff)\
+                .order("recorded_at", desc=True)\
+                .range(offset, offset + page_size - 1)\
+                .execute()
+            page = res.data or []
+            rows.extend(page)
+            offset += len(page)
+            if len(page) < page_size:
+                break
+    
+    return pd.DataFrame(rows)
+
+
+def _read_snapshot_file(path):
+    """อ่าน snapshot จากไฟล์ในเครื่อง (.parquet / .csv / .json) แทน Supabase"""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    return pd.read_json(path)
+
+
+def _prediction_rows(scored, model_tag):
+    """แปลงผลจาก score_universe() เป็นแถวของ ai_predictions (ฟิลด์เดียวกับ process_symbol)"""
+    rows = []
+    for record in scored.to_dict("records"):
+        price = record.get("price")
+        payload = {
+            "symbol": record["symbol"],
+            "ai_model": model_tag,
+            "overall_score": int(record["overall_score"]),
+            "recommendation": record["recommendation"],
+            "price_at_prediction": None if pd.isna(price) else float(price),
             "actual_outcome": None
         }
         
-        # 🆕 เพิ่มฟิลด์ใหม่ (ตอนนี้ใช้ได้แล้ว!)
-        if risk_score > 0:
-            prediction_payload["risk_score"] = risk_score
+        if record["risk_score"] > 0:
+            payload["risk_score"] = int(record["risk_score"])
         
-        if confidence:
-            prediction_payload["confidence"] = confidence
+        if record["confidence"]:
+            payload["confidence"] = record["confidence"]
         
-        if price_target:
-            prediction_payload["price_target"] = price_target
+        if record["price_target"]:
+            payload["price_target"] = record["price_target"]
         
-        if time_horizon:
-            prediction_payload["time_horizon"] = time_horizon
+        if record["time_horizon"]:
+            payload["time_horizon"] = record["time_horizon"]
         
+        rows.append(payload)
+    return rows
+
+
+async def rescore(model_tag, snapshot_path=None, dry_run=False):
+    """
+    คำนวณ AI Prediction ใหม่ของทุกหุ้นจาก snapshot ล่าสุด แล้วบันทึกภายใต้ ai_model ใหม่
+    
+    ใช้ทดลองปรับกฎ/น้ำหนักคะแนน: อ่าน snapshot ทั้งหมดในไม่กี่ query → score_universe()
+    → เขียน ai_predictions ใน batch (ไม่ดึงข้อมูลจาก yfinance / Finnhub / Twelve Data)
+    """
+    res = await run_blocking(
+        "supabase",
+        lambda: supabase.table("stock_master").select("symbol, category").eq("is_active", True).execute()
+    )
+    stocks = pd.DataFrame(res.data or [], columns=["symbol", "category"])
+    
+    if stocks.empty:
+        logger.info("📭 No active symbols found in stock_master.")
+        return
+    
+    logger.info("🔁 Rescoring %s symbols as '%s'", len(stocks), model_tag)
+    
+    if snapshot_path:
+        snapshots = _read_snapshot_file(snapshot_path)
+        logger.info("📂 Loaded %s snapshots from %s", len(snapshots), snapshot_path)
+    else:
+        snapshots = await run_blocking("supabase", _load_latest_snapshots, stocks["symbol"].tolist())
+        logger.info("📥 Loaded %s snapshots from stock_snapshots (last %s days)", len(snapshots), SNAPSHOT_LOOKBACK_DAYS)
+    
+    stats = _new_stats()
+    
+    if snapshots.empty:
+        stats['failed'] = len(stocks)
+        _print_summary(stats, len(stocks), "Rescore completed!")
+        return
+    
+    # snapshot ล่าสุดต่อหุ้น + category จาก stock_master
+    latest = snapshots.sort_values("recorded_at", ascending=False).drop_duplicates("symbol")
+    frame = stocks.merge(latest.drop(columns=["category"], errors="ignore"), on="symbol", how="inner")
+    frame["category"] = frame["category"].fillna('Core')
+    frame["news_sentiment"] = frame.get("sentiment_score")
+    stats['failed'] = len(stocks) - len(frame)
+    
+    scored = score_universe(frame)
+    rows = _prediction_rows(scored, model_tag)
+    
+    if dry_run:
+        logger.info("🧪 Dry run: predictions are not saved")
+        results = [True] * len(rows)
+    else:
+        write_buffer.start()
         try:
-            supabase.table("ai_predictions").insert(prediction_payload).execute()
-            
-            # แสดงผลแบบละเอียด
-            print(f"✅ AI Prediction saved: {symbol}")
-            print(f"   📊 Score: {overall_score}/100 | {recommendation}")
-            
-            if risk_score > 0:
-                risk_level = 'High' if risk_score >= 60 else 'Medium' if risk_score >= 30 else 'Low'
-                print(f"   💎 Risk: {risk_score}/100 ({risk_level})")
-            
-            if confidence:
-                print(f"   🎯 Confidence: {confidence}")
-                
-                # นับสถิติ confidence
-                if confidence == 'High':
-                    stats['high_confidence'] += 1
-                elif confidence == 'Medium':
-                    stats['medium_confidence'] += 1
-                elif confidence == 'Low':
-                    stats['low_confidence'] += 1
-            
-            print(f"   📝 Reason: {reason}")
-            
-            if price_target:
-                upside_to_target = ((price_target - data.get('price')) / data.get('price')) * 100
-                print(f"   🎯 Target: ${price_target:.2f} (+{upside_to_target:.1f}%)")
-            
-            if time_horizon:
-                print(f"   ⏰ Horizon: {time_horizon}")
-            
-            # อัพเดตสถิติ
-            stats['success'] += 1
-            if recommendation == 'Strong Buy':
-                stats['strong_buy'] += 1
-            elif recommendation == 'Buy':
-                stats['buy'] += 1
-            elif recommendation == 'Hold':
-                stats['hold'] += 1
-            elif recommendation in ['Sell', 'Strong Sell']:
-                stats['sell'] += 1
-                
-        except Exception as pred_error:
-            print(f"⚠️ Failed to save prediction for {symbol}: {pred_error}")
+            results = await write_buffer.write_many("ai_predictions", rows)
+        finally:
+            await write_buffer.close()
+        write_buffer.report()
+    
+    for row, result in zip(rows, results):
+        if isinstance(result, Exception):
+            logger.warning("⚠️ Failed to save prediction for %s: %s", row['symbol'], result)
             stats['failed'] += 1
+            continue
         
-        # หน่วงเวลาก่อนประมวลผลหุ้นถัดไป
-        await asyncio.sleep(3)
+        _count_prediction(stats, row['recommendation'], row.get('confidence'))
     
-    # ============================================
-    # สรุปผลการทำงาน
-    # ============================================
-    print(f"\n{'='*60}")
-    print("✅ Technical data collection completed!")
-    print(f"{'='*60}")
-    print(f"\n📊 Summary Statistics:")
-    print(f"   Total Processed: {len(stocks)}")
-    print(f"   ✅ Success: {stats['success']}")
-    print(f"   ❌ Failed: {stats['failed']}")
-    
-    print(f"\n📈 Recommendations Breakdown:")
-    print(f"   🟢 Strong Buy: {stats['strong_buy']}")
-    print(f"   🟢 Buy: {stats['buy']}")
-    print(f"   🟡 Hold: {stats['hold']}")
-    print(f"   🔴 Sell: {stats['sell']}")
+    _print_summary(stats, len(stocks), "Rescore completed!")
+
+
+# ============================================
+# Backfill actual_outcome ของ prediction ที่ครบกำหนดแล้ว
+# ============================================
+def _load_matured_predictions():
+    """ai_predictions ที่เก่ากว่า OUTCOME_HORIZON_DAYS และยังไม่มี actual_outcome (list ของแถวตามที่ Supabase คืนมา)"""
+    cutoff = (datetime.now() - timedelta(days=OUTCOME_HORIZON_DAYS)).isoformat()
+    page_size = 1000
+    rows = []
+    
+    while True:
+        res = supabase.table("ai_predictions")\
+            .select("*")\
+            .is_("actual_outcome", "null")\
+            .lte("created_at", cutoff)\
+            .order("id")\
+            .range(len(rows), len(rows) + page_size - 1)\
+            .execute()
+        page = res.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+def _load_snapshot_prices(symbols, since):
+    """ราคาจาก stock_snapshots ของหลายหุ้นตั้งแต่ since ถึงปัจจุบัน (symbol, recorded_at, price)"""
+    page_size = 1000
+    rows = []
+    
+    for start in range(0, len(symbols), BULK_DOWNLOAD_CHUNK):
+        chunk = symbols[start:start + BULK_DOWNLOAD_CHUNK]
+        offset = 0
+        while True:
+            res = supabase.table("stock_snapshots")\
+                .select("symbol, recorded_at, price")\
+                .in_("symbol", chunk)\
+                .gte("recorded_at", since)\
+                .order("recorded_at")\
+                .range(offset, offset + page_size - 1)\
+                .execute()
+            page = res.data or []
+            rows.extend(page)
+            offset += len(page)
+            if len(page) < page_size:
+                break
     
-    # แสดงสถิติ Confidence
-    if stats['high_confidence'] + stats['medium_confidence'] + stats['low_confidence'] > 0:
-        print(f"\n🎯 Confidence Distribution:")
-        print(f"   🔥 High Confidence: {stats['high_confidence']}")
-        print(f"   📊 Medium Confidence: {stats['medium_confidence']}")
-        print(f"   ⚠️ Low Confidence: {stats['low_confidence']}")
+    return pd.DataFrame(rows, columns=["symbol", "recorded_at", "price"])
+
+
+def _load_bar_prices(symbols):
+    """ราคาปิดจาก bar store ในเครื่อง (ไม่ต้อง query Supabase)"""
+    frames = []
+    for symbol in symbols:
+        bars = load_bars(symbol)
+        if bars is None or bars.empty:
+            continue
+        frames.append(pd.DataFrame({
+            "symbol": symbol,
+            "recorded_at": bars.index,
+            "price": bars["Close"].to_numpy(),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["symbol", "recorded_at", "price"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def _as_utc(values):
+    """แปลงเวลาเป็น UTC แบบไม่มี timezone (เวลาที่ไม่มี timezone ถือว่าเป็น UTC)"""
+    return pd.to_datetime(values, utc=True, format="mixed").dt.tz_localize(None)
+
+
+def compute_actual_outcomes(predictions, prices):
+    """
+    actual_outcome ของหลาย prediction พร้อมกัน (สูตรเดียวกับ calculate_actual_outcome)
     
-    # คำนวณ success rate
-    if len(stocks) > 0:
-        success_rate = (stats['success'] / len(stocks)) * 100
-        print(f"\n✨ Success Rate: {success_rate:.1f}%")
+    ราคาตอนทำนาย = ราคาล่าสุดที่ ≤ created_at (as-of join), ราคาปัจจุบัน = ราคาล่าสุดของหุ้นนั้น
+    Returns: Series ของ % เปลี่ยนแปลง (None ถ้าไม่มีราคา) ตาม index ของ predictions
+    """
+    outcomes = pd.Series(None, index=predictions.index, dtype=object)
+    prices = prices.dropna(subset=["price"])
+    if predictions.empty or prices.empty:
+        return outcomes
+    
+    prices = prices.assign(recorded_at=_as_utc(prices["recorded_at"])).sort_values("recorded_at")
+    left = pd.DataFrame({
+        "row": predictions.index,
+        "symbol": predictions["symbol"].to_numpy(),
+        "predicted_at": _as_utc(predictions["created_at"]).to_numpy(),
+    }).sort_values("predicted_at")
+    
+    joined = pd.merge_asof(
+        left, prices.rename(columns={"price": "prediction_price"}),
+        left_on="predicted_at", right_on="recorded_at", by="symbol", direction="backward"
+    )
+    current = prices.groupby("symbol")["price"].last()
+    joined["current_price"] = joined["symbol"].map(current)
+    
+    valid = joined["prediction_price"].notna() & (joined["prediction_price"] != 0) & joined["current_price"].notna()
+    change = (joined["current_price"] - joined["prediction_price"]) / joined["prediction_price"] * 100
     
-    print(f"\n⏰ Completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"{'='*60}\n")
+    # round() ของ Python ทีละตัว เพื่อให้ได้ค่าเดียวกับ calculate_actual_outcome
+    for row, value in zip(joined.loc[valid, "row"], change[valid]):
+        outcomes[row] = round(float(value), 2)
+    return outcomes
+
+
+def _write_outcomes(rows):
+    """
+    เขียน actual_outcome กลับแบบ batch (upsert โดยใช้ id)
+    
+    rows ต้องเป็นแถวเดิมจาก Supabase (ค่าและชนิดข้อมูลเดิม) ที่เปลี่ยนแค่ actual_outcome
+    ส่งแค่ id + actual_outcome ไม่ได้: INSERT ของ upsert ตรวจ NOT NULL ของคอลัมน์อื่นก่อนเจอ conflict
+    """
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        supabase.table("ai_predictions").upsert(rows[start:start + WRITE_BATCH_SIZE], on_conflict="id").execute()
+
+
+async def backfill_outcomes(source="snapshots", dry_run=False):
+    """
+    คำนวณ actual_outcome ของทุก prediction ที่ครบ OUTCOME_HORIZON_DAYS วันในครั้งเดียว
+    
+    ใช้ query ไม่กี่ครั้ง (prediction ทั้งหมด + ราคาของทุกหุ้นที่เกี่ยวข้อง) แทน 2 query ต่อ prediction
+    source: "snapshots" (stock_snapshots) หรือ "bars" (ราคาปิดจาก bar store ในเครื่อง)
+    """
+    records = await run_blocking("supabase", _load_matured_predictions)
+    logger.info("🧾 Matured predictions without outcome: %s", len(records))
+    
+    if not records:
+        return
+    predictions = pd.DataFrame(records)
+    
+    symbols = sorted(predictions["symbol"].dropna().unique())
+    if source == "bars":
+        prices = _load_bar_prices(symbols)
+    else:
+        since = (_as_utc(predictions["created_at"]).min() - timedelta(days=SNAPSHOT_LOOKBACK_DAYS)).isoformat()
+        prices = await run_blocking("supabase", _load_snapshot_prices, symbols, since)
+    logger.info("📥 Loaded %s prices for %s symbols from %s", len(prices), len(symbols), source)
+    
+    outcomes = compute_actual_outcomes(predictions, prices)
+    resolved = outcomes.notna()
+    
+    # payload จาก dict เดิมของ Supabase ไม่ใช่จาก DataFrame (คอลัมน์ integer ที่มี null จะกลายเป็น float เช่น 45.0)
+    rows = [{**records[row], "actual_outcome": outcome} for row, outcome in outcomes[resolved].items()]
+    
+    if dry_run:
+        logger.info("🧪 Dry run: outcomes are not saved")
+    elif rows:
+        await run_blocking("supabase", _write_outcomes, rows)
+    
+    logger.info("✅ Resolved %s/%s predictions (%s without prices)", len(rows), len(predictions), len(predictions) - len(rows))
+
+
+def merge_shard_reports(paths):
+    """
+    รวม run report ของทุก shard เป็นสรุปเดียว แล้วบันทึกที่ RUN_REPORT_PATH (ใช้เป็น SHARD_WEIGHTS_PATH รอบหน้าได้)
+    
+    หุ้นของ shard ที่ไม่มีรายงาน (ล้ม) ใช้ assignment เดิมจาก SHARD_WEIGHTS_PATH ต่อ → รอบหน้ายังอยู่ shard เดิม
+    """
+    merged = merge_reports(paths)
+    previous = load_assignment(count=merged["shard_count"]) if merged["shard_count"] else {}
+    merged["assignment"] = {**previous, **merged["assignment"]}
+    stats = {**_new_stats(), **merged["stats"]}
+    _print_summary(stats, merged["total"], f"Sharded run completed ({len(paths)} shards)")
+    logger.info("⏱️ Slowest shard wall time: %.1fs", merged["wall_seconds"])
+    
+    if RUN_REPORT_PATH:
+        os.makedirs(os.path.dirname(RUN_REPORT_PATH) or ".", exist_ok=True)
+        with open(RUN_REPORT_PATH, "w") as f:
+            json.dump(merged, f, indent=2)
+        logger.info("📝 Merged report saved to %s", RUN_REPORT_PATH)
+    return merged
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stock data collector + rule-based AI predictions")
+    parser.add_argument("--rescore", action="store_true",
+                        help="คำนวณคะแนนใหม่จาก stock_snapshots ล่าสุด (ไม่ดึงข้อมูลใหม่)")
+    parser.add_argument("--model-tag", default="rule_based_v2_rescore",
+                        help="ค่า ai_model ของ prediction ที่ได้จาก --rescore")
+    parser.add_argument("--snapshots", metavar="FILE",
+                        help="อ่าน snapshot จากไฟล์ในเครื่อง (.parquet/.csv/.json) แทน Supabase")
+    parser.add_argument("--backfill-outcomes", action="store_true",
+                        help="คำนวณ actual_outcome ของ prediction ที่ครบกำหนดแล้ว")
+    parser.add_argument("--outcome-source", choices=["snapshots", "bars"], default="snapshots",
+                        help="แหล่งราคาของ --backfill-outcomes")
+    parser.add_argument("--run-id",
+                        help="ทำรอบนี้ต่อ (ข้ามขั้นตอนที่บันทึกเสร็จแล้วใน run journal) ค่าเริ่มต้น RUN_ID / GITHUB_RUN_ID")
+    parser.add_argument("--resume", action="store_true",
+                        help="ทำต่อจากรอบล่าสุดใน run journal ที่ยังไม่จบ")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="ทำเฉพาะหุ้นของ shard ที่ I จาก N (เช่น 2/4) สำหรับรันหลาย runner พร้อมกัน")
+    parser.add_argument("--merge-reports", nargs="+", metavar="FILE",
+                        help="รวม run report ของทุก shard เป็นสรุปเดียว")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="--rescore / --backfill-outcomes โดยไม่บันทึกลง ai_predictions")
+    parser.add_argument("--force-refresh", action="store_true",
+                        help="ดึง fundamental / analyst ใหม่ทุกหุ้นโดยไม่ใช้ TTL cache (เหมือน FORCE_REFRESH=1)")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
+    setup_logging()
+    args = parse_args()
+    if args.rescore:
+        asyncio.run(rescore(args.model_tag, args.snapshots, args.dry_run))
+    elif args.backfill_outcomes:
+        asyncio.run(backfill_outcomes(args.outcome_source, args.dry_run))
+    elif args.merge_reports:
+        merge_shard_reports(args.merge_reports)
+    else:
+        asyncio.run(main(args.run_id, args.resume, args.shard, args.force_refresh))
@@ -0,0 +1,26 @@
+"""
+ตั้งค่าร่วมของ test (รันด้วย python -m pytest จาก root ของ repo)
+
+stock_collector ต้องมี SUPABASE_URL / SUPABASE_KEY ตอน import → ใส่ค่าหลอกไว้ (test ไม่ต่อ Supabase จริง)
+cache ทุกตัวชี้ไปที่โฟลเดอร์ชั่วคราว ไม่ปนกับ .cache ของการรันจริง
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_cache_dir = tempfile.mkdtemp(prefix="stock-tests-")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.test")
+for name, path in {
+    "BAR_CACHE_DIR": "bars",
+    "INDICATOR_STATE_DIR": "indicators",
+    "SEEN_NEWS_PATH": "seen_news.bin",
+    "TTL_CACHE_PATH": "fundamentals.json",
+    "TRANSLATION_CACHE_PATH": "translations.sqlite",
+    "RUN_REPORT_PATH": "run_report.json",
+    "RUN_JOURNAL_PATH": "run_journal.jsonl",
+}.items():
+    os.environ.setdefault(name, os.path.join(_cache_dir, path))
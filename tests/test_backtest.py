@@ -0,0 +1,29 @@
+"""
+--horizon ต้องไม่ต่ำกว่า 1 (horizon 0 → forward[:-0] เป็น slice ว่าง ไม่มีสัญญาณให้นับ)
+"""
+import argparse
+
+import numpy as np
+import pytest
+
+import backtest
+
+
+@pytest.mark.parametrize("value", ["0", "-3", "x"])
+def test_positive_int_rejects_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        backtest.positive_int(value)
+
+
+@pytest.mark.parametrize("argv", [["--horizon", "0"], ["--horizon", "-1"], ["--workers", "0"]])
+def test_cli_rejects_non_positive_values(argv, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        backtest.main(argv)
+    assert exit_info.value.code == 2
+    assert "must be at least 1" in capsys.readouterr().err
+
+
+def test_backtest_closes_rejects_zero_horizon():
+    closes = np.full((1, 300), 100.0)
+    with pytest.raises(ValueError):
+        backtest.backtest_closes(closes, ["Core"], horizon=0)
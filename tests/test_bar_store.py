@@ -0,0 +1,115 @@
+"""
+split / ปันผลทำให้ yfinance (auto_adjust=True) adjust ราคาย้อนหลังใหม่ทั้งหมด
+cache ที่อยู่บนฐานราคาเดิมต้องถูกทิ้งและดึงใหม่ทั้ง period (ไม่ใช่ต่อท้ายแท่งใหม่เข้ากับแท่งเก่า)
+"""
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bar_store
+import indicator_state
+import stock_collector
+from bar_store import is_readjusted, load_bars, overlap_start, save_bars
+
+
+SPLIT_AT = 270
+DAYS = 300
+
+
+@pytest.fixture(autouse=True)
+def cache_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(bar_store, "BAR_CACHE_DIR", str(tmp_path / "bars"))
+    monkeypatch.setattr(indicator_state, "INDICATOR_STATE_DIR", str(tmp_path / "indicators"))
+
+
+def _history(split=True):
+    """ราคาที่ yfinance คืนหลัง split 10:1 ที่แท่ง SPLIT_AT (split=False = ฐานราคาก่อน split)"""
+    index = pd.date_range("2024-01-02", periods=DAYS, freq="B")
+    closes = 1000 + np.cumsum(np.random.default_rng(0).normal(0, 5, DAYS))
+    closes[SPLIT_AT:] /= 10
+    if split:
+        closes[:SPLIT_AT] /= 10
+    return pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": 1.0}, index=index)
+
+
+def _cache_before_split(symbol):
+    """cache + indicator state ที่บันทึกไว้ก่อน split (แท่งสุดท้ายเป็นแท่งระหว่างวัน)"""
+    cached = _history(split=False).iloc[:SPLIT_AT - 10].copy()
+    cached.iloc[-1, cached.columns.get_loc("Close")] *= 1.01
+    save_bars(symbol, cached)
+    indicator_state.update_indicators(symbol, cached)
+    return cached
+
+
+class FakeHistory:
+    """Ticker.history: start=... → แท่งตั้งแต่ start, period=... → ทั้งหมด"""
+    
+    def __init__(self, df):
+        self.df = df
+        self.calls = []
+    
+    def history(self, symbol, start=None, period=None):
+        self.calls.append("start" if start else "period")
+        return self.df[self.df.index >= pd.Timestamp(start)] if start else self.df
+
+
+def test_overlap_start_skips_last_bar():
+    df = _history().iloc[:10]
+    assert overlap_start(df) == df.index[-2]
+    assert overlap_start(df.iloc[:1]) == df.index[0]
+    assert overlap_start(None) is None
+
+
+def test_intraday_last_bar_is_not_a_readjustment():
+    cached = _history(split=False).iloc[:100].copy()
+    fresh = _history(split=False)
+    cached.iloc[-1, cached.columns.get_loc("Close")] *= 1.03
+    assert not is_readjusted(cached, fresh[fresh.index >= overlap_start(cached)])
+    assert is_readjusted(cached, _history()[fresh.index >= overlap_start(cached)])
+
+
+def test_incremental_fetch_refetches_after_split(monkeypatch):
+    _cache_before_split("SPLT")
+    fake = FakeHistory(_history())
+    monkeypatch.setattr(stock_collector, "market_data", fake)
+    
+    df = stock_collector._fetch_history_incremental("SPLT")
+    
+    assert fake.calls == ["start", "period"]
+    pd.testing.assert_series_equal(df["Close"], _history()["Close"], check_freq=False)
+    pd.testing.assert_series_equal(load_bars("SPLT")["Close"], _history()["Close"], check_freq=False)
+    assert indicator_state.load_state("SPLT") is None
+    assert indicator_state.update_indicators("SPLT", df)["ema_200"] < 200  # state เดิมอยู่บนฐาน ~1000
+
+
+def test_incremental_fetch_appends_without_split(monkeypatch):
+    cached = _history(split=False).iloc[:250]
+    save_bars("PLAIN", cached)
+    fake = FakeHistory(_history(split=False).iloc[:260])
+    monkeypatch.setattr(stock_collector, "market_data", fake)
+    
+    df = stock_collector._fetch_history_incremental("PLAIN")
+    
+    assert fake.calls == ["start"]
+    assert len(df) == 260
+
+
+def test_bulk_fetch_refetches_after_split(monkeypatch):
+    _cache_before_split("SPLT")
+    save_bars("PLAIN", _history().iloc[:SPLIT_AT + 10])
+    calls = []
+    
+    async def download(chunk, start=None, period=None):
+        calls.append((tuple(chunk), "start" if start else "period"))
+        full = _history()
+        return {symbol: full[full.index >= pd.Timestamp(start)] if start else full for symbol in chunk}
+    
+    monkeypatch.setattr(stock_collector, "_download_bulk", download)
+    frames = asyncio.run(stock_collector.fetch_price_history_bulk(["SPLT", "PLAIN"]))
+    
+    assert calls[-1] == (("SPLT",), "period")
+    for symbol in ("SPLT", "PLAIN"):
+        pd.testing.assert_series_equal(frames[symbol]["Close"], _history()["Close"], check_freq=False)
+    assert indicator_state.load_state("SPLT") is None
@@ -0,0 +1,82 @@
+"""batch_scoring ต้องให้ผลตรงกับฟังก์ชัน scalar ใน stock_collector ทีละแถว"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import stock_collector as sc
+from batch_scoring import CATEGORY_WEIGHTS, SCORING_COLUMNS, score_universe
+
+
+FIELDS = ["overall_score", "risk_score", "recommendation", "reason", "confidence",
+          "price_target", "time_horizon", "risk_level"]
+
+
+def _random_frame(n, seed=0):
+    """ข้อมูลสุ่มที่ครอบคลุมค่าขอบ (None, 0, ค่าบนเส้นแบ่งของแต่ละเงื่อนไข)"""
+    rng = np.random.default_rng(seed)
+    edges = {
+        "rsi": [20, 30, 70, 80], "upside_pct": [5, 10, 20], "pe_ratio": [5, 10, 25, 35, 50],
+        "peg_ratio": [1, 1.5, 2], "eps_growth_pct": [5, 10, 20], "analyst_buy_pct": [30, 50, 70],
+        "news_sentiment": [-0.2, 0.2, 0.5], "market_cap": [1e9, 1e10, 2e11],
+    }
+    scale = {"rsi": 100, "upside_pct": 60, "pe_ratio": 80, "peg_ratio": 4, "eps_growth_pct": 60,
+             "analyst_buy_pct": 100, "news_sentiment": 2, "market_cap": 5e11}
+    
+    frame = {}
+    price = rng.uniform(1, 500, n)
+    for name in SCORING_COLUMNS:
+        if name in scale:
+            values = rng.uniform(-0.25, 1, n) * scale[name]
+            pick = rng.random(n) < 0.2
+            values[pick] = rng.choice(edges[name], pick.sum())
+        elif name == "price":
+            values = price.copy()
+        else:
+            values = price * rng.uniform(0.8, 1.2, n)
+        values[rng.random(n) < 0.1] = np.nan
+        values[rng.random(n) < 0.03] = 0
+        frame[name] = values
+    frame["macd"] = rng.normal(0, 2, n)
+    frame["macd_signal"] = frame["macd"] * rng.choice([0.85, 0.9, 0.95, 1, 1.05, 1.2], n)
+    frame["category"] = rng.choice(list(CATEGORY_WEIGHTS) + ['ETF', None], n)
+    
+    # ETF ไม่มี fundamental data
+    frame = pd.DataFrame(frame)
+    frame.loc[frame["category"] == 'ETF', ["pe_ratio", "peg_ratio", "eps_growth_pct"]] = np.nan
+    return frame
+
+
+def _scalar_result(row):
+    """ผลของ calculate_overall_score_with_risk + generate_recommendation_advanced (None = scalar error)"""
+    category = row["category"]
+    fundamental = None if category == 'ETF' else {
+        k: row[k] for k in ("pe_ratio", "peg_ratio", "eps_growth_pct")
+    }
+    overall = sc.calculate_overall_score_with_risk(
+        None, row, fundamental, row["news_sentiment"], category, row["market_cap"]
+    )
+    risk = sc.calculate_risk_score(row, fundamental, row["market_cap"])
+    try:
+        expected = sc.generate_recommendation_advanced(overall, row["price"], row["upside_pct"], risk, category)
+    except TypeError:
+        return None  # price เป็น None แต่มี upside → scalar error
+    expected.update(overall_score=overall, risk_score=risk)
+    return expected
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_batch_matches_scalar(seed):
+    frame = _random_frame(5000, seed)
+    batch = score_universe(frame)
+    
+    mismatches = []
+    for i, row in enumerate(frame.to_dict("records")):
+        row = {k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in row.items()}
+        expected = _scalar_result(row)
+        if expected is None:
+            continue
+        actual = batch.iloc[i]
+        if any(expected[f] != actual[f] for f in FIELDS):
+            mismatches.append((i, {f: expected[f] for f in FIELDS}, {f: actual[f] for f in FIELDS}))
+    
+    assert not mismatches, mismatches[:5]
@@ -0,0 +1,46 @@
+"""
+worker ของ cpu_pool ต้องไม่ import script ของ process หลักซ้ำ (stock_collector.py สร้าง Supabase client ตอน import)
+"""
+import os
+import sys
+import subprocess
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# script ที่ถูก import ซ้ำใน worker จะ exit ทันที → pool เสีย (BrokenProcessPool)
+MAIN_SCRIPT = textwrap.dedent("""
+    import sys
+    if __name__ != "__main__":
+        sys.exit("worker re-imported the main script")
+    
+    import asyncio
+    import numpy as np
+    import pandas as pd
+    
+    sys.path.insert(0, {root!r})
+    from cpu_pool import compute_indicators_parallel
+    
+    index = pd.date_range("2023-01-02", periods=260, freq="B")
+    histories = {{
+        f"SYM{{i}}": pd.DataFrame({{"Close": 100 + np.cumsum(np.random.default_rng(i).normal(0, 1, 260))}}, index=index)
+        for i in range(6)
+    }}
+    engine = sys.argv[1]
+    results = asyncio.run(compute_indicators_parallel(histories, engine=engine, workers=2, chunk_size=2))
+    print(engine, len(results))
+""")
+
+
+@pytest.mark.parametrize("engine", ["incremental", "vectorized"])
+def test_workers_do_not_import_main_script(tmp_path, engine):
+    script = tmp_path / "collector_main.py"
+    script.write_text(MAIN_SCRIPT.format(root=ROOT))
+    env = dict(os.environ, INDICATOR_STATE_DIR=str(tmp_path / "indicators"))
+    
+    result = subprocess.run([sys.executable, str(script), engine], capture_output=True, text=True, timeout=120, env=env)
+    
+    assert result.returncode == 0, result.stderr
+    assert f"{engine} 6" in result.stdout.splitlines()
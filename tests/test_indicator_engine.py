@@ -0,0 +1,106 @@
+"""
+indicator_engine (เมทริกซ์ symbols × dates) ต้องให้ค่าเดียวกับ TA-Lib และ update_indicators() ที่คำนวณทีละหุ้น
+ทั้งตอนวันที่ของแต่ละหุ้นไม่ตรงกัน มีวันที่ขาดกลางทาง (ช่อง NaN ที่ถูกเลื่อนชิดซ้าย) และข้อมูลสั้นกว่า lookback
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import talib
+
+import indicator_state
+from indicator_engine import align_closes, compute_indicator_matrix, compute_universe_indicators
+from indicator_state import update_indicators
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(indicator_state, "INDICATOR_STATE_DIR", str(tmp_path))
+
+
+def _frame(start, length, seed, drop_every=None, tz=None):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=length, freq="B", tz=tz)
+    closes = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+    df = pd.DataFrame({"Close": closes}, index=index)
+    if drop_every:
+        df = df.iloc[[i for i in range(length) if i % drop_every]]  # วันหยุด / แท่งที่หาย เฉพาะหุ้นนี้
+    return df
+
+
+@pytest.fixture
+def frames():
+    return {
+        "LONG": _frame("2022-01-03", 520, 1),
+        "LATE": _frame("2023-03-01", 230, 2),               # เริ่มทีหลัง → ช่อง NaN ด้านซ้าย
+        "GAPS": _frame("2022-06-01", 400, 3, drop_every=7),  # ขาดทุก 7 แท่ง → ช่อง NaN กลางเมทริกซ์
+        "SHORT": _frame("2023-11-01", 120, 4),              # < EMA200
+        "TINY": _frame("2024-01-02", 30, 5),                # < EMA50, MACD signal ยังไม่พอ
+        "WARM": _frame("2024-01-02", 14, 6),                # < RSI
+        "ONE": _frame("2024-02-01", 1, 7),
+        "NYC": _frame("2022-09-01", 300, 8, tz="America/New_York"),
+    }
+
+
+def _talib_series(closes):
+    macd, macd_signal, _ = talib.MACD(closes, fastperiod=12, slowperiod=26, signalperiod=9)
+    bb_upper, _, bb_lower = talib.BBANDS(closes, timeperiod=20, nbdevup=2, nbdevdn=2)
+    return {
+        "price": closes,
+        "rsi": talib.RSI(closes, timeperiod=14),
+        "macd": macd,
+        "macd_signal": macd_signal,
+        "ema_20": talib.EMA(closes, timeperiod=20),
+        "ema_50": talib.EMA(closes, timeperiod=50),
+        "ema_200": talib.EMA(closes, timeperiod=200),
+        "bb_upper": bb_upper,
+        "bb_lower": bb_lower,
+    }
+
+
+def _assert_close(actual, expected, context):
+    if expected is None or expected != expected:
+        assert actual is None or actual != actual, context
+    else:
+        assert actual == pytest.approx(expected, rel=1e-8, abs=1e-8), context
+
+
+def test_latest_values_match_talib(frames):
+    results = compute_universe_indicators(frames)
+    assert set(results) == set(frames)
+    
+    for symbol, df in frames.items():
+        expected = _talib_series(df["Close"].to_numpy(dtype=float))
+        for name, series in expected.items():
+            _assert_close(results[symbol][name], series[-1], (symbol, name))
+
+
+def test_latest_values_match_incremental_state(frames):
+    results = compute_universe_indicators(frames)
+    for symbol, df in frames.items():
+        incremental = update_indicators(symbol, df)
+        for name, value in incremental.items():
+            _assert_close(results[symbol][name], value, (symbol, name))
+
+
+def test_full_matrix_matches_talib_on_each_symbols_dates(frames):
+    symbols, dates, closes = align_closes(frames)
+    matrix = compute_indicator_matrix(closes)
+    
+    for row, symbol in enumerate(symbols):
+        index = frames[symbol].index
+        days = (index.tz_localize(None) if index.tz is not None else index).normalize()
+        columns = dates.get_indexer(days)
+        assert (columns >= 0).all()
+        
+        # วันที่หุ้นนี้ไม่มีข้อมูลต้องเป็น NaN
+        missing = np.setdiff1d(np.arange(len(dates)), columns)
+        assert np.isnan(matrix["price"][row, missing]).all()
+        
+        for name, series in _talib_series(frames[symbol]["Close"].to_numpy(dtype=float)).items():
+            np.testing.assert_allclose(matrix[name][row, columns], series, rtol=1e-8, atol=1e-8,
+                                       equal_nan=True, err_msg=f"{symbol} {name}")
+
+
+def test_empty_and_missing_frames_are_skipped():
+    assert compute_universe_indicators({}) == {}
+    assert compute_universe_indicators({"NONE": None, "EMPTY": pd.DataFrame({"Close": []})}) == {}
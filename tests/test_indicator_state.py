@@ -0,0 +1,98 @@
+"""
+IndicatorState ต้องให้ค่าเดียวกับ TA-Lib ที่คำนวณจากข้อมูลทั้งหมด
+ทั้งตอนสร้าง state ใหม่ (ข้อมูลหลายความยาว รวมช่วง warm-up) และตอนรันต่อจาก state ที่บันทึกไว้ข้ามรอบ
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import talib
+
+import indicator_state
+from indicator_state import update_indicators
+
+
+LENGTHS = [1, 2, 14, 15, 20, 26, 33, 34, 50, 199, 200, 201, 500]
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(indicator_state, "INDICATOR_STATE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _price_frame(length, seed=0):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+    index = pd.date_range("2023-01-02", periods=length, freq="B")
+    return pd.DataFrame({"Close": closes}, index=index)
+
+
+def _talib_values(df):
+    """ค่าแท่งสุดท้ายแบบ calculate_technical_indicators() (ยังไม่พอ = None)"""
+    close = df['Close'].values.astype(float)
+    macd, macd_signal, _ = talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
+    bb_upper, _, bb_lower = talib.BBANDS(close, timeperiod=20, nbdevup=2, nbdevdn=2)
+    values = {
+        "price": close[-1],
+        "rsi": talib.RSI(close, timeperiod=14)[-1],
+        "macd": macd[-1],
+        "macd_signal": macd_signal[-1],
+        "ema_20": talib.EMA(close, timeperiod=20)[-1],
+        "ema_50": talib.EMA(close, timeperiod=50)[-1],
+        "ema_200": talib.EMA(close, timeperiod=200)[-1],
+        "bb_upper": bb_upper[-1],
+        "bb_lower": bb_lower[-1],
+    }
+    return {key: None if np.isnan(value) else float(value) for key, value in values.items()}
+
+
+def _assert_matches(actual, df):
+    expected = _talib_values(df)
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if value is None:
+            assert actual[key] is None, key
+        else:
+            assert actual[key] == pytest.approx(value, rel=1e-9, abs=1e-9), key
+
+
+@pytest.mark.parametrize("length", LENGTHS)
+def test_fresh_state_matches_talib(length):
+    df = _price_frame(length, seed=length)
+    _assert_matches(update_indicators("AAPL", df), df)
+
+
+@pytest.mark.parametrize("steps", [[1, 5, 30, 199, 201, 260], [40, 41, 42, 300], [250, 251, 251, 400]])
+def test_resume_across_runs_matches_talib(steps, monkeypatch):
+    df = _price_frame(max(steps), seed=len(steps))
+    for end in steps[:-1]:
+        window = df.iloc[:end]
+        _assert_matches(update_indicators("MSFT", window), window)
+    
+    # รอบสุดท้ายต้องต่อจาก state ในไฟล์: อัพเดตเฉพาะแท่งที่ยังไม่เคยบันทึก (+ แท่งล่าสุดจากสำเนา)
+    updates = []
+    original_update = indicator_state.IndicatorState.update
+    monkeypatch.setattr(indicator_state.IndicatorState, "update",
+                        lambda self, close, date=None: updates.append(date) or original_update(self, close, date))
+    
+    _assert_matches(update_indicators("MSFT", df), df)
+    assert len(updates) == len(df) - (steps[-2] - 1)
+    assert indicator_state.load_state("MSFT").count == len(df) - 1
+
+
+def test_intraday_bar_is_not_saved():
+    df = _price_frame(260)
+    live = df.copy()
+    live.iloc[-1, 0] *= 1.05  # แท่งระหว่างวันที่ราคายังเปลี่ยน
+    
+    _assert_matches(update_indicators("NVDA", live), live)
+    _assert_matches(update_indicators("NVDA", df), df)
+
+
+def test_adjusted_history_rebuilds_state():
+    df = _price_frame(300)
+    update_indicators("TSLA", df.iloc[:250])
+    
+    adjusted = df.copy()
+    adjusted['Close'] /= 2  # split → ราคาย้อนหลังเปลี่ยนทั้งหมด
+    _assert_matches(update_indicators("TSLA", adjusted), adjusted)
@@ -0,0 +1,58 @@
+"""
+KeywordMatcher: ขอบเขตคำ, รูปผันของคำ, วลีที่ยาวที่สุดก่อน และนับคำละครั้ง
+"""
+import pytest
+
+from sentiment_lexicon import KeywordMatcher, headline_lexicon, news_lexicon
+
+
+@pytest.mark.parametrize("text", [
+    "Highlight of the day",
+    "A lowly price",
+    "Top-down review of thighs",
+    "Bearings maker",
+])
+def test_keyword_inside_word_is_not_counted(text):
+    assert headline_lexicon.count(text) == (0, 0)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Shares hit a new high", (1, 0)),
+    ("HIGH. low!", (1, 1)),
+    ("record-low close", (1, 1)),  # "-" เป็นขอบเขตคำ: record-low ไม่มีใน headline → record + low
+])
+def test_keyword_at_word_boundary_is_counted(text, expected):
+    assert headline_lexicon.count(text) == expected
+
+
+@pytest.mark.parametrize("text, keyword", [
+    ("Stock surges", "surge"),
+    ("Stock surged", "surge"),
+    ("Stock surging", "surge"),
+    ("Shares dropped", "drop"),
+    ("Analyst upgrades", "upgrade"),
+    ("Rallies continue", "rally"),
+    ("Losses widen", "loss"),
+])
+def test_inflections_map_to_keyword(text, keyword):
+    assert {word for word, _ in headline_lexicon.matches(text)} == {keyword}
+
+
+def test_longest_phrase_wins_at_word_start():
+    assert news_lexicon.matches("NVDA raised outlook") == {("raised outlook", 1)}
+    assert news_lexicon.matches("NVDA raised prices") == {("raised", 1)}
+    assert news_lexicon.matches("profit taking") == {("profit taking", -1)}
+    # วลีที่ยาวกว่าไม่บังคำที่ขึ้นต้นคำใหม่ภายในวลี
+    assert news_lexicon.matches("record-low close") == {("record-low", -1), ("low", -1)}
+
+
+def test_repeated_keyword_is_counted_once():
+    assert headline_lexicon.count("surge surges SURGE surged") == (1, 0)
+    assert news_lexicon.count("bullish") == (1, 0)  # อยู่ในรายการคำบวกสองครั้ง
+    assert news_lexicon.count("cut") == (0, 1)      # อยู่ในรายการคำลบสองครั้ง
+
+
+def test_duplicate_keywords_in_lists_are_counted_once():
+    matcher = KeywordMatcher(["gain", "gain", "Gain"], ["loss", "loss"])
+    assert matcher.count("gain gains loss") == (1, 1)
+    assert matcher.count("") == (0, 0)
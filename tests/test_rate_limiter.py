@@ -0,0 +1,107 @@
+"""
+circuit breaker นับเฉพาะ error ของ provider (connection, timeout, 5xx) ไม่นับ error ของหุ้นตัวเดียว
+และ request ที่ดึงหลายหุ้นในครั้งเดียวต้องใช้ token ตามจำนวนหุ้น
+"""
+import asyncio
+
+import pandas as pd
+import pytest
+import requests
+
+import rate_limiter
+import stock_collector
+from rate_limiter import CircuitBreaker, ProviderUnavailable, TokenBucket, is_provider_error, run_blocking
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("yfinance", threshold=3, cooldown=60)
+    monkeypatch.setitem(rate_limiter.circuit_breakers, "yfinance", breaker)
+    monkeypatch.setitem(rate_limiter.rate_limiters, "yfinance", TokenBucket(0))
+    return breaker
+
+
+def _fail(error):
+    def func(symbol):
+        raise error
+    return func
+
+
+def _call(func, symbol="AAPL"):
+    try:
+        return asyncio.run(run_blocking("yfinance", func, symbol))
+    except ProviderUnavailable:
+        raise
+    except Exception as error:
+        return error
+
+
+@pytest.mark.parametrize("error, expected", [
+    (requests.ConnectionError("connection reset"), True),
+    (TimeoutError("timed out"), True),
+    (HTTPError(503), True),
+    (HTTPError(429), True),
+    (HTTPError(404), False),
+    (KeyError("regularMarketPrice"), False),
+    (ValueError("AAPLX: possibly delisted; no price data found"), False),
+])
+def test_is_provider_error(error, expected):
+    assert is_provider_error(error) is expected
+
+
+def test_symbol_errors_do_not_open_circuit(breaker):
+    for _ in range(10):
+        _call(_fail(ValueError("possibly delisted")))
+    
+    assert breaker.failures == 0
+    assert breaker.opened_at is None
+
+
+def test_provider_errors_open_circuit(breaker):
+    for _ in range(3):
+        _call(_fail(requests.ConnectionError("connection refused")))
+    
+    assert breaker.opened_at is not None
+    with pytest.raises(ProviderUnavailable):
+        _call(lambda symbol: symbol)
+
+
+def test_symbol_error_resets_consecutive_provider_failures(breaker):
+    for error in [HTTPError(502), HTTPError(502), HTTPError(404), HTTPError(502), HTTPError(502)]:
+        _call(_fail(error))
+    
+    assert breaker.failures == 2
+    assert breaker.opened_at is None
+
+
+class RecordingBucket(TokenBucket):
+    def __init__(self):
+        super().__init__(0)
+        self.acquired = []
+    
+    async def acquire(self, tokens=1):
+        self.acquired.append(tokens)
+        return 0.0
+
+
+def test_bulk_download_is_charged_per_symbol(breaker, monkeypatch):
+    bucket = RecordingBucket()
+    monkeypatch.setitem(rate_limiter.rate_limiters, "yfinance", bucket)
+    monkeypatch.setattr(stock_collector.yf, "download", lambda chunk, **kwargs: pd.DataFrame())
+    
+    asyncio.run(stock_collector._download_bulk(["AAPL", "MSFT", "NVDA"], period="5d"))
+    
+    assert bucket.acquired == [3]
+
+
+def test_first_twelve_data_batch_does_not_wait():
+    bucket = TokenBucket(rate_limiter.PROVIDER_RATE_LIMITS["twelvedata"], rate_limiter.PROVIDER_BURSTS["twelvedata"])
+    
+    assert rate_limiter.PROVIDER_BURSTS["twelvedata"] >= stock_collector.TWELVE_DATA_BATCH
+    assert asyncio.run(bucket.acquire(stock_collector.TWELVE_DATA_BATCH)) == 0.0
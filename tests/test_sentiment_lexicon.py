@@ -0,0 +1,117 @@
+"""
+NegationScorer ต้องให้คะแนนตรงกับ calculate_news_sentiment_advanced() แบบเดิม (ก่อนเปลี่ยนเป็น sliding window)
+
+- fixtures/sentiment_corpus.jsonl: หัวข้อข่าว + กรณีขอบของคำปฏิเสธ พร้อมคะแนนจากตัวเดิม
+- fuzz: ข้อความสุ่มจากคำใน lexicon + คำปฏิเสธ + คำที่มีคำปฏิเสธซ่อนอยู่ (เช่น "notable", "know")
+"""
+import os
+import json
+import random
+
+import pytest
+
+from sentiment_lexicon import NegationScorer, news_scorer
+
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "sentiment_corpus.jsonl")
+
+
+def legacy_score(headline, summary=''):
+    """calculate_news_sentiment_advanced() ก่อน NegationScorer (คัดลอกมาไว้เป็นตัวอ้างอิง)"""
+    text = f"{headline} {summary}".lower()
+    
+    negation_words = ['not', 'no', 'never', 'neither', 'nobody', 'nothing',
+                      'fails to', 'unable to', 'without']
+    strong_positive = {
+        'surge': 2, 'soar': 2, 'skyrocket': 2, 'breakout': 2,
+        'beat': 1.5, 'exceed': 1.5, 'strong': 1.5, 'rally': 1.5
+    }
+    strong_negative = {
+        'plunge': -2, 'crash': -2, 'collapse': -2, 'tank': -2,
+        'miss': -1.5, 'disappoint': -1.5, 'weak': -1.5, 'slump': -1.5
+    }
+    moderate_positive = {
+        'gain': 1, 'rise': 1, 'growth': 1, 'increase': 1,
+        'upgrade': 1, 'positive': 1, 'bullish': 1
+    }
+    moderate_negative = {
+        'fall': -1, 'drop': -1, 'decline': -1, 'concern': -1,
+        'downgrade': -1, 'negative': -1, 'bearish': -1
+    }
+    
+    sentiment = 0
+    words = text.split()
+    
+    for i, word in enumerate(words):
+        is_negated = False
+        if i > 0:
+            prev_words = ' '.join(words[max(0, i-3):i])
+            if any(neg in prev_words for neg in negation_words):
+                is_negated = True
+        
+        score = 0
+        if word in strong_positive:
+            score = strong_positive[word]
+        elif word in strong_negative:
+            score = strong_negative[word]
+        elif word in moderate_positive:
+            score = moderate_positive[word]
+        elif word in moderate_negative:
+            score = moderate_negative[word]
+        
+        if is_negated and score != 0:
+            score = -score * 0.8
+        
+        sentiment += score
+    
+    max_possible = len(words) * 2
+    normalized = sentiment / max(max_possible, 1)
+    
+    return round(max(-1, min(1, normalized)), 2)
+
+
+def _load_corpus():
+    with open(CORPUS_PATH) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.mark.parametrize("case", _load_corpus(), ids=lambda case: case["headline"][:40] or "<empty>")
+def test_corpus_scores(case):
+    assert news_scorer.score(case["headline"], case["summary"]) == case["score"]
+    assert legacy_score(case["headline"], case["summary"]) == case["score"]
+
+
+FUZZ_WORDS = [
+    # คำใน lexicon
+    'surge', 'soar', 'skyrocket', 'breakout', 'beat', 'exceed', 'strong', 'rally',
+    'plunge', 'crash', 'collapse', 'tank', 'miss', 'disappoint', 'weak', 'slump',
+    'gain', 'rise', 'growth', 'increase', 'upgrade', 'positive', 'bullish',
+    'fall', 'drop', 'decline', 'concern', 'downgrade', 'negative', 'bearish',
+    # คำปฏิเสธ + คำที่มีคำปฏิเสธเป็น substring หรือคร่อมคำ
+    'not', 'no', 'never', 'neither', 'nobody', 'nothing', 'without', 'fails', 'to', 'unable',
+    'notable', 'know', 'cannot', 'snow', 'knot', 'annotate', 'failsto', 'toward', 'tomorrow', 'nor',
+    # คำทั่วไป + เครื่องหมาย
+    'the', 'shares', 'stock', 'after', 'a', 'surge,', 'weak.', 'RALLY', 'Not', 'FAILS',
+]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_fuzz_matches_legacy(seed):
+    rng = random.Random(seed)
+    scorer = NegationScorer()
+    
+    mismatches = []
+    for _ in range(5000):
+        headline = " ".join(rng.choice(FUZZ_WORDS) for _ in range(rng.randint(0, 12)))
+        summary = " ".join(rng.choice(FUZZ_WORDS) for _ in range(rng.randint(0, 20)))
+        expected = legacy_score(headline, summary)
+        actual = scorer.score(headline, summary)
+        if actual != expected:
+            mismatches.append((headline, summary, expected, actual))
+    
+    assert not mismatches, mismatches[:5]
+
+
+def test_score_many_matches_score():
+    articles = [(case["headline"], case["summary"]) for case in _load_corpus()]
+    assert news_scorer.score_many(articles) == [news_scorer.score(*article) for article in articles]
@@ -0,0 +1,90 @@
+"""
+การแบ่ง shard ต้องคงที่ข้ามรอบ (.cache แยกต่อ shard): หุ้นเดิมอยู่ shard เดิม เฉพาะหุ้นใหม่ที่แบ่งตามเวลา
+"""
+import json
+import argparse
+
+import pytest
+
+import sharding
+import stock_collector
+from sharding import assign_shards, load_assignment, merge_reports, select_shard, shard_of
+
+
+SYMBOLS = [f"SYM{i}" for i in range(40)]
+
+
+def _write_report(path, shard, assigned, seconds=1.0):
+    report = {
+        "shard": shard,
+        "assigned": assigned,
+        "total": len(assigned),
+        "stats": {"processed": len(assigned)},
+        "wall_seconds": seconds * len(assigned),
+        "stages": {},
+        "symbols": {symbol: {"symbol": seconds} for symbol in assigned},
+    }
+    path.write_text(json.dumps(report))
+    return str(path)
+
+
+def test_without_previous_assignment_uses_hash():
+    runtimes = {symbol: float(i) for i, symbol in enumerate(SYMBOLS)}
+    assert assign_shards(SYMBOLS, 4, runtimes) == {symbol: shard_of(symbol, 4) for symbol in SYMBOLS}
+
+
+def test_previous_assignment_is_sticky_and_new_symbols_balance():
+    previous = {symbol: shard_of(symbol, 4) for symbol in SYMBOLS}
+    # เวลาเปลี่ยนไปมาก แต่หุ้นเดิมต้องไม่ย้าย shard
+    runtimes = {symbol: (100.0 if previous[symbol] == 0 else 1.0) for symbol in SYMBOLS}
+    new_symbols = ["NEW1", "NEW2", "NEW3"]
+    
+    assignment = assign_shards(SYMBOLS + new_symbols, 4, runtimes, previous)
+    
+    assert all(assignment[symbol] == previous[symbol] for symbol in SYMBOLS)
+    assert all(assignment[symbol] != 0 for symbol in new_symbols)  # shard 0 หนักที่สุด
+
+
+def test_out_of_range_previous_shard_is_reassigned():
+    assignment = assign_shards(["A", "B"], 2, {"A": 1.0}, {"A": 5, "B": 1})
+    assert assignment["B"] == 1
+    assert assignment["A"] in (0, 1)
+
+
+def test_select_shard_partitions_universe():
+    stocks = [{"symbol": symbol} for symbol in SYMBOLS]
+    previous = {symbol: i % 3 for i, symbol in enumerate(SYMBOLS[:30])}
+    shards = [select_shard(stocks, index, 3, {}, previous) for index in (1, 2, 3)]
+    selected = [stock["symbol"] for shard in shards for stock in shard]
+    assert sorted(selected) == sorted(SYMBOLS)
+
+
+def test_merge_reports_records_assignment(tmp_path):
+    paths = [
+        _write_report(tmp_path / "shard-1.json", "1/2", ["A", "B"]),
+        _write_report(tmp_path / "shard-2.json", "2/2", ["C"]),
+    ]
+    merged = merge_reports(paths)
+    assert merged["shard_count"] == 2
+    assert merged["assignment"] == {"A": 0, "B": 0, "C": 1}
+    assert merged["stats"] == {"processed": 3}
+
+
+def test_merge_keeps_previous_assignment_of_missing_shard(tmp_path, monkeypatch):
+    weights = tmp_path / "weights.json"
+    weights.write_text(json.dumps({"shard_count": 2, "assignment": {"A": 0, "B": 0, "C": 1, "D": 1}}))
+    monkeypatch.setattr(stock_collector, "RUN_REPORT_PATH", str(weights))
+    monkeypatch.setattr(stock_collector, "load_assignment",
+                        lambda path=str(weights), count=None: load_assignment(path, count))
+    
+    # shard 2 ล้ม ไม่มีรายงาน → C, D ต้องยังอยู่ shard 2
+    stock_collector.merge_shard_reports([_write_report(tmp_path / "shard-1.json", "1/2", ["A", "B", "E"])])
+    
+    assert load_assignment(str(weights), 2) == {"A": 0, "B": 0, "C": 1, "D": 1, "E": 0}
+    assert load_assignment(str(weights), 4) == {}
+
+
+@pytest.mark.parametrize("value", ["0/4", "5/4", "x", "1-4"])
+def test_parse_shard_rejects_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        sharding.parse_shard(value)
@@ -0,0 +1,89 @@
+"""
+TTL ต่อ field: ดึงใหม่เฉพาะ field ที่หมดอายุ ค่าที่ยังไม่หมดอายุ (eps_growth_pct 7 วัน) ต้องไม่ถูกเขียนทับ
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import ttl_cache
+import stock_collector
+from ttl_cache import HOUR, FIELD_TTLS, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache, "time", SimpleNamespace(time=clock))
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = TTLCache(str(tmp_path / "fundamentals.json"), 100, FIELD_TTLS)
+    monkeypatch.setattr(stock_collector, "fundamentals_cache", cache)
+    return cache
+
+
+class FakeMarketData:
+    def __init__(self, info):
+        self.info_calls = 0
+        self._info = info
+    
+    def info(self, symbol):
+        self.info_calls += 1
+        return dict(self._info)
+
+
+def test_get_many_returns_fresh_fields_and_missing(cache, clock):
+    cache.set_many("AAPL", {"pe_ratio": 30.0, "eps_growth_pct": 12.0})
+    clock.now += 25 * HOUR
+    
+    values, missing = cache.get_many("AAPL", ("pe_ratio", "eps_growth_pct", "market_cap"))
+    assert values == {"eps_growth_pct": 12.0}
+    assert missing == ["pe_ratio", "market_cap"]
+    
+    assert cache.get_many("AAPL", ("eps_growth_pct",), force_refresh=True) == ({}, ["eps_growth_pct"])
+
+
+def test_fetch_fundamental_data_refetches_only_expired_fields(cache, clock, monkeypatch):
+    market = FakeMarketData({"forwardPE": 30.0, "pegRatio": 1.5, "earningsGrowth": 0.12, "marketCap": 3e12})
+    monkeypatch.setattr(stock_collector, "market_data", market)
+    
+    first = stock_collector.fetch_fundamental_data("AAPL")
+    assert first == {"pe_ratio": 30.0, "peg_ratio": 1.5, "eps_growth_pct": 12.0, "market_cap": 3e12}
+    
+    # ภายในวันเดียวกัน: ไม่ยิง .info
+    clock.now += 2 * HOUR
+    assert stock_collector.fetch_fundamental_data("AAPL") == first
+    assert market.info_calls == 1
+    
+    # วันถัดไป: field 24 ชม. ดึงใหม่, eps_growth_pct ยังใช้ค่าเดิมจนครบ 7 วัน
+    market._info.update(forwardPE=31.0, earningsGrowth=0.2)
+    clock.now += 23 * HOUR
+    second = stock_collector.fetch_fundamental_data("AAPL")
+    assert market.info_calls == 2
+    assert second["pe_ratio"] == 31.0
+    assert second["eps_growth_pct"] == 12.0
+    
+    clock.now += 6 * 24 * HOUR
+    assert stock_collector.fetch_fundamental_data("AAPL")["eps_growth_pct"] == 20.0
+
+
+def test_fetch_fundamental_data_keeps_fresh_fields_on_symbol_error(cache, clock, monkeypatch):
+    class Broken:
+        def info(self, symbol):
+            raise KeyError("marketCap")
+    
+    cache.set_many("AAPL", {"pe_ratio": 30.0, "peg_ratio": 1.5, "eps_growth_pct": 12.0, "market_cap": 3e12})
+    clock.now += 25 * HOUR
+    monkeypatch.setattr(stock_collector, "market_data", Broken())
+    
+    assert stock_collector.fetch_fundamental_data("AAPL") == {"eps_growth_pct": 12.0}
@@ -0,0 +1,58 @@
+"""
+WriteBuffer: แถวใน batch เดียวกันต้องไม่ถูกเติม key ที่ไม่มี (PostgREST จะเขียน NULL ทับ default ของคอลัมน์)
+"""
+import asyncio
+from types import SimpleNamespace
+
+from write_buffer import WriteBuffer
+
+
+class Recorder:
+    def __init__(self, fail_rows=()):
+        self.calls = []
+        self.fail_rows = fail_rows
+    
+    def __call__(self, table, rows):
+        self.calls.append((table, [dict(row) for row in rows]))
+        if any(row.get("symbol") in self.fail_rows for row in rows):
+            raise RuntimeError("bad row")
+        return SimpleNamespace(data=rows)
+
+
+def _write_many(buffer, table, rows):
+    async def run():
+        pending = asyncio.ensure_future(buffer.write_many(table, rows))
+        await asyncio.sleep(0)
+        await buffer.flush_all()
+        return await pending
+    return asyncio.run(run())
+
+
+def test_rows_are_grouped_by_key_set():
+    recorder = Recorder()
+    buffer = WriteBuffer(recorder, batch_size=10, flush_interval=60)
+    rows = [
+        {"symbol": "AAPL", "price": 1.0},
+        {"symbol": "MSFT", "price": 2.0, "sector": "Tech"},
+        {"price": 3.0, "symbol": "NVDA"},
+    ]
+    
+    assert _write_many(buffer, "stock_snapshots", rows) == [True, True, True]
+    assert recorder.calls == [
+        ("stock_snapshots", [rows[0], rows[2]]),
+        ("stock_snapshots", [rows[1]]),
+    ]
+    assert all(set(row) == set(batch[0]) for _, batch in recorder.calls for row in batch)
+
+
+def test_failed_group_falls_back_to_single_rows(monkeypatch):
+    monkeypatch.setattr("write_buffer.WRITE_MAX_RETRIES", 1)
+    recorder = Recorder(fail_rows={"BAD"})
+    buffer = WriteBuffer(recorder, batch_size=10, flush_interval=60)
+    rows = [{"symbol": "AAPL"}, {"symbol": "BAD"}, {"symbol": "MSFT", "sector": None}]
+    
+    results = _write_many(buffer, "stock_snapshots", rows)
+    assert results[0] is True and results[2] is True
+    assert isinstance(results[1], RuntimeError)
+    assert [row for _, batch in recorder.calls if len(batch) == 1 for row in batch] == rows
+    assert [row for _, row, _ in buffer.failed] == [{"symbol": "BAD"}]
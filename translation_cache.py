@@ -0,0 +1,146 @@
+"""
+Cache คำแปลข่าว (key = hash ของข้อความต้นฉบับ) + แปลหลายข้อความพร้อมกันด้วย thread pool
+
+ข่าวเดิมที่ถูกดึงมาซ้ำไม่ต้องแปลใหม่ และข้อความที่ยังไม่เคยแปล
+จะถูกส่งแปลพร้อมกัน (จำกัดจำนวนด้วย TRANSLATION_WORKERS) แทนการแปลทีละข้อความ
+"""
+import os
+import logging
+import time
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", ".cache/translations.sqlite")
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "20000"))
+TRANSLATION_WORKERS = int(os.getenv("TRANSLATION_WORKERS", "4"))
+
+# ใช้ pool เดียวกันทุกหุ้น → จำกัดจำนวน request ไป Google Translate ที่ทำพร้อมกันทั้งรอบ
+_translation_pool = ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS, thread_name_prefix="translate")
+
+
+def _content_key(text, target):
+    return hashlib.sha256(f"{target}\n{text}".encode("utf-8")).hexdigest()[:32]
+
+
+class TranslationCache:
+    """Cache คำแปลใน SQLite (อ่านเฉพาะ key ที่ต้องการ ไม่ต้องโหลดทั้งไฟล์)"""
+    
+    def __init__(self, path=TRANSLATION_CACHE_PATH, max_entries=TRANSLATION_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations "
+                "(key TEXT PRIMARY KEY, translated TEXT NOT NULL, used_at REAL NOT NULL)"
+            )
+        return self._conn
+    
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        with self._lock:
+            conn = self._connect()
+            placeholders = ",".join("?" * len(keys))
+            rows = conn.execute(
+                f"SELECT key, translated FROM translations WHERE key IN ({placeholders})", list(keys)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE translations SET used_at = ? WHERE key = ?",
+                    [(time.time(), key) for key, _ in rows]
+                )
+                conn.commit()
+            return dict(rows)
+    
+    def set_many(self, translations):
+        if not translations:
+            return
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, translated, used_at) VALUES (?, ?, ?)",
+                [(key, translated, now) for key, translated in translations.items()]
+            )
+            conn.commit()
+    
+    def close(self):
+        """ลบคำแปลที่ไม่ได้ใช้นานที่สุดจนเหลือ max_entries แล้วปิดไฟล์"""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "DELETE FROM translations WHERE key NOT IN "
+                    "(SELECT key FROM translations ORDER BY used_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                self._conn.commit()
+            finally:
+                self._conn.close()
+                self._conn = None
+
+
+translation_cache = TranslationCache()
+
+
+def translate_texts(texts, make_translator, target="th"):
+    """
+    แปลหลายข้อความพร้อมกัน โดยใช้คำแปลใน cache ก่อน
+    
+    make_translator: ฟังก์ชันสร้าง translator ใหม่ (เช่น GoogleTranslator)
+    ต้องสร้างใหม่ทุกครั้ง เพราะ translator เก็บ state ของ request ไว้ในตัว ใช้ข้าม thread ไม่ได้
+    
+    Returns: list คำแปลตามลำดับเดิม (None = ข้อความว่างหรือแปลไม่สำเร็จ)
+    """
+    keys = [_content_key(text, target) if text else None for text in texts]
+    
+    try:
+        cached = translation_cache.get_many({key for key in keys if key})
+    except Exception as e:
+        logger.warning("⚠️ Translation cache unavailable: %s", e)
+        cached = {}
+    
+    # แปลเฉพาะข้อความที่ไม่ซ้ำและยังไม่มีใน cache
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key and key not in cached and key not in pending:
+            pending[key] = text
+    
+    def translate_one(text):
+        return make_translator().translate(text)
+    
+    futures = {key: _translation_pool.submit(translate_one, text) for key, text in pending.items()}
+    
+    translated = {}
+    errors = []
+    for key, future in futures.items():
+        try:
+            result = future.result()
+            if result:
+                translated[key] = result
+        except Exception as e:
+            errors.append(e)
+    
+    if errors:
+        logger.warning("⚠️ %s/%s translations failed: %s", len(errors), len(pending), errors[0])
+    
+    try:
+        translation_cache.set_many(translated)
+    except Exception as e:
+        logger.warning("⚠️ Cannot write translation cache: %s", e)
+    
+    cached.update(translated)
+    return [cached.get(key) if key else None for key in keys]
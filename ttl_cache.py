@@ -0,0 +1,131 @@
+"""
+Cache แบบมีอายุ (TTL) สำหรับข้อมูลที่เปลี่ยนช้า เช่น Fundamental และ Analyst Recommendations
+
+ข้อมูลพวกนี้เปลี่ยนอย่างมากวันละครั้ง แต่ endpoint ของ yfinance ช้าที่สุด
+รอบระหว่างวันจึงใช้ค่าจาก cache และดึงใหม่เฉพาะราคา
+"""
+import os
+import logging
+import json
+import time
+import threading
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+TTL_CACHE_PATH = os.getenv("TTL_CACHE_PATH", ".cache/fundamentals.json")
+TTL_CACHE_MAX_ENTRIES = int(os.getenv("TTL_CACHE_MAX_ENTRIES", "20000"))
+FORCE_REFRESH = os.getenv("FORCE_REFRESH", "").lower() in ("1", "true", "yes")
+
+HOUR = 60 * 60
+
+# อายุของแต่ละ field (วินาที)
+FIELD_TTLS = {
+    "pe_ratio": 24 * HOUR,           # ขยับตามราคา
+    "peg_ratio": 24 * HOUR,
+    "market_cap": 24 * HOUR,
+    "eps_growth_pct": 7 * 24 * HOUR,  # เปลี่ยนตามงบรายไตรมาส
+    "analyst_buy_pct": 24 * HOUR,
+}
+DEFAULT_TTL = 24 * HOUR
+
+
+class TTLCache:
+    """
+    Cache แบบ key/field พร้อมอายุต่อ field และจำกัดจำนวน entry (ลบตัวที่ใช้ล่าสุดนานที่สุดก่อน)
+    
+    บันทึกเป็นไฟล์ JSON เพื่อใช้ข้ามรอบได้
+    """
+    
+    def __init__(self, path, max_entries, ttls=None, force_refresh=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = ttls or {}
+        self.force_refresh = force_refresh
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._loaded = False
+    
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self._entries = OrderedDict(json.load(f))
+        except Exception as e:
+            logger.warning("⚠️ Corrupted cache file %s, starting empty: %s", self.path, e)
+    
+    def _is_fresh(self, entry, field):
+        return time.time() - entry["stored_at"] < self.ttls.get(field, DEFAULT_TTL)
+    
+    def get(self, key, field, force_refresh=False):
+        """คืนค่า (hit, value) โดย value อาจเป็น None ได้ถ้าค่าที่เก็บไว้คือ None"""
+        if force_refresh or self.force_refresh:
+            return False, None
+        
+        entry_key = f"{key}:{field}"
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(entry_key)
+            if entry is None or not self._is_fresh(entry, field):
+                return False, None
+            self._entries.move_to_end(entry_key)
+            return True, entry["value"]
+    
+    def get_many(self, key, fields, force_refresh=False):
+        """
+        คืน (values, missing): values = dict ของ field ที่ยังไม่หมดอายุ, missing = field ที่ต้องดึงใหม่
+        
+        field แต่ละตัวหมดอายุตาม TTL ของตัวเอง ผู้เรียกดึงใหม่แล้ว set_many เฉพาะ missing
+        (ค่าที่ยังไม่หมดอายุ เช่น eps_growth_pct อยู่ได้ครบ 7 วันแม้ field อื่นจะถูกดึงใหม่ทุกวัน)
+        """
+        values, missing = {}, []
+        for field in fields:
+            hit, value = self.get(key, field, force_refresh)
+            if hit:
+                values[field] = value
+            else:
+                missing.append(field)
+        return values, missing
+    
+    def set(self, key, field, value):
+        entry_key = f"{key}:{field}"
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[entry_key] = {"value": value, "stored_at": time.time()}
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def set_many(self, key, values):
+        for field, value in values.items():
+            self.set(key, field, value)
+    
+    def save(self):
+        """บันทึกลงไฟล์ (ตัด entry ที่หมดอายุแล้วออก)"""
+        with self._lock:
+            if not self._loaded:
+                return
+            
+            fresh = OrderedDict(
+                (entry_key, entry) for entry_key, entry in self._entries.items()
+                if self._is_fresh(entry, entry_key.rsplit(":", 1)[-1])
+            )
+            
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(fresh, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.warning("⚠️ Cannot write cache file %s: %s", self.path, e)
+
+
+fundamentals_cache = TTLCache(TTL_CACHE_PATH, TTL_CACHE_MAX_ENTRIES, FIELD_TTLS, FORCE_REFRESH)
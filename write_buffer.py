@@ -0,0 +1,177 @@
+"""
+รวมการเขียน Supabase หลายแถวเป็น batch เดียว (stock_snapshots, stock_news, ai_predictions)
+
+แต่ละแถวที่ส่งเข้ามาจะรอจนกว่า batch ของมันถูกเขียน (ครบจำนวนหรือครบเวลา)
+ถ้า batch ล้มเหลวจะลองใหม่ แล้วค่อยแยกเขียนทีละแถวเพื่อหาว่าแถวไหนเสีย
+
+PostgREST bulk insert ใช้คอลัมน์ชุดเดียวทั้ง request และใส่ NULL ให้ key ที่แถวไม่มี
+(แทนที่จะใช้ default ของคอลัมน์) จึงแยก batch ตามชุด key ของแถวก่อนเขียน
+"""
+import os
+import logging
+import json
+import asyncio
+import contextvars
+
+from rate_limiter import run_blocking
+from run_metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "200"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "1.0"))  # วินาที
+WRITE_MAX_RETRIES = 3
+
+
+class WriteBuffer:
+    """
+    Buffer การเขียนแยกตาม table
+    
+    execute_batch(table, rows) ต้องคืน response ของ Supabase
+    conflict_keys: {table: column} สำหรับ table ที่ใช้ upsert แบบ ignore duplicates
+    (แถวที่ไม่อยู่ใน response ถือว่าซ้ำ → ผลลัพธ์เป็น False)
+    """
+    
+    def __init__(self, execute_batch, conflict_keys=None, on_retry=None,
+                 batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL):
+        self.execute_batch = execute_batch
+        self.conflict_keys = conflict_keys or {}
+        self.on_retry = on_retry
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.failed = []
+        self.batches_written = 0
+        self._locks = {}
+        self._flusher = None
+    
+    def start(self):
+        """เริ่ม task ที่ flush ตามเวลา"""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+    
+    async def close(self):
+        """หยุด flush ตามเวลาแล้วเขียนทุกอย่างที่ค้างอยู่"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush_all()
+    
+    async def write(self, table, row):
+        """เพิ่มแถวเข้า buffer แล้วรอผล (True = เขียนแล้ว, False = ซ้ำ, exception = ล้มเหลว)"""
+        results = await self.write_many(table, [row])
+        if isinstance(results[0], Exception):
+            raise results[0]
+        return results[0]
+    
+    async def write_many(self, table, rows):
+        """เพิ่มหลายแถวแล้วรอผลทุกแถว (คืน list ของ True / False / Exception)"""
+        if not rows:
+            return []
+        return await asyncio.gather(*self._enqueue(table, rows), return_exceptions=True)
+    
+    def submit(self, table, rows):
+        """เพิ่มแถวโดยไม่รอผล (แถวที่เขียนไม่สำเร็จยังอยู่ใน self.failed / report() เหมือนเดิม)"""
+        for future in self._enqueue(table, rows):
+            future.add_done_callback(_discard_result)
+    
+    def _enqueue(self, table, rows):
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in rows]
+        self.pending.setdefault(table, []).extend(zip(rows, futures))
+        
+        if len(self.pending[table]) >= self.batch_size:
+            # context ว่าง: batch เป็นของหลายหุ้น ไม่ควรติด symbol / log buffer ของหุ้นที่บังเอิญทำให้ครบ batch
+            asyncio.create_task(self.flush(table), context=contextvars.Context())
+        return futures
+    
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_all()
+    
+    async def flush_all(self):
+        for table in list(self.pending):
+            await self.flush(table)
+    
+    async def flush(self, table):
+        lock = self._locks.setdefault(table, asyncio.Lock())
+        async with lock:
+            while self.pending.get(table):
+                entries = self.pending[table][:self.batch_size]
+                del self.pending[table][:self.batch_size]
+                await self._write_batch(table, entries)
+    
+    async def _write_batch(self, table, entries):
+        """เขียนแถวที่มีชุด key เดียวกันใน request เดียว (ชุดละ request)"""
+        groups = {}
+        for row, future in entries:
+            groups.setdefault(frozenset(row), []).append((row, future))
+        for group in groups.values():
+            await self._write_group(table, group)
+    
+    async def _write_group(self, table, entries):
+        rows = [row for row, _ in entries]
+        
+        for attempt in range(WRITE_MAX_RETRIES):
+            try:
+                response = await self._execute(table, rows)
+                self.batches_written += 1
+                self._resolve(table, entries, response)
+                return
+            except Exception as e:
+                logger.warning("⚠️ Batch write to %s failed (%s rows, attempt %s/%s): %s",
+                               table, len(rows), attempt + 1, WRITE_MAX_RETRIES, e)
+                if attempt < WRITE_MAX_RETRIES - 1:
+                    await asyncio.sleep(2 ** attempt)
+                    if self.on_retry:
+                        self.on_retry(e)
+        
+        # ยังไม่สำเร็จ → เขียนทีละแถวเพื่อแยกแถวที่มีปัญหา
+        for row, future in entries:
+            try:
+                response = await self._execute(table, [row])
+                self._resolve(table, [(row, future)], response)
+            except Exception as e:
+                self.failed.append((table, row, e))
+                if not future.done():
+                    future.set_exception(e)
+    
+    async def _execute(self, table, rows):
+        with metrics.stage(f"supabase:{table}", "supabase"):
+            metrics.add_bytes(len(json.dumps(rows, default=str)))
+            return await run_blocking("supabase", self.execute_batch, table, rows)
+    
+    def _resolve(self, table, entries, response):
+        conflict_key = self.conflict_keys.get(table)
+        written_keys = None
+        if conflict_key:
+            written_keys = {item.get(conflict_key) for item in (getattr(response, "data", None) or [])}
+        
+        for row, future in entries:
+            if future.done():
+                continue
+            if written_keys is None:
+                future.set_result(True)
+            else:
+                future.set_result(row.get(conflict_key) in written_keys)
+    
+    def report(self):
+        """สรุปแถวที่เขียนไม่สำเร็จ แยกตาม table"""
+        if not self.failed:
+            return
+        
+        logger.warning("⚠️ %s row(s) failed to write:", len(self.failed))
+        for table, row, error in self.failed:
+            logger.warning("   %s: %s - %s", table, row.get('symbol', '?'), error)
+
+
+def _discard_result(future):
+    if not future.cancelled():
+        future.exception()  # กัน warning "exception was never retrieved"